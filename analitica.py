@@ -0,0 +1,118 @@
+"""
+Rachas y adherencia a largo plazo, calculadas en la base de datos.
+
+Todo sale de una única consulta con funciones de ventana sobre los resúmenes diarios
+(DailySummary): el coste no depende de si se miran 7 días o varios años, y la base de datos
+solo devuelve una fila. Funciona igual en SQLite (3.25 o posterior) y en PostgreSQL.
+
+Un día cumple un macro si su total está a menos del 10% del objetivo que tenía ese día
+(la snapshot del resumen). Para kcal es el mismo criterio que obtener_estadisticas_ventanas,
+y las ventanas son las mismas (inicio_ventana: los últimos N días contando hoy). "todos"
+exige cumplir los cuatro a la vez.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import and_, case, func, literal_column, select
+
+from logic import inicio_ventana
+from models import db, DailySummary
+
+VENTANAS = (7, 30, 90, 365)
+MARGEN = 0.1
+
+# Macro -> (columna del total, columna del objetivo, objetivo si el día no tiene snapshot)
+MACROS = {
+    "kcal": (DailySummary.kcal, DailySummary.target_kcal_snapshot, 2000),
+    "proteinas": (DailySummary.proteinas, DailySummary.target_protein_snapshot, 150),
+    "carbohidratos": (DailySummary.carbohidratos, DailySummary.target_carbs_snapshot, 200),
+    "grasas": (DailySummary.grasas, DailySummary.target_fat_snapshot, 60),
+}
+CRITERIOS = tuple(MACROS) + ("todos",)
+
+
+def _numero_dia(columna, dialecto):
+    """Número de día consecutivo para detectar huecos entre fechas (su origen da igual)."""
+    if dialecto == "sqlite":
+        return func.julianday(columna)
+    # En PostgreSQL restar dos fechas da el número de días
+    return columna - literal_column("DATE '1970-01-01'")
+
+
+def _consulta(user_id, hoy, ventanas, dialecto):
+    # 1. Un día por fila con un 1/0 por criterio
+    en_objetivo = {}
+    for nombre, (total, objetivo, por_defecto) in MACROS.items():
+        objetivo = func.coalesce(objetivo, por_defecto)
+        en_objetivo[nombre] = func.abs(total - objetivo) <= objetivo * MARGEN
+    en_objetivo["todos"] = and_(*en_objetivo.values())
+    dias = select(
+        DailySummary.date.label("fecha"),
+        _numero_dia(DailySummary.date, dialecto).label("n"),
+        *(case((condicion, 1), else_=0).label(f"ok_{nombre}") for nombre, condicion in en_objetivo.items()),
+    ).where(
+        DailySummary.user_id == user_id,
+        DailySummary.num_registros > 0,
+        DailySummary.date <= hoy,
+    ).subquery("dias")
+
+    # 2. Huecos e islas: dentro de los días que cumplen, n - row_number() es constante
+    #    mientras los días sean consecutivos y cambia en cuanto falta uno o no se cumple
+    islas = select(
+        dias.c.fecha,
+        *(dias.c[f"ok_{c}"] for c in CRITERIOS),
+        *((dias.c.n - func.row_number().over(partition_by=dias.c[f"ok_{c}"], order_by=dias.c.fecha))
+          .label(f"isla_{c}") for c in CRITERIOS),
+    ).subquery("islas")
+
+    # 3. Longitud y último día de la isla de cada fila
+    rachas = select(
+        islas.c.fecha,
+        *(islas.c[f"ok_{c}"] for c in CRITERIOS),
+        *(func.count().over(partition_by=(islas.c[f"ok_{c}"], islas.c[f"isla_{c}"])).label(f"largo_{c}")
+          for c in CRITERIOS),
+        *(func.max(islas.c.fecha).over(partition_by=(islas.c[f"ok_{c}"], islas.c[f"isla_{c}"])).label(f"fin_{c}")
+          for c in CRITERIOS),
+    ).subquery("rachas")
+
+    # 4. Una sola fila: rachas máxima y actual y recuentos de cada ventana
+    ayer = hoy - timedelta(days=1)
+    columnas = []
+    for c in CRITERIOS:
+        ok, largo, fin = rachas.c[f"ok_{c}"], rachas.c[f"largo_{c}"], rachas.c[f"fin_{c}"]
+        columnas.append(func.max(case((ok == 1, largo))))
+        # La racha sigue viva si su último día es hoy o ayer (hoy aún puede completarse)
+        columnas.append(func.max(case((and_(ok == 1, fin >= ayer), largo))))
+    for dias_ventana in ventanas:
+        dentro = rachas.c.fecha >= inicio_ventana(hoy, dias_ventana)
+        columnas.append(func.count(case((dentro, 1))))
+        columnas.extend(func.sum(case((dentro, rachas.c[f"ok_{c}"]), else_=0)) for c in CRITERIOS)
+    return select(*columnas)
+
+
+def obtener_adherencia(user_id, ventanas=VENTANAS, hoy=None):
+    """
+    Rachas (actual y máxima, en días consecutivos) y adherencia de las últimas 'ventanas'
+    (en días, contando hoy) por macro y para los cuatro a la vez. El porcentaje es sobre los
+    días con registros de la ventana (None si no hay ninguno). Una sola consulta.
+
+    {"rachas": {"kcal": {"maxima": 12, "actual": 3}, ..., "todos": {...}},
+     "ventanas": {7: {"dias_con_datos": 6, "kcal": {"cumplidos": 5, "porcentaje": 83.3}, ...}, ...}}
+    """
+    hoy = hoy or date.today()
+    dialecto = db.session.get_bind().dialect.name
+    fila = db.session.execute(_consulta(user_id, hoy, ventanas, dialecto)).one()
+
+    valores = iter(fila)
+    rachas = {c: {"maxima": next(valores) or 0, "actual": next(valores) or 0} for c in CRITERIOS}
+    resultado_ventanas = {}
+    for dias_ventana in ventanas:
+        con_datos = next(valores) or 0
+        ventana = {"dias_con_datos": con_datos}
+        for c in CRITERIOS:
+            cumplidos = int(next(valores) or 0)
+            ventana[c] = {
+                "cumplidos": cumplidos,
+                "porcentaje": round(100 * cumplidos / con_datos, 1) if con_datos else None,
+            }
+        resultado_ventanas[dias_ventana] = ventana
+    return {"rachas": rachas, "ventanas": resultado_ventanas}
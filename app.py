@@ -1,8 +1,16 @@
 import re
-import json
 import os
+import json
+import hashlib
+import tempfile
+import unicodedata
+import uuid
 from datetime import datetime, date, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash
+from urllib.parse import quote
+from flask import (
+    Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, abort, jsonify, Response,
+    stream_with_context, session, before_render_template, template_rendered,
+)
 from flask_login import (
     LoginManager,
     login_user,
@@ -10,54 +18,161 @@ from flask_login import (
     login_required,
     current_user,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload, joinedload
+from werkzeug.http import dump_options_header
 
 # Importamos la base de datos y la lógica de negocio para desacoplar el código
-from models import db, User, Food, DailyLog, Recipe, RecipeIngredient
-from logic import obtener_resumen_diario
+from models import db, User, Food, DailyLog, Recipe, RecipeIngredient, DailySummary
+from logic import (
+    obtener_estadisticas_ventanas,
+    recalcular_totales_receta,
+    aplicar_log_a_resumen,
+    registrar_lote,
+    copiar_registros,
+    recalcular_resumen_dia,
+    recalcular_resumenes,
+    recalcular_resumenes_afectados,
+    dias_afectados,
+    limpiar_catalogo_usuario,
+    personalizar_alimento_base,
+    paginar_por_nombre,
+)
+from migraciones import informe_explain, preparar_esquema
+import basedatos
+import cache
+import contrasenas
+import metricas
+import tareas
+import exportacion
+import importacion
+import busqueda
+import analitica
+
+# Todas las rutas, hooks y comandos de la aplicación; create_app los registra en cada instancia
+bp = Blueprint("nutri", __name__, cli_group=None)
+
+# Gestión de sesiones con Flask-Login
+login_manager = LoginManager()
+login_manager.login_view = "nutri.login"
+login_manager.login_message = "Sesión requerida para acceder al sistema."
+login_manager.login_message_category = "info"
 
 # --- CONFIGURACIÓN DE LA APLICACIÓN ---
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "tfm_seguridad_2024_key")
 
-# DETECCIÓN DE ENTORNO: Si existe DATABASE_URL en el sistema, usamos Postgres (Nube)
-# Si no, usamos el SQLite local (Desarrollo)
-database_url = os.environ.get("DATABASE_URL")
+def configuracion_entorno():
+    """Configuración leída de las variables de entorno (ver create_app)."""
+    config = {"SECRET_KEY": os.environ.get("SECRET_KEY", "tfm_seguridad_2024_key")}
+
+    # DETECCIÓN DE ENTORNO: Si existe DATABASE_URL en el sistema, usamos Postgres (Nube)
+    # Si no, usamos el SQLite local (Desarrollo)
+    database_url = os.environ.get("DATABASE_URL")
+    if database_url:
+        # Ajuste necesario: SQLAlchemy requiere 'postgresql://' pero Render suele dar 'postgres://'
+        config["SQLALCHEMY_DATABASE_URI"] = database_url.replace("postgres://", "postgresql://", 1)
+    else:
+        config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///nutri.db"
+    config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Réplica de lectura opcional para las rutas de solo lectura. Tras una escritura, el usuario
+    # lee de la primaria durante REPLICA_RETRASO_MAX segundos (lo que puede tardar la réplica)
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        config["SQLALCHEMY_BINDS"] = {
+            basedatos.BIND_REPLICA: os.environ["DATABASE_REPLICA_URL"].replace("postgres://", "postgresql://", 1),
+        }
+    config["REPLICA_RETRASO_MAX"] = float(os.environ.get("REPLICA_RETRASO_MAX", 5))
+
+    # Hash de contraseñas: método/coste y tamaño del pool que lo calcula (ver contrasenas.py)
+    config["HASH_METODO"] = os.environ.get("HASH_METODO", contrasenas.METODO_POR_DEFECTO)
+    config["HASH_HILOS"] = int(os.environ.get("HASH_HILOS", 2))
+    config["HASH_COLA"] = int(os.environ.get("HASH_COLA", 8))
+
+    # Tareas en segundo plano: hilos del pool, tareas en espera y carpeta de los ficheros subidos (ver tareas.py)
+    config["TAREAS_HILOS"] = int(os.environ.get("TAREAS_HILOS", 2))
+    config["TAREAS_COLA"] = int(os.environ.get("TAREAS_COLA", 16))
+    config["TAREAS_DIR"] = os.environ.get("TAREAS_DIR", os.path.join(tempfile.gettempdir(), "nutri_tareas"))
+
+    # Caché de páginas del diario: "memoria" (LRU por worker) o "nula" (ver cache.py)
+    config["CACHE_PAGINAS"] = os.environ.get("CACHE_PAGINAS", "memoria")
+    config["CACHE_PAGINAS_MAX_BYTES"] = int(os.environ.get("CACHE_PAGINAS_MAX_BYTES", 32 * 1024 * 1024))
+
+    # --- INSTRUMENTACIÓN (ver metricas.py) ---
+    # Umbral en ms a partir del cual una petición se registra en el log con su SQL (vacío: desactivado)
+    config["REGISTRO_LENTAS_MS"] = float(os.environ["REGISTRO_LENTAS_MS"]) if os.environ.get("REGISTRO_LENTAS_MS") else None
+    # Si se define, /metrics exige la cabecera 'Authorization: Bearer <token>'
+    config["METRICAS_TOKEN"] = os.environ.get("METRICAS_TOKEN")
+    return config
 
-if database_url:
-    # Ajuste necesario: SQLAlchemy requiere 'postgresql://' pero Render suele dar 'postgres://'
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_url.replace("postgres://", "postgresql://", 1)
-else:
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///nutri.db"
 
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+def create_app(config=None):
+    """
+    Crea la aplicación con la configuración del entorno, sobrescrita por 'config' si se indica.
 
-# --- CONFIGURACIÓN DE INTEGRIDAD PARA SQLITE ---
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
+    No abre ninguna conexión a la base de datos: el esquema se crea y actualiza aparte con
+    'flask --app app migrar'. Así importar el módulo y crear la aplicación es barato en las
+    pruebas y en la CLI, y con 'gunicorn --preload' ningún worker hereda conexiones del maestro.
+    """
+    app = Flask(__name__)
+    app.config.update(configuracion_entorno())
+    app.config.update(config or {})
+    # Pool de conexiones configurable por entorno (ver basedatos.opciones_engine)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                          basedatos.opciones_engine(app.config["SQLALCHEMY_DATABASE_URI"]))
+
+    configurar_servicios(app)
+    # --- CONFIGURACIÓN DE INTEGRIDAD Y CONCURRENCIA PARA SQLITE ---
+    # Perfil "produccion" (WAL, busy_timeout...) o "basico" (solo claves foráneas); ver basedatos.py
+    basedatos.configurar_sqlite(app)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    before_render_template.connect(inicio_render, app)
+    template_rendered.connect(fin_render, app)
+
+    # Los listeners van en los engines de esta aplicación (primaria y réplica), no en todos los
+    # Engine del proceso. Crear los engines no conecta: el pool abre la primera conexión al usarse
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        basedatos.preparar_engine(engine, app.config["SQLITE_PRAGMAS"])
+        metricas.instrumentar_engine(engine)
+    basedatos.descartar_conexiones_al_bifurcar(engines)
+    return app
+
+def configurar_servicios(app):
     """
-    Solo aplicamos PRAGMA si estamos en SQLite.
-    PostgreSQL gestiona las Claves Foráneas de forma nativa y automática.
+    Pools de hash y de tareas y caché de páginas. Son únicos por proceso (un worker sirve una
+    sola aplicación): si se crean varias, como en las pruebas, quedan los de la última.
     """
-    # Verificamos si la URL de la base de datos contiene 'sqlite'
-    if "sqlite" in app.config["SQLALCHEMY_DATABASE_URI"]:
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
+    contrasenas.configurar(app)
+    tareas.configurar(app)
+    cache.configurar(app)
 
-db.init_app(app)
+@bp.before_app_request
+def inicio_peticion():
+    metricas.inicio_peticion()
+    basedatos.inicio_peticion()
 
-# Gestión de sesiones con Flask-Login
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
-login_manager.login_message = "Sesión requerida para acceder al sistema."
-login_manager.login_message_category = "info"
+@bp.after_app_request
+def recordar_escritura(respuesta):
+    basedatos.fin_peticion()
+    return respuesta
+
+@bp.teardown_app_request
+def fin_peticion(error):
+    metricas.fin_peticion(current_app.config["REGISTRO_LENTAS_MS"])
+
+def inicio_render(sender, template, context, **extra):
+    metricas.inicio_render(template)
+
+def fin_render(sender, template, context, **extra):
+    metricas.fin_render(template)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Identidad y metas cacheadas por worker: la mayoría de peticiones no consultan la tabla user
+    return cache.cargar_usuario(int(user_id))
 
 def validar_password(password):
     """
@@ -74,15 +189,37 @@ def validar_password(password):
 
 # --- DASHBOARD Y NAVEGACIÓN ---
 
-@app.route("/")
+@bp.route("/")
 @login_required
 def root():
     # Redirección automática a la fecha actual al entrar en la app
     hoy_str = date.today().strftime("%Y-%m-%d")
-    return redirect(url_for("index", date_str=hoy_str))
+    return redirect(url_for("nutri.index", date_str=hoy_str))
 
-@app.route("/day/<date_str>")
+def _objetivos_dia(dia, actuales=None):
+    """
+    Lógica de Snapshots: Priorizamos la meta que el usuario tenía el día del registro.
+    Sin snapshot se usan las metas actuales ('actuales' si se han leído ya de la base de datos).
+    """
+    if dia is not None and dia.num_registros and dia.target_kcal_snapshot:
+        return {
+            "kcal": dia.target_kcal_snapshot, 
+            "prot": dia.target_protein_snapshot,
+            "carbs": dia.target_carbs_snapshot, 
+            "fat": dia.target_fat_snapshot,
+        }
+    if actuales is not None:
+        return actuales
+    return {
+        "kcal": current_user.target_kcal, 
+        "prot": current_user.target_protein,
+        "carbs": current_user.target_carbs, 
+        "fat": current_user.target_fat,
+    }
+
+@bp.route("/day/<date_str>")
 @login_required
+@basedatos.solo_lectura
 def index(date_str):
     """
     Punto de entrada principal. Gestiona la visualización del diario 
@@ -91,36 +228,46 @@ def index(date_str):
     try:
         fecha_actual = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
-        return redirect(url_for("root"))
+        return redirect(url_for("nutri.root"))
+
+    # Página cacheada por usuario, día, versión de sus datos y metas actuales. Hoy forma parte
+    # de la clave porque las estadísticas son de los últimos 7 y 30 días. Versión y metas salen
+    # de la misma consulta: así un cambio de perfil hecho en otro worker nunca se cachea con las
+    # metas antiguas. Con mensajes flash pendientes la página es única: ni se sirve de la caché
+    # ni se guarda.
+    version, objetivos_actuales = cache.version_y_objetivos(current_user.id)
+    clave = None
+    if not session.get("_flashes"):
+        clave = (current_user.id, fecha_actual, date.today(), version, tuple(objetivos_actuales.values()))
+        html = cache.paginas.obtener(clave)
+        if html is not None:
+            return Response(html, mimetype="text/html")
 
     prev_day = (fecha_actual - timedelta(days=1)).strftime("%Y-%m-%d")
     next_day = (fecha_actual + timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # Recuperamos los registros y calculamos el resumen nutricional
-    logs = DailyLog.query.filter_by(user_id=current_user.id, date=fecha_actual).all()
-    resumen = obtener_resumen_diario(logs)
-
-    # Lógica de Snapshots: Priorizamos la meta que el usuario tenía el día del registro
-    if logs and logs[0].target_kcal_snapshot:
-        targets = {
-            "kcal": logs[0].target_kcal_snapshot, 
-            "prot": logs[0].target_protein_snapshot,
-            "carbs": logs[0].target_carbs_snapshot, 
-            "fat": logs[0].target_fat_snapshot,
-        }
+    # Recuperamos los registros (con su alimento o receta en la misma consulta) y el resumen precalculado
+    logs = (DailyLog.query.filter_by(user_id=current_user.id, date=fecha_actual)
+            .options(joinedload(DailyLog.food), joinedload(DailyLog.recipe))
+            .order_by(DailyLog.id)
+            .all())
+    dia = db.session.get(DailySummary, (current_user.id, fecha_actual))
+    if dia is None and logs:
+        # Días registrados antes de existir la tabla de resúmenes: lo generamos una única vez
+        dia = recalcular_resumen_dia(current_user.id, fecha_actual)
+        db.session.commit()
+    if dia is not None:
+        resumen = dia.get_macros()
     else:
-        targets = {
-            "kcal": current_user.target_kcal, 
-            "prot": current_user.target_protein,
-            "carbs": current_user.target_carbs, 
-            "fat": current_user.target_fat,
-        }
+        resumen = {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+
+    targets = _objetivos_dia(dia, objetivos_actuales)
 
-    from logic import obtener_estadisticas_breves
-    stats_semana = obtener_estadisticas_breves(current_user.id, dias=7)
-    stats_mes = obtener_estadisticas_breves(current_user.id, dias=30)
+    # Ambas ventanas salen de una única consulta agregada
+    stats = obtener_estadisticas_ventanas(current_user.id, ventanas=(7, 30))
+    stats_semana, stats_mes = stats[7], stats[30]
 
-    return render_template(
+    html = render_template(
         "index.html", 
         resumen=resumen, 
         targets=targets, 
@@ -131,11 +278,14 @@ def index(date_str):
         date=date,
         stats_semana=stats_semana,
         stats_mes=stats_mes
-    )
+    ).encode("utf-8")
+    if clave is not None:
+        cache.paginas.guardar(clave, html)
+    return Response(html, mimetype="text/html")
 
 # --- GESTIÓN DE USUARIOS ---
 
-@app.route("/registro", methods=["GET", "POST"])
+@bp.route("/registro", methods=["GET", "POST"])
 def registro():
     """Proceso de alta con validación de integridad (email/user únicos)."""
     if request.method == "POST":
@@ -156,57 +306,115 @@ def registro():
                 else:
                     # Aplicamos hashing para nunca guardar contraseñas en texto plano
                     nuevo = User(username=username, email=email, 
-                                 password=generate_password_hash(password, method="pbkdf2:sha256"),
+                                 password=contrasenas.servicio.generar(password),
                                  fecha_aceptacion_politica=datetime.now())
                     db.session.add(nuevo)
                     db.session.commit()
                     flash("Cuenta creada correctamente.", "success")
-                    return redirect(url_for("login"))
+                    return redirect(url_for("nutri.login"))
+            except contrasenas.HashSaturado:
+                return _servidor_ocupado("registro.html", username=username)
             except Exception:
                 db.session.rollback()
                 flash("Error interno del servidor.", "danger")
     return render_template("registro.html")
 
-@app.route("/login", methods=["GET", "POST"])
+def _servidor_ocupado(plantilla, **contexto):
+    """Rechazo inmediato cuando el pool de hash está saturado: mejor reintentar que hacer cola."""
+    flash("Hay muchos accesos en este momento. Inténtalo de nuevo en unos segundos.", "warning")
+    return render_template(plantilla, **contexto), 503, {"Retry-After": "2"}
+
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         user = User.query.filter_by(username=request.form.get("username")).first()
-        if user and check_password_hash(user.password, request.form.get("password")):
+        password = request.form.get("password")
+        try:
+            valida = user is not None and contrasenas.servicio.verificar(user.password, password)
+        except contrasenas.HashSaturado:
+            return _servidor_ocupado("login.html")
+        if valida:
+            if contrasenas.servicio.necesita_rehash(user.password):
+                # El método o el coste configurados han cambiado: aprovechamos que tenemos la contraseña
+                try:
+                    user.password = contrasenas.servicio.generar(password)
+                    db.session.commit()
+                except contrasenas.HashSaturado:
+                    pass  # Se regenerará en otro login; no impedimos el acceso por ello
             login_user(user)
-            return redirect(url_for("root"))
+            return redirect(url_for("nutri.root"))
         flash("Credenciales no válidas.", "danger")
     return render_template("login.html")
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("login"))
+    return redirect(url_for("nutri.login"))
 
-@app.route("/perfil", methods=["GET", "POST"])
+@bp.route("/perfil", methods=["GET", "POST"])
 @login_required
 def perfil():
     """Actualización de metas diarias que afectan a los cálculos de progreso."""
     if request.method == "POST":
-        current_user.target_kcal = int(request.form.get("kcal", 2000))
-        current_user.target_protein = int(request.form.get("proteinas", 150))
-        current_user.target_carbs = int(request.form.get("carbohidratos", 200))
-        current_user.target_fat = int(request.form.get("grasas", 60))
+        # current_user es la identidad cacheada (solo lectura): modificamos el usuario real
+        usuario = db.session.get(User, current_user.id)
+        usuario.target_kcal = int(request.form.get("kcal", 2000))
+        usuario.target_protein = int(request.form.get("proteinas", 150))
+        usuario.target_carbs = int(request.form.get("carbohidratos", 200))
+        usuario.target_fat = int(request.form.get("grasas", 60))
+        cache.marcar_datos_modificados(usuario.id)
         db.session.commit()
+        cache.invalidar_usuario(usuario.id)
         flash("Objetivos actualizados correctamente.", "success")
-        return redirect(url_for("root"))
+        return redirect(url_for("nutri.root"))
     return render_template("perfil.html")
 
 # --- CATÁLOGO (ALIMENTOS Y RECETAS) ---
 
-@app.route("/mis_alimentos")
+@bp.route("/mis_alimentos")
 @login_required
+@basedatos.solo_lectura
 def mis_alimentos():
-    alimentos = Food.query.filter_by(user_id=current_user.id).all()
-    recetas = Recipe.query.filter_by(user_id=current_user.id).all()
-    return render_template("mis_alimentos.html", alimentos=alimentos, recetas=recetas)
-
-@app.route("/add_food", methods=["GET", "POST"])
+    """
+    Catálogo paginado por clave (nombre, id). Cada lista avanza con su propio cursor
+    y el detalle de ingredientes de una receta se pide solo al desplegarla.
+    """
+    texto = request.args.get("q", "").strip()
+    # Alimentos propios junto a los del catálogo base que el usuario no ha personalizado
+    alimentos_q = Food.visibles(current_user.id)
+    recetas_q = Recipe.query.filter_by(user_id=current_user.id)
+    if texto:
+        alimentos_q = alimentos_q.filter(busqueda.filtro_contiene(Food, texto))
+        recetas_q = recetas_q.filter(busqueda.filtro_contiene(Recipe, texto))
+
+    alimentos, siguiente_alimentos = paginar_por_nombre(alimentos_q, Food, request.args.get("alimentos_tras"))
+    recetas, siguiente_recetas = paginar_por_nombre(recetas_q, Recipe, request.args.get("recetas_tras"))
+
+    # Número de ingredientes de las recetas de la página en una sola consulta agrupada
+    num_ingredientes = dict(
+        db.session.query(RecipeIngredient.recipe_id, func.count(RecipeIngredient.id))
+        .filter(RecipeIngredient.recipe_id.in_([r.id for r in recetas]))
+        .group_by(RecipeIngredient.recipe_id)
+    ) if recetas else {}
+
+    return render_template("mis_alimentos.html", alimentos=alimentos, recetas=recetas,
+                           num_ingredientes=num_ingredientes, texto=texto,
+                           siguiente_alimentos=siguiente_alimentos, siguiente_recetas=siguiente_recetas,
+                           pestana=request.args.get("pestana", "alimentos"))
+
+@bp.route("/receta/<int:recipe_id>/ingredientes")
+@login_required
+@basedatos.solo_lectura
+def detalle_receta(recipe_id):
+    """Fragmento HTML con la tabla de ingredientes, cargado al desplegar la receta en el catálogo."""
+    r = (Recipe.query.options(selectinload(Recipe.ingredients).joinedload(RecipeIngredient.food))
+         .get_or_404(recipe_id))
+    if r.user_id != current_user.id:
+        abort(404)
+    return render_template("_ingredientes_receta.html", r=r, t=r.get_totales())
+
+@bp.route("/add_food", methods=["GET", "POST"])
 @login_required
 def add_food():
     if request.method == "POST":
@@ -216,36 +424,47 @@ def add_food():
         db.session.add(nuevo)
         db.session.commit()
         flash(f"Alimento '{nuevo.name}' añadido.", "success")
-        return redirect(url_for("mis_alimentos"))
+        return redirect(url_for("nutri.mis_alimentos"))
     return render_template("form_food.html", alimento=None)
 
-@app.route("/edit_food/<int:food_id>", methods=["GET", "POST"])
+@bp.route("/edit_food/<int:food_id>", methods=["GET", "POST"])
 @login_required
 def edit_food(food_id):
     """
     Permite modificar los valores de un alimento existente.
     Verifica que el alimento pertenezca al usuario activo antes de editar.
+    Los del catálogo base son de solo lectura: al guardarlos se edita la copia personal del usuario.
     """
     f = Food.query.get_or_404(food_id)
     
-    # Seguridad: si el alimento no es del usuario, redirigimos
-    if f.user_id != current_user.id: 
-        return redirect(url_for('mis_alimentos'))
+    # Seguridad: si el alimento no es del usuario ni del catálogo base, redirigimos
+    if not f.es_base and f.user_id != current_user.id: 
+        return redirect(url_for('nutri.mis_alimentos'))
         
     if request.method == "POST":
+        if f.es_base:
+            f = personalizar_alimento_base(f, current_user.id)
         f.name = request.form.get("name")
         f.kcal_100g = float(request.form.get("kcal"))
         f.prot_100g = float(request.form.get("prot"))
         f.carb_100g = float(request.form.get("carb"))
         f.fat_100g = float(request.form.get("fat"))
+
+        # Las recetas que usan este alimento deben actualizar sus totales materializados
+        recetas = Recipe.query.join(Recipe.ingredients).filter(RecipeIngredient.food_id == f.id).distinct().all()
+        for receta in recetas:
+            recalcular_totales_receta(receta)
+        # Y los días registrados con este alimento (directamente o en receta) cambian sus totales
+        recalcular_resumenes_afectados(food_ids=[f.id])
+        cache.marcar_datos_modificados(current_user.id)
         
         db.session.commit()
         flash("Alimento actualizado correctamente.", "success")
-        return redirect(url_for('mis_alimentos'))
+        return redirect(url_for('nutri.mis_alimentos'))
         
     return render_template("form_food.html", alimento=f)
 
-@app.route("/delete_food/<int:food_id>")
+@bp.route("/delete_food/<int:food_id>")
 @login_required
 def delete_food(food_id):
     """
@@ -253,17 +472,24 @@ def delete_food(food_id):
     Controla el error si el alimento está referenciado en una receta (Integridad).
     """
     f = Food.query.get_or_404(food_id)
-    if f.user_id == current_user.id:
+    if f.es_base:
+        flash("Los alimentos del catálogo básico no se pueden eliminar.", "warning")
+    elif f.user_id == current_user.id:
         try:
+            # Sus registros se quedan sin alimento: los días donde aparecían se recalculan en la misma transacción
+            dias = dias_afectados(food_ids=[f.id])
             db.session.delete(f)
+            db.session.flush()
+            recalcular_resumenes(dias)
+            cache.marcar_datos_modificados(current_user.id)
             db.session.commit()
             flash("Alimento eliminado.", "info")
         except Exception:
             db.session.rollback()
             flash("No se puede eliminar: el alimento está en uso en alguna receta.", "danger")
-    return redirect(url_for('mis_alimentos'))
+    return redirect(url_for('nutri.mis_alimentos'))
 
-@app.route("/add_recipe", methods=["GET", "POST"])
+@bp.route("/add_recipe", methods=["GET", "POST"])
 @login_required
 def add_recipe():
     """
@@ -277,22 +503,26 @@ def add_recipe():
         f_ids, grams = request.form.getlist("food_ids[]"), request.form.getlist("grams[]")
         for fid, g in zip(f_ids, grams):
             if fid and g: db.session.add(RecipeIngredient(recipe_id=nueva.id, food_id=int(fid), grams=float(g)))
+        db.session.flush()
+        db.session.expire(nueva, ["ingredients"])
+        recalcular_totales_receta(nueva)
         db.session.commit()
         flash("Receta creada.", "success")
-        return redirect(url_for("mis_alimentos"))
-    alimentos = Food.query.filter_by(user_id=current_user.id).order_by(Food.name).all()
-    return render_template("form_recipe.html", receta=None, alimentos=alimentos)
+        return redirect(url_for("nutri.mis_alimentos"))
+    # Los ingredientes se eligen con el buscador (api_buscar): no enviamos el catálogo completo
+    return render_template("form_recipe.html", receta=None)
 
-@app.route("/edit_recipe/<int:recipe_id>", methods=["GET", "POST"])
+@bp.route("/edit_recipe/<int:recipe_id>", methods=["GET", "POST"])
 @login_required
 def edit_recipe(recipe_id):
     """
     Permite modificar una receta y sus ingredientes.
     Elimina los ingredientes anteriores y registra los nuevos para simplificar la actualización.
     """
-    r = Recipe.query.get_or_404(recipe_id)
+    r = (Recipe.query.options(selectinload(Recipe.ingredients).joinedload(RecipeIngredient.food))
+         .get_or_404(recipe_id))
     if r.user_id != current_user.id: 
-        return redirect(url_for('mis_alimentos'))
+        return redirect(url_for('nutri.mis_alimentos'))
         
     if request.method == "POST":
         r.name = request.form.get("name")
@@ -305,15 +535,21 @@ def edit_recipe(recipe_id):
         for fid, g in zip(f_ids, grams):
             if fid and g:
                 db.session.add(RecipeIngredient(recipe_id=r.id, food_id=int(fid), grams=float(g)))
+
+        # Recargamos los ingredientes ya persistidos y materializamos los nuevos totales
+        db.session.flush()
+        db.session.expire(r, ["ingredients"])
+        recalcular_totales_receta(r)
+        recalcular_resumenes_afectados(recipe_ids=[r.id])
+        cache.marcar_datos_modificados(current_user.id)
         
         db.session.commit()
         flash("Receta actualizada con éxito.", "success")
-        return redirect(url_for('mis_alimentos'))
+        return redirect(url_for('nutri.mis_alimentos'))
         
-    alimentos = Food.query.filter_by(user_id=current_user.id).all()
-    return render_template("form_recipe.html", receta=r, alimentos=alimentos)
+    return render_template("form_recipe.html", receta=r)
 
-@app.route("/delete_recipe/<int:recipe_id>")
+@bp.route("/delete_recipe/<int:recipe_id>")
 @login_required
 def delete_recipe(recipe_id):
     """
@@ -322,89 +558,162 @@ def delete_recipe(recipe_id):
     """
     r = Recipe.query.get_or_404(recipe_id)
     if r.user_id == current_user.id:
+        # Sus registros se quedan sin receta: los días donde aparecían se recalculan en la misma transacción
+        dias = dias_afectados(recipe_ids=[r.id])
         db.session.delete(r)
+        db.session.flush()
+        recalcular_resumenes(dias)
+        cache.marcar_datos_modificados(current_user.id)
         db.session.commit()
         flash("Receta eliminada correctamente.", "info")
-    return redirect(url_for('mis_alimentos'))
+    return redirect(url_for('nutri.mis_alimentos'))
 
 # --- CARGA DE DATOS Y LIMPIEZA ---
 
-@app.route("/cargar_basicos")
+def _lanzar_tarea(tipo, **parametros):
+    """Encola la tarea y lleva al usuario a la página que sigue su avance."""
+    try:
+        tarea_id = tareas.servicio.encolar(tipo, current_user.id, **parametros)
+    except tareas.ColaTareasLlena:
+        flash("Hay demasiadas operaciones en marcha. Inténtalo de nuevo en unos minutos.", "warning")
+        return redirect(url_for("nutri.mis_alimentos"))
+    return redirect(url_for("nutri.ver_tarea", tarea_id=tarea_id))
+
+@bp.route("/cargar_basicos")
 @login_required
 def cargar_basicos():
-    """Seed de base de datos desde un archivo JSON externo."""
-    path = os.path.join(app.root_path, 'alimentos_basicos.json')
-    if not os.path.exists(path):
+    """
+    El catálogo básico es común a todos los usuarios y se carga una sola vez (migración 6).
+    Este enlace solo añade las entradas nuevas que se hayan incorporado al JSON desde entonces.
+    """
+    if not os.path.exists(importacion.RUTA_CATALOGO_BASE):
         flash("Archivo JSON no encontrado.", "danger")
-        return redirect(url_for("mis_alimentos"))
-    with open(path, 'r', encoding='utf-8') as f:
-        basicos = json.load(f)
-    cont = 0
-    for b in basicos:
-        # Evitamos duplicados por nombre para el mismo usuario
-        if not Food.query.filter_by(name=b["name"], user_id=current_user.id).first():
-            db.session.add(Food(name=b["name"], kcal_100g=b["kcal"], prot_100g=b["prot"], 
-                                carb_100g=b["carb"], fat_100g=b["fat"], user_id=current_user.id))
-            cont += 1
-    db.session.commit()
-    flash(f"Añadidos {cont} alimentos básicos.", "success")
-    return redirect(url_for("mis_alimentos"))
-
-@app.route("/limpiar_catalogo")
+        return redirect(url_for("nutri.mis_alimentos"))
+    return _lanzar_tarea("cargar_basicos")
+
+@bp.route("/importar_alimentos", methods=["GET", "POST"])
+@login_required
+def importar_alimentos():
+    """
+    Importación masiva de alimentos desde un fichero CSV o JSON (array de objetos o NDJSON).
+    Columnas: name, kcal, prot, carb, fat (valores por 100g).
+    El fichero se guarda en disco y se importa en segundo plano.
+    """
+    if request.method == "POST":
+        archivo = request.files.get("archivo")
+        if not archivo or not archivo.filename:
+            flash("Selecciona un fichero para importar.", "warning")
+            return redirect(url_for("nutri.importar_alimentos"))
+
+        formato = "csv" if archivo.filename.lower().endswith(".csv") else "json"
+        os.makedirs(current_app.config["TAREAS_DIR"], exist_ok=True)
+        ruta = os.path.join(current_app.config["TAREAS_DIR"], f"{uuid.uuid4().hex}.{formato}")
+        archivo.save(ruta)
+        return _lanzar_tarea("importar_alimentos", ruta=ruta, formato=formato)
+    return render_template("importar_alimentos.html")
+
+@bp.route("/limpiar_catalogo")
 @login_required
 def limpiar_catalogo():
     """
-    Eliminación masiva con control de excepciones. 
+    Eliminación masiva de los alimentos sin uso.
     Protege alimentos que ya están siendo usados en recetas o registros diarios.
+    Con ?simular=1 solo informa de lo que se borraría (es un recuento: no hace falta una tarea).
     """
-    alimentos = Food.query.filter_by(user_id=current_user.id).all()
-    borrados = protegidos = 0
-    for f in alimentos:
-        try:
-            db.session.delete(f)
-            db.session.commit()
-            borrados += 1
-        except Exception:
-            db.session.rollback()
-            protegidos += 1
-    flash(f"Limpieza: {borrados} eliminados, {protegidos} aún en uso.", "info")
-    return redirect(url_for('mis_alimentos'))
+    if request.args.get("simular") == "1":
+        resultado = limpiar_catalogo_usuario(current_user.id, simular=True)
+        flash(f"Simulación: se eliminarían {resultado['borrables']} alimentos, "
+              f"{resultado['protegidos']} están en uso.", "info")
+        return redirect(url_for('nutri.mis_alimentos'))
+    return _lanzar_tarea("limpiar_catalogo")
+
+# --- TAREAS EN SEGUNDO PLANO ---
+
+def _tarea_a_dict(tarea):
+    return {
+        "id": tarea.id,
+        "tipo": tarea.tipo,
+        "estado": tarea.estado,
+        "progreso": round(tarea.progreso, 3),
+        "resultado": json.loads(tarea.resultado) if tarea.resultado else None,
+        "error": tarea.error,
+    }
+
+@bp.route("/tareas/<int:tarea_id>")
+@login_required
+def ver_tarea(tarea_id):
+    """Página que muestra el avance de una tarea consultando /api/tareas/<id> hasta que termina."""
+    tarea = tareas.servicio.obtener(tarea_id, current_user.id)
+    if tarea is None:
+        abort(404)
+    return render_template("tarea.html", tarea=_tarea_a_dict(tarea))
+
+@bp.route("/api/tareas/<int:tarea_id>")
+@login_required
+def api_tarea(tarea_id):
+    """Estado, progreso (0 a 1) y resultado de una tarea del usuario."""
+    tarea = tareas.servicio.obtener(tarea_id, current_user.id)
+    if tarea is None:
+        abort(404)
+    respuesta = jsonify(_tarea_a_dict(tarea))
+    respuesta.headers["Cache-Control"] = "no-store"
+    return respuesta
 
 # --- DIARIO DE CONSUMO ---
 
-@app.route("/add_log", methods=["GET", "POST"])
+@bp.route("/add_log", methods=["GET", "POST"])
 @login_required
 def add_log():
     """
-    Registro de ingesta. 
+    Registro de ingesta: uno o varios elementos (una comida completa) en la misma petición.
     Guarda un 'snapshot' de las metas actuales del usuario para que el historial sea inalterable.
     """
     date_str = request.args.get('date', date.today().strftime('%Y-%m-%d'))
     if request.method == "POST":
-        item, grams = request.form.get("item_id"), float(request.form.get("grams", 0))
-        f_date = datetime.strptime(request.form.get("date"), '%Y-%m-%d').date()
-        
-        # El prefijo del ID nos dice si es alimento base o receta compuesta
-        tipo, rid = item.split("_")
-        nuevo = DailyLog(user_id=current_user.id, grams=grams, date=f_date,
-                         target_kcal_snapshot=current_user.target_kcal,
-                         target_protein_snapshot=current_user.target_protein,
-                         target_carbs_snapshot=current_user.target_carbs,
-                         target_fat_snapshot=current_user.target_fat)
-        
-        if tipo == "food": nuevo.food_id = int(rid)
-        else: nuevo.recipe_id = int(rid)
-        
-        db.session.add(nuevo)
+        try:
+            f_date = datetime.strptime(request.form.get("date", ""), '%Y-%m-%d').date()
+            items = []
+            # El prefijo del ID nos dice si es alimento base o receta compuesta
+            for item, grams in zip(request.form.getlist("item_id"), request.form.getlist("grams")):
+                tipo, rid = item.split("_")
+                items.append((tipo, int(rid), float(grams)))
+            # Todos los elementos se insertan juntos, con el resumen del día, o ninguno
+            total = registrar_lote(current_user, f_date, items)
+        except ValueError:
+            db.session.rollback()
+            flash("Revisa los elementos: alguno no es válido.", "danger")
+            return redirect(url_for("nutri.add_log", date=date_str))
+        cache.marcar_datos_modificados(current_user.id)
         db.session.commit()
-        flash("Consumo registrado.", "success")
-        return redirect(url_for("index", date_str=f_date.strftime("%Y-%m-%d")))
+        flash("Consumo registrado." if total == 1 else f"{total} consumos registrados.", "success")
+        return redirect(url_for("nutri.index", date_str=f_date.strftime("%Y-%m-%d")))
     
-    alimentos = Food.query.filter_by(user_id=current_user.id).all()
-    recetas = Recipe.query.filter_by(user_id=current_user.id).all()
-    return render_template("add_log.html", alimentos=alimentos, recetas=recetas, selected_date=date_str)
+    return render_template("add_log.html", selected_date=date_str)
 
-@app.route("/delete_log/<int:log_id>")
+@bp.route("/copiar_dia", methods=["POST"])
+@login_required
+def copiar_dia():
+    """
+    Repite en un día los registros de otro (p. ej. las comidas de ayer). Con log_id se copian
+    solo esos registros del día de origen, para repetir una comida concreta.
+    """
+    try:
+        origen = datetime.strptime(request.form.get("origen", ""), "%Y-%m-%d").date()
+        destino = datetime.strptime(request.form.get("destino", ""), "%Y-%m-%d").date()
+        log_ids = [int(i) for i in request.form.getlist("log_id")] or None
+    except ValueError:
+        abort(400)
+
+    copiados = copiar_registros(current_user, origen, destino, log_ids)
+    if copiados:
+        cache.marcar_datos_modificados(current_user.id)
+        db.session.commit()
+        flash(f"{copiados} registros copiados del {origen.strftime('%d/%m/%Y')}.", "success")
+    else:
+        flash("No hay registros que copiar en ese día.", "info")
+    return redirect(url_for("nutri.index", date_str=destino.strftime("%Y-%m-%d")))
+
+@bp.route("/delete_log/<int:log_id>")
 @login_required
 def delete_log(log_id):
     """
@@ -415,16 +724,258 @@ def delete_log(log_id):
     if log.user_id == current_user.id:
         f_ret = log.date.strftime("%Y-%m-%d")
         db.session.delete(log)
+        aplicar_log_a_resumen(log, signo=-1)
+        cache.marcar_datos_modificados(current_user.id)
         db.session.commit()
         flash("Registro eliminado del diario.", "info")
-        return redirect(url_for('index', date_str=f_ret))
-    return redirect(url_for('root'))
+        return redirect(url_for('nutri.index', date_str=f_ret))
+    return redirect(url_for('nutri.root'))
+
+# --- BUSCADOR ---
+
+@bp.route("/api/buscar")
+@login_required
+@basedatos.solo_lectura
+def api_buscar():
+    """
+    Autocompletado de alimentos y recetas del usuario (sin tildes ni mayúsculas, por prefijo
+    o aproximado). Devuelve JSON con las mejores coincidencias: ?q=texto&tipo=food|recipe&limite=10
+    """
+    tipo = request.args.get("tipo")
+    if tipo in ("food", "recipe"):
+        tipos = (tipo,)
+    elif tipo is None:
+        tipos = ("food", "recipe")
+    else:
+        abort(400)
+    limite = request.args.get("limite", 10, type=int)
+    return jsonify(busqueda.buscar(current_user.id, request.args.get("q", ""), limite, tipos))
 
-# Inicia la base de datos dentro del contexto de la aplicación
-with app.app_context():
-    db.create_all()
+@bp.route("/api/day/<date_str>")
+@login_required
+@basedatos.solo_lectura
+def api_dia(date_str):
+    """
+    Resumen, objetivos y registros de un día en JSON, con ETag fuerte.
+    El ETag sale de la versión del resumen del día, así que un sondeo repetido con
+    If-None-Match se responde con 304 tras leer una sola fila, sin calcular macros.
+    """
+    try:
+        fecha = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        abort(400)
+
+    dia = db.session.get(DailySummary, (current_user.id, fecha))
+    if dia is None and db.session.query(
+            DailyLog.query.filter_by(user_id=current_user.id, date=fecha).exists()).scalar():
+        # Días registrados antes de existir la tabla de resúmenes: lo generamos una única vez
+        dia = recalcular_resumen_dia(current_user.id, fecha)
+        db.session.commit()
+
+    objetivos = _objetivos_dia(dia)
+    # Sin resumen, el contenido del día solo depende de las metas actuales del usuario
+    semilla = f"{current_user.id}:{fecha.isoformat()}:{dia.version if dia else 0}:{sorted(objetivos.items())}"
+    etag = hashlib.sha1(semilla.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+    else:
+        logs = (DailyLog.query.filter_by(user_id=current_user.id, date=fecha)
+                .options(joinedload(DailyLog.food), joinedload(DailyLog.recipe))
+                .order_by(DailyLog.id)
+                .all())
+        registros = []
+        for log in logs:
+            registro = {
+                "id": log.id,
+                "tipo": "food" if log.food else "recipe" if log.recipe else None,
+                "nombre": log.get_nombre(),
+                "gramos": log.grams,
+            }
+            registro.update({clave: round(valor, 2) for clave, valor in log.get_macros().items()})
+            registros.append(registro)
+        respuesta = jsonify({
+            "fecha": fecha.isoformat(),
+            "resumen": dia.get_macros() if dia else {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0},
+            "objetivos": objetivos,
+            "registros": registros,
+        })
+    respuesta.set_etag(etag)
+    # El cliente puede guardar la respuesta, pero debe revalidarla siempre con el ETag
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    return respuesta
+
+# --- RACHAS Y ADHERENCIA ---
+
+@bp.route("/adherencia")
+@login_required
+@basedatos.solo_lectura
+def adherencia():
+    """Rachas y adherencia por macro en las últimas semanas, meses y año."""
+    return render_template("adherencia.html", datos=analitica.obtener_adherencia(current_user.id),
+                           nombres={"kcal": "Calorías", "proteinas": "Proteínas", "carbohidratos": "Carbohidratos",
+                                    "grasas": "Grasas", "todos": "Todos a la vez"})
+
+@bp.route("/api/adherencia")
+@login_required
+@basedatos.solo_lectura
+def api_adherencia():
+    """Lo mismo que /adherencia en JSON (las claves de 'ventanas' son los días de cada una)."""
+    return jsonify(analitica.obtener_adherencia(current_user.id))
+
+# --- EXPORTACIÓN DEL HISTORIAL ---
+
+def _fecha_parametro(nombre):
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        abort(400)
+
+def _cabecera_descarga(nombre):
+    """
+    Content-Disposition de una descarga con el nombre entrecomillado. Si no es ASCII se añade
+    filename* (RFC 5987) con el nombre completo, y filename queda como alternativa sin acentos.
+    """
+    try:
+        nombre.encode("ascii")
+        opciones = {"filename": nombre}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode("ascii")
+        opciones = {"filename": simple, "filename*": f"UTF-8''{quote(nombre, safe='')}"}
+    return dump_options_header("attachment", opciones)
+
+@bp.route("/exportar")
+@login_required
+@basedatos.solo_lectura
+def exportar():
+    """
+    Descarga del historial entre dos fechas (ambas opcionales) en CSV o NDJSON.
+    Con detalle=1 se incluyen los registros individuales tras el total de cada día.
+    La respuesta se genera en streaming: no se construye el fichero completo en memoria.
+    """
+    desde, hasta = _fecha_parametro("desde"), _fecha_parametro("hasta")
+    formato = request.args.get("formato", "csv")
+    if formato not in ("csv", "ndjson"):
+        abort(400)
+
+    if request.args.get("detalle") == "1":
+        filas = exportacion.filas_detalle(current_user.id, desde, hasta)
+    else:
+        filas = exportacion.filas_resumen(current_user.id, desde, hasta)
+
+    if formato == "csv":
+        cuerpo, mimetype = exportacion.serializar_csv(filas), "text/csv"
+    else:
+        cuerpo, mimetype = exportacion.serializar_ndjson(filas), "application/x-ndjson"
+
+    nombre = f"historial_{desde or 'inicio'}_{hasta or 'hoy'}.{formato}"
+    return Response(
+        stream_with_context(basedatos.iterar_con_lectura(exportacion.agrupar_en_bloques(cuerpo))),
+        mimetype=mimetype,
+        headers={"Content-Disposition": _cabecera_descarga(nombre)},
+    )
+
+@bp.route("/exportar_cuenta")
+@login_required
+@basedatos.solo_lectura
+def exportar_cuenta():
+    """
+    Descarga de todos los datos de la cuenta: perfil, alimentos propios, recetas con sus
+    ingredientes y registros diarios, en un único NDJSON o en un zip con un NDJSON por entidad.
+    Se genera en streaming, con la memoria constante sea cual sea el tamaño del historial.
+    """
+    formato = request.args.get("formato", "ndjson")
+    if formato not in ("ndjson", "zip"):
+        abort(400)
+
+    entidades = exportacion.lineas_cuenta(current_user.id)
+    if formato == "zip":
+        cuerpo, mimetype = exportacion.serializar_cuenta_zip(entidades), "application/zip"
+    else:
+        cuerpo = exportacion.agrupar_en_bloques(exportacion.serializar_cuenta_ndjson(entidades))
+        mimetype = "application/x-ndjson"
+
+    nombre = f"cuenta_{current_user.username}_{date.today().isoformat()}.{formato}"
+    return Response(
+        stream_with_context(basedatos.iterar_con_lectura(cuerpo)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": _cabecera_descarga(nombre)},
+    )
+
+@bp.route("/importar_cuenta", methods=["GET", "POST"])
+@login_required
+def importar_cuenta():
+    """
+    Carga en la cuenta actual una exportación completa (NDJSON o zip) de esta u otra instalación.
+    Como la importación de alimentos, el fichero se guarda en disco y se procesa en segundo plano.
+    """
+    if request.method == "POST":
+        archivo = request.files.get("archivo")
+        if not archivo or not archivo.filename:
+            flash("Selecciona un fichero para importar.", "warning")
+            return redirect(url_for("nutri.importar_cuenta"))
+
+        os.makedirs(current_app.config["TAREAS_DIR"], exist_ok=True)
+        ruta = os.path.join(current_app.config["TAREAS_DIR"], f"{uuid.uuid4().hex}.cuenta")
+        archivo.save(ruta)
+        return _lanzar_tarea("importar_cuenta", ruta=ruta)
+    return render_template("importar_cuenta.html")
+
+# --- MÉTRICAS ---
+
+def _metricas_procesos():
+    """Contadores de las cachés y de los pools de hash y de tareas para /metrics."""
+    caches = {"usuarios": cache.usuarios.estadisticas(), "paginas": cache.paginas.estadisticas()}
+    return [
+        ("nutri_cache_aciertos_total", "Aciertos de las cachés en memoria.", "counter",
+         {(("cache", nombre),): datos["aciertos"] for nombre, datos in caches.items()}),
+        ("nutri_cache_fallos_total", "Fallos de las cachés en memoria.", "counter",
+         {(("cache", nombre),): datos["fallos"] for nombre, datos in caches.items()}),
+        ("nutri_cache_bytes", "Memoria ocupada por las entradas de cada caché.", "gauge",
+         {(("cache", nombre),): datos["bytes"] for nombre, datos in caches.items()}),
+        ("nutri_hash_rechazados_total", "Operaciones de contraseña rechazadas por saturación.", "counter",
+         {(): contrasenas.servicio.rechazados}),
+        ("nutri_tareas_rechazadas_total", "Tareas en segundo plano rechazadas por saturación.", "counter",
+         {(): tareas.servicio.rechazadas}),
+    ]
+
+metricas.COLECTORES.append(_metricas_procesos)
+
+@bp.route("/metrics")
+def metrics():
+    """Histogramas de peticiones, SQL y plantillas en formato de texto de Prometheus."""
+    token = current_app.config.get("METRICAS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
+    return Response(metricas.exponer(), mimetype="text/plain; version=0.0.4")
+
+# --- MANTENIMIENTO DEL ESQUEMA ---
+
+@bp.cli.command("migrar")
+def comando_migrar():
+    """Crea las tablas que falten y aplica las migraciones de esquema pendientes."""
+    aplicadas = preparar_esquema()
+    print(f"Migraciones aplicadas: {aplicadas or 'ninguna pendiente'}")
+
+@bp.cli.command("explain")
+def comando_explain():
+    """Muestra el plan de ejecución de las consultas principales y avisa si alguna no usa índice."""
+    informe = informe_explain()
+    for nombre, datos in informe.items():
+        estado = "OK" if datos["usa_indice"] else "SIN ÍNDICE"
+        print(f"[{estado}] {nombre}")
+        for linea in datos["plan"]:
+            print(f"    {linea}")
+    if not all(d["usa_indice"] for d in informe.values()):
+        raise SystemExit(1)
 
 if __name__ == "__main__":
+    app = create_app()
+    # Servidor de desarrollo: preparamos el esquema local como haría 'flask migrar'
+    with app.app_context():
+        preparar_esquema()
     # En local usaremos el puerto 5000, en la nube el que nos asigne el sistema
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
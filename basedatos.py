@@ -0,0 +1,206 @@
+"""
+Ajustes de la conexión a la base de datos.
+
+En despliegues pequeños la aplicación corre sobre SQLite con varios workers de gunicorn.
+Con el diario de rollback por defecto, un escritor bloquea también a los lectores y los
+demás escritores fallan al momento con "database is locked". El perfil de producción activa:
+
+- journal_mode=WAL: los lectores no bloquean al escritor ni el escritor a los lectores.
+- busy_timeout: un escritor espera a que termine el otro en lugar de fallar.
+- synchronous=NORMAL: con WAL no pierde integridad; solo puede perder la última transacción
+  ante un corte de luz (no ante la caída del proceso), a cambio de no hacer fsync en cada commit.
+- cache_size y mmap_size: más páginas en memoria por conexión y lecturas sin copia.
+
+Cada PRAGMA se puede ajustar por separado con variables de entorno (ver configurar_sqlite).
+
+También define el pool de conexiones y el reparto de lecturas: con DATABASE_REPLICA_URL las
+consultas de las rutas de solo lectura van a la réplica, salvo justo después de que el usuario
+haya escrito (lee sus propias escrituras en la primaria mientras la réplica se pone al día).
+"""
+import os
+import time
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+# Perfiles de PRAGMA para SQLite; foreign_keys se activa siempre
+PERFILES_SQLITE = {
+    # Solo integridad referencial: el comportamiento original
+    "basico": {},
+    "produccion": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        # Negativo: en KiB (64 MiB de caché de páginas por conexión)
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+    },
+}
+
+# Variables de entorno que sobrescriben cada PRAGMA del perfil
+VARIABLES_PRAGMA = {
+    "busy_timeout": "SQLITE_BUSY_TIMEOUT_MS",
+    "journal_mode": "SQLITE_JOURNAL_MODE",
+    "synchronous": "SQLITE_SYNCHRONOUS",
+    "cache_size": "SQLITE_CACHE_SIZE",
+    "mmap_size": "SQLITE_MMAP_SIZE",
+}
+
+
+def configurar_sqlite(app):
+    """
+    Calcula los PRAGMA de la aplicación a partir de SQLITE_PERFIL ("produccion" o "basico")
+    y de las variables que ajustan cada uno, y los guarda en app.config["SQLITE_PRAGMAS"].
+    """
+    perfil = app.config.setdefault("SQLITE_PERFIL", os.environ.get("SQLITE_PERFIL", "produccion"))
+    if perfil not in PERFILES_SQLITE:
+        raise ValueError(f"SQLITE_PERFIL desconocido: {perfil}")
+    pragmas = dict(PERFILES_SQLITE[perfil])
+    for pragma, variable in VARIABLES_PRAGMA.items():
+        if os.environ.get(variable):
+            pragmas[pragma] = os.environ[variable]
+    app.config["SQLITE_PRAGMAS"] = pragmas
+    return pragmas
+
+
+def aplicar_pragmas(dbapi_connection, pragmas):
+    """Ejecuta los PRAGMA en una conexión nueva de sqlite3 (busy_timeout primero, para que el resto espere)."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA foreign_keys=ON")
+        for pragma, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={valor}")
+    finally:
+        cursor.close()
+
+
+def preparar_engine(engine, pragmas):
+    """Aplica los PRAGMA en cada conexión nueva del engine si es SQLite (PostgreSQL no los necesita)."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", lambda dbapi_connection, _: aplicar_pragmas(dbapi_connection, pragmas))
+
+
+# --- POOL DE CONEXIONES ---
+
+def opciones_engine(url):
+    """
+    Opciones del pool para SQLALCHEMY_ENGINE_OPTIONS (se aplican también a la réplica):
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE (segundos) y DB_POOL_PRE_PING (1/0).
+    La SQLite en memoria usa un pool de una única conexión, sin tamaño que configurar.
+    """
+    opciones = {
+        # Detecta las conexiones que el servidor cerró (reinicios, timeouts) antes de usarlas
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+    }
+    if url.startswith("sqlite") and url.rstrip("/") in ("sqlite:", "sqlite:///:memory:"):
+        return opciones
+    opciones["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 5))
+    opciones["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    # Renovamos las conexiones antes de que las corte un proxy o el propio servidor
+    opciones["pool_recycle"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    return opciones
+
+
+# Engines cuyas conexiones se descartan en los procesos hijos. Débil: los engines de
+# aplicaciones que ya no existen (pruebas, comandos de la CLI) desaparecen solos
+_engines_del_proceso = weakref.WeakSet()
+
+
+def _descartar_en_el_hijo():
+    for engine in list(_engines_del_proceso):
+        engine.dispose(close=False)
+
+
+# Un único gancho por proceso, por muchas aplicaciones que se creen
+os.register_at_fork(after_in_child=_descartar_en_el_hijo)
+
+
+def descartar_conexiones_al_bifurcar(engines):
+    """
+    Tras un fork (gunicorn --preload, multiprocessing), el hijo olvida las conexiones que
+    hubiera abierto el padre sin cerrarlas: siguen siendo del padre, y compartir un socket o
+    un fichero SQLite abierto entre procesos corrompe el protocolo. Cada hijo abre las suyas.
+    """
+    _engines_del_proceso.update(engines)
+
+
+# --- RÉPLICA DE LECTURA ---
+
+BIND_REPLICA = "replica"
+# Momento de la última escritura del usuario, en su cookie de sesión
+CLAVE_ESCRITURA = "_ultima_escritura"
+
+
+class SesionEnrutada(Session):
+    """
+    Sesión que manda las lecturas a la réplica cuando está activada con lectura_replica().
+    Todo lo que no es un SELECT (flush, UPDATE/DELETE masivos, SQL textual) va a la primaria,
+    y desde la primera escritura las lecturas siguientes también, para ver lo recién escrito.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not isinstance(clause, Select)):
+                self.info["escritura"] = True
+                self.info["leer_de_replica"] = False
+            elif self.info.get("leer_de_replica"):
+                replica = self._db.engines.get(BIND_REPLICA)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def escritura_reciente():
+    """True si el usuario escribió hace menos de REPLICA_RETRASO_MAX segundos."""
+    ultima = session.get(CLAVE_ESCRITURA)
+    return ultima is not None and time.time() - ultima < current_app.config.get("REPLICA_RETRASO_MAX", 5)
+
+
+@contextmanager
+def lectura_replica(activa=True):
+    """Manda a la réplica (si existe) las lecturas de la sesión dentro del bloque."""
+    info = current_app.extensions["sqlalchemy"].session.info
+    previo = info.get("leer_de_replica", False)
+    info["leer_de_replica"] = activa
+    try:
+        yield
+    finally:
+        info["leer_de_replica"] = previo
+
+
+def solo_lectura(vista):
+    """Decorador de las rutas que pueden leer de la réplica, salvo tras una escritura reciente."""
+    @wraps(vista)
+    def envoltorio(*args, **kwargs):
+        with lectura_replica(not escritura_reciente()):
+            return vista(*args, **kwargs)
+    return envoltorio
+
+
+def iterar_con_lectura(iterable):
+    """
+    Conserva el destino de las lecturas decidido en la vista mientras se consume una respuesta
+    en streaming, que se genera cuando la vista (y su decorador) ya han terminado.
+    """
+    activa = current_app.extensions["sqlalchemy"].session.info.get("leer_de_replica", False)
+
+    def generador():
+        with lectura_replica(activa):
+            yield from iterable
+    return generador()
+
+
+def inicio_peticion():
+    current_app.extensions["sqlalchemy"].session.info.pop("escritura", None)
+
+
+def fin_peticion():
+    """Si la petición escribió, las lecturas del usuario van a la primaria durante un tiempo."""
+    db = current_app.extensions["sqlalchemy"]
+    if db.session.info.pop("escritura", False) and BIND_REPLICA in db.engines:
+        session[CLAVE_ESCRITURA] = time.time()
@@ -0,0 +1,102 @@
+"""
+Arranque en frío: cuánto tarda un proceso nuevo desde que importa la aplicación hasta servir
+su primera respuesta, como un worker de gunicorn recién lanzado o una invocación de la CLI.
+
+    python -m benchmarks.arranque                  # 10 procesos, mediana y máximo de cada fase
+    python -m benchmarks.arranque --procesos 20 --json
+
+Cada medición es un intérprete nuevo (python -c) y separa tres fases: importar app.py, crear
+la aplicación con create_app() y atender la primera petición (GET /login, que no consulta la
+base de datos, y GET /day/<hoy> con sesión, que sí abre la primera conexión). El total
+incluye además el arranque del propio intérprete. El esquema se prepara una vez antes de medir.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Programa de cada proceso medido: imprime los tiempos de cada fase en JSON
+PROCESO = """
+import json, sys, time
+from datetime import date
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app({"SQLALCHEMY_DATABASE_URI": sys.argv[1]})
+creada = time.perf_counter()
+cliente = app.test_client()
+assert cliente.get("/login").status_code == 200
+primera = time.perf_counter()
+with cliente.session_transaction() as sesion:
+    sesion["_user_id"] = "1"
+with app.app_context():
+    assert cliente.get(f"/day/{date.today().isoformat()}").status_code == 200
+con_datos = time.perf_counter()
+print(json.dumps({
+    "importar_ms": (importado - inicio) * 1000,
+    "create_app_ms": (creada - importado) * 1000,
+    "primera_respuesta_ms": (primera - creada) * 1000,
+    "primera_consulta_ms": (con_datos - primera) * 1000,
+}))
+"""
+
+
+def preparar(url):
+    """Crea el esquema y un usuario para la petición con sesión, como haría el despliegue."""
+    sys.path.insert(0, RAIZ)
+    from app import create_app
+    from migraciones import preparar_esquema
+    from models import db, User
+    from benchmarks.generador import PASSWORD_SINTETICA
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": url})
+    with app.app_context():
+        preparar_esquema()
+        db.session.add(User(username="arranque", email="arranque@bench.local", password=PASSWORD_SINTETICA))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def medir(url, procesos):
+    """Lanza los procesos uno tras otro y devuelve la mediana y el máximo de cada fase (ms)."""
+    muestras = []
+    for _ in range(procesos):
+        inicio = time.perf_counter()
+        salida = subprocess.run([sys.executable, "-c", PROCESO, url], cwd=RAIZ,
+                                capture_output=True, text=True, check=True)
+        fases = json.loads(salida.stdout.strip().splitlines()[-1])
+        fases["total_ms"] = (time.perf_counter() - inicio) * 1000
+        muestras.append(fases)
+    return {
+        fase: {"p50": round(statistics.median(m[fase] for m in muestras), 1),
+               "max": round(max(m[fase] for m in muestras), 1)}
+        for fase in muestras[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--procesos", type=int, default=10)
+    parser.add_argument("--url", help="base de datos (por defecto, un SQLite temporal)")
+    parser.add_argument("--json", action="store_true", help="imprime solo el resultado en JSON")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{tempfile.mkdtemp()}/arranque.db"
+    preparar(url)
+    resultado = medir(url, args.procesos)
+    if args.json:
+        print(json.dumps(resultado))
+        return
+    print(f"{'fase':<24}{'p50 ms':>10}{'max ms':>10}")
+    for fase, datos in resultado.items():
+        print(f"{fase:<24}{datos['p50']:>10.1f}{datos['max']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
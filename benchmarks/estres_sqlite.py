@@ -0,0 +1,131 @@
+"""
+Prueba de estrés de SQLite con varios procesos escribiendo y leyendo a la vez.
+
+Cada proceso hace de worker de gunicorn: crea la aplicación sobre el mismo fichero SQLite
+y alterna registros (POST /add_log) con visitas al diario (GET /day/<hoy>) durante unos
+segundos. Al final se informa del rendimiento y de cualquier respuesta con error, que con
+el perfil de producción no debería haber ninguna ("database is locked" sale como 500).
+
+    python -m benchmarks.estres_sqlite --procesos 4 --segundos 10
+    python -m benchmarks.estres_sqlite --perfil basico      # PRAGMA originales, para comparar
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _crear_app(url, perfil):
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    from app import create_app
+    return create_app({"SQLALCHEMY_DATABASE_URI": url, "SQLITE_PERFIL": perfil})
+
+
+def trabajador(url, perfil, user_id, food_id, segundos, inicio, cola):
+    """Bucle de un proceso: escribe y lee hasta agotar el tiempo, y devuelve los recuentos."""
+    app = _crear_app(url, perfil)
+
+    # Las excepciones se convierten en respuestas 500, como en producción
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    app.logger.disabled = True
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["_user_id"] = str(user_id)
+        sesion["_fresh"] = True
+    hoy = date.today().isoformat()
+
+    estados = Counter()
+    inicio.wait()
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        with app.app_context():
+            escritura = cliente.post("/add_log", data={"item_id": f"food_{food_id}", "grams": "100", "date": hoy})
+        estados[("escritura", escritura.status_code)] += 1
+        with app.app_context():
+            lectura = cliente.get(f"/day/{hoy}")
+        estados[("lectura", lectura.status_code)] += 1
+    cola.put(dict(estados))
+
+
+def ejecutar(procesos=4, segundos=5.0, perfil="produccion"):
+    """Lanza los procesos sobre una base de datos nueva y devuelve el resumen de la prueba."""
+    url = f"sqlite:///{tempfile.mkdtemp()}/estres.db"
+    app = _crear_app(url, perfil)
+    contexto = multiprocessing.get_context("spawn")
+
+    # El esquema y los datos se crean antes de lanzar los procesos, como haría el despliegue
+    from models import db, User, Food
+    from migraciones import preparar_esquema
+    from benchmarks.generador import PASSWORD_SINTETICA
+
+    usuarios = []
+    with app.app_context():
+        preparar_esquema()
+        alimento = Food(name="Arroz", kcal_100g=350, prot_100g=7, carb_100g=80, fat_100g=1)
+        db.session.add(alimento)
+        for i in range(procesos):
+            usuario = User(username=f"estres{i}", email=f"estres{i}@bench.local", password=PASSWORD_SINTETICA)
+            db.session.add(usuario)
+            usuarios.append(usuario)
+        db.session.commit()
+        food_id, user_ids = alimento.id, [u.id for u in usuarios]
+        db.engine.dispose()
+
+    inicio, cola = contexto.Event(), contexto.Queue()
+    hijos = [contexto.Process(target=trabajador, args=(url, perfil, uid, food_id, segundos, inicio, cola))
+             for uid in user_ids]
+    for hijo in hijos:
+        hijo.start()
+    # Los procesos tardan en importar la aplicación: todos empiezan a medir a la vez
+    time.sleep(2)
+    inicio.set()
+    totales = Counter()
+    for _ in hijos:
+        totales.update(cola.get())
+    for hijo in hijos:
+        hijo.join()
+
+    escrituras = sum(n for (tipo, _), n in totales.items() if tipo == "escritura")
+    lecturas = sum(n for (tipo, _), n in totales.items() if tipo == "lectura")
+    errores = sum(n for (_, estado), n in totales.items() if estado >= 500)
+    return {
+        "perfil": perfil,
+        "procesos": procesos,
+        "escrituras": escrituras,
+        "lecturas": lecturas,
+        "errores": errores,
+        "escrituras_por_segundo": round(escrituras / segundos, 1),
+        "lecturas_por_segundo": round(lecturas / segundos, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--perfil", default="produccion", help="perfil de PRAGMA de SQLite (ver basedatos.py)")
+    parser.add_argument("--json", action="store_true", help="imprime el resultado en JSON")
+    args = parser.parse_args()
+
+    resultado = ejecutar(args.procesos, args.segundos, args.perfil)
+    if args.json:
+        print(json.dumps(resultado))
+        return
+    print(f"Perfil: {resultado['perfil']} | procesos: {resultado['procesos']}")
+    print(f"escrituras: {resultado['escrituras']} ({resultado['escrituras_por_segundo']}/s) | "
+          f"lecturas: {resultado['lecturas']} ({resultado['lecturas_por_segundo']}/s) | "
+          f"errores: {resultado['errores']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Generador reproducible de datos sintéticos: N usuarios × M días de registros × K recetas.
+
+Con la misma semilla genera siempre los mismos datos. Cada usuario recibe alimentos propios,
+recetas de 3 a 12 ingredientes (entre los suyos y los del catálogo base) y entre 3 y 7
+registros por día que terminan hoy, para que las ventanas de 7 y 30 días tengan datos.
+Se ejecuta dentro de un contexto de aplicación:
+
+    python -m benchmarks.generador --usuarios 5 --dias 180 --recetas 20 --url sqlite:////tmp/bench.db
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+# Hash barato: los usuarios sintéticos no necesitan el coste de producción
+PASSWORD_SINTETICA = "pbkdf2:sha256:1000$sintetico$0"
+
+
+def _alimento(rng, i):
+    prot, carb, fat = rng.uniform(0, 30), rng.uniform(0, 80), rng.uniform(0, 40)
+    return {"name": f"Alimento sintético {i:05d}", "kcal_100g": round(prot * 4 + carb * 4 + fat * 9, 1),
+            "prot_100g": round(prot, 1), "carb_100g": round(carb, 1), "fat_100g": round(fat, 1)}
+
+
+def generar(usuarios=2, dias=30, recetas=5, alimentos=20, semilla=42, hasta=None):
+    """
+    Inserta los datos y devuelve los ids de los usuarios creados.
+    Hace commit al terminar; los registros van con INSERT masivo y los resúmenes con una
+    única agregación por lote de días.
+    """
+    from models import db, User, Food, Recipe, RecipeIngredient, DailyLog
+    from logic import recalcular_totales_receta, recalcular_resumenes
+    from importacion import importar_catalogo_base
+    from busqueda import normalizar
+
+    rng = random.Random(semilla)
+    hasta = hasta or date.today()
+    importar_catalogo_base()
+    base = Food.query.filter(Food.user_id.is_(None)).all()
+
+    ids = []
+    for u in range(usuarios):
+        usuario = User(username=f"sintetico{u}", email=f"sintetico{u}@bench.local", password=PASSWORD_SINTETICA,
+                       target_kcal=rng.choice((1800, 2000, 2200, 2500)), target_protein=rng.randint(100, 180),
+                       target_carbs=rng.randint(150, 300), target_fat=rng.randint(50, 90))
+        db.session.add(usuario)
+        db.session.flush()
+        ids.append(usuario.id)
+
+        filas = [_alimento(rng, i) for i in range(alimentos)]
+        for fila in filas:
+            fila.update(user_id=usuario.id, name_norm=normalizar(fila["name"]))
+        if filas:
+            db.session.execute(insert(Food), filas)
+        propios = Food.query.filter_by(user_id=usuario.id).all()
+        disponibles = propios + base
+
+        lista_recetas = []
+        with db.session.no_autoflush:
+            for r in range(recetas):
+                receta = Recipe(name=f"Receta sintética {r:04d}", user_id=usuario.id)
+                elegidos = rng.sample(disponibles, min(len(disponibles), rng.randint(3, 12)))
+                receta.ingredients = [RecipeIngredient(food=f, grams=rng.choice((10, 25, 50, 100, 150, 200)))
+                                      for f in elegidos]
+                recalcular_totales_receta(receta)
+                db.session.add(receta)
+                lista_recetas.append(receta)
+        db.session.flush()
+
+        logs = []
+        for d in range(dias):
+            fecha = hasta - timedelta(days=d)
+            for _ in range(rng.randint(3, 7)):
+                log = {"user_id": usuario.id, "date": fecha, "grams": rng.choice((50, 100, 150, 200, 300)),
+                       "food_id": None, "recipe_id": None,
+                       "target_kcal_snapshot": usuario.target_kcal,
+                       "target_protein_snapshot": usuario.target_protein,
+                       "target_carbs_snapshot": usuario.target_carbs,
+                       "target_fat_snapshot": usuario.target_fat}
+                if lista_recetas and rng.random() < 0.3:
+                    log["recipe_id"] = rng.choice(lista_recetas).id
+                else:
+                    log["food_id"] = rng.choice(disponibles).id
+                logs.append(log)
+        for i in range(0, len(logs), 5000):
+            db.session.execute(insert(DailyLog), logs[i:i + 5000])
+
+        dias_usuario = [(usuario.id, hasta - timedelta(days=d)) for d in range(dias)]
+        for i in range(0, len(dias_usuario), 500):
+            recalcular_resumenes(dias_usuario[i:i + 500])
+        db.session.commit()
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=2)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--recetas", type=int, default=5)
+    parser.add_argument("--alimentos", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--url", help="base de datos destino (por defecto la de DATABASE_URL)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    from migraciones import preparar_esquema
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": args.url} if args.url else None)
+    with app.app_context():
+        preparar_esquema()
+        ids = generar(args.usuarios, args.dias, args.recetas, args.alimentos, args.semilla)
+    print(f"Generados {len(ids)} usuarios con {args.dias} días y {args.recetas} recetas cada uno.")
+
+
+if __name__ == "__main__":
+    main()
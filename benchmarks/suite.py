@@ -0,0 +1,203 @@
+"""
+Suite de rendimiento: latencia (percentiles) y número de consultas SQL de las operaciones
+principales a varias escalas de datos, comparadas con una línea base guardada.
+
+    python -m benchmarks.suite                      # todas las escalas, compara con baseline.json
+    python -m benchmarks.suite --escalas pequena --iteraciones 20
+    python -m benchmarks.suite --guardar            # actualiza la línea base
+
+Cada escala se genera con benchmarks/generador.py (semilla fija) sobre una base de datos
+SQLite temporal. Las latencias dependen de la máquina: compara siempre en el mismo equipo.
+El número de consultas, en cambio, es exacto y no debería subir nunca sin motivo.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# usuarios × días × recetas (y alimentos propios por usuario)
+ESCALAS = {
+    "pequena": {"usuarios": 2, "dias": 30, "recetas": 5, "alimentos": 20},
+    "media": {"usuarios": 5, "dias": 180, "recetas": 20, "alimentos": 100},
+    "grande": {"usuarios": 10, "dias": 730, "recetas": 50, "alimentos": 300},
+}
+# Empeoramiento de la mediana a partir del cual se marca una regresión
+TOLERANCIA_LATENCIA = 0.25
+
+
+class Contador:
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, *args):
+        self.total += 1
+
+
+def medir(operacion, iteraciones, engine, calentamiento=3):
+    """Ejecuta la operación y devuelve sus percentiles de latencia (ms) y consultas por llamada."""
+    from sqlalchemy import event
+
+    for _ in range(calentamiento):
+        operacion()
+    latencias, consultas = [], []
+    for _ in range(iteraciones):
+        contador = Contador()
+        event.listen(engine, "before_cursor_execute", contador)
+        inicio = time.perf_counter()
+        try:
+            operacion()
+        finally:
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            event.remove(engine, "before_cursor_execute", contador)
+        consultas.append(contador.total)
+    cortes = statistics.quantiles(latencias, n=100, method="inclusive")
+    return {"p50_ms": round(cortes[49], 3), "p95_ms": round(cortes[94], 3), "p99_ms": round(cortes[98], 3),
+            "max_ms": round(max(latencias), 3), "consultas": max(consultas)}
+
+
+def operaciones(app, user_id):
+    """Operaciones medidas. Cada petición usa su propio contexto de aplicación, como en producción."""
+    from models import db, DailyLog
+    from logic import obtener_estadisticas_breves
+    import analitica
+    import cache
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["_user_id"] = str(user_id)
+        sesion["_fresh"] = True
+    hoy = date.today().isoformat()
+    with app.app_context():
+        alimento_ids = [f for (f,) in db.session.query(DailyLog.food_id).filter(
+            DailyLog.user_id == user_id, DailyLog.food_id.isnot(None)).distinct().limit(5)]
+    alimento_id = alimento_ids[0]
+
+    def peticion(metodo, url, **kwargs):
+        def ejecutar():
+            with app.app_context():
+                respuesta = getattr(cliente, metodo)(url, **kwargs)
+            assert respuesta.status_code < 400, f"{url}: {respuesta.status_code}"
+        return ejecutar
+
+    def index_sin_cache():
+        # Cada visita se renderiza de cero: mide el camino completo de la ruta
+        cache.paginas.vaciar()
+        peticion("get", f"/day/{hoy}")()
+
+    def estadisticas():
+        with app.app_context():
+            obtener_estadisticas_breves(user_id, 7)
+            obtener_estadisticas_breves(user_id, 30)
+
+    def adherencia():
+        with app.app_context():
+            analitica.obtener_adherencia(user_id)
+
+    return {
+        "index": index_sin_cache,
+        "index_cacheado": peticion("get", f"/day/{hoy}"),
+        "mis_alimentos": peticion("get", "/mis_alimentos"),
+        "add_log": peticion("post", "/add_log", data={"item_id": f"food_{alimento_id}", "grams": "100",
+                                                      "date": hoy}),
+        # Una comida de cinco elementos en un solo envío
+        "add_log_comida": peticion("post", "/add_log", data={"item_id": [f"food_{f}" for f in alimento_ids],
+                                                             "grams": ["100"] * len(alimento_ids), "date": hoy}),
+        "obtener_estadisticas_breves": estadisticas,
+        # Rachas y ventanas de 7 a 365 días por macro: una consulta a cualquier escala
+        "obtener_adherencia": adherencia,
+        "cargar_basicos": peticion("get", "/cargar_basicos"),
+    }
+
+
+def ejecutar_escala(app, nombre, iteraciones):
+    from models import db
+    from migraciones import aplicar_migraciones
+    from benchmarks.generador import generar
+    import cache
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        aplicar_migraciones()
+        cache.usuarios.vaciar()
+        cache.paginas.vaciar()
+        user_id = generar(**ESCALAS[nombre])[0]
+        engine = db.engine
+    return {op: medir(funcion, iteraciones, engine) for op, funcion in operaciones(app, user_id).items()}
+
+
+def comparar(resultados, baseline):
+    """Líneas de informe con las diferencias frente a la línea base y la lista de regresiones."""
+    lineas, regresiones = [], []
+    for escala, ops in resultados.items():
+        for op, actual in ops.items():
+            previo = baseline.get(escala, {}).get(op)
+            if previo is None:
+                continue
+            delta = (actual["p50_ms"] - previo["p50_ms"]) / previo["p50_ms"] if previo["p50_ms"] else 0
+            marca = ""
+            if actual["consultas"] > previo["consultas"]:
+                marca = "  <-- MÁS CONSULTAS"
+            elif delta > TOLERANCIA_LATENCIA:
+                marca = "  <-- MÁS LENTO"
+            if marca:
+                regresiones.append(f"{escala}/{op}")
+            lineas.append(f"{escala:<9}{op:<30}p50 {previo['p50_ms']:>9.2f} -> {actual['p50_ms']:>9.2f} ms "
+                          f"({delta:+.0%})  consultas {previo['consultas']} -> {actual['consultas']}{marca}")
+    return lineas, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=list(ESCALAS))
+    parser.add_argument("--iteraciones", type=int, default=30)
+    parser.add_argument("--guardar", action="store_true", help="guarda los resultados como nueva línea base")
+    parser.add_argument("--estricto", action="store_true", help="termina con error si hay regresiones")
+    args = parser.parse_args()
+
+    sys.path.insert(0, RAIZ)
+    from app import create_app
+    # Las tareas en segundo plano (cargar_basicos) se ejecutan dentro de la petición: así sus
+    # consultas se cuentan siempre, y no en otro hilo a destiempo o tras cambiar de escala
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tempfile.mkdtemp()}/suite.db",
+                      "TAREAS_HILOS": 0})
+
+    resultados = {}
+    for escala in args.escalas:
+        print(f"== {escala}: {ESCALAS[escala]}")
+        resultados[escala] = ejecutar_escala(app, escala, args.iteraciones)
+        print(f"{'operación':<30}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'consultas':>11}")
+        for op, r in resultados[escala].items():
+            print(f"{op:<30}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}"
+                  f"{r['consultas']:>11}")
+
+    regresiones = []
+    if os.path.exists(RUTA_BASELINE):
+        with open(RUTA_BASELINE, encoding="utf-8") as fichero:
+            lineas, regresiones = comparar(resultados, json.load(fichero))
+        print("\n== Comparación con la línea base")
+        print("\n".join(lineas) or "(sin escalas comunes)")
+
+    if args.guardar:
+        baseline = {}
+        if os.path.exists(RUTA_BASELINE):
+            with open(RUTA_BASELINE, encoding="utf-8") as fichero:
+                baseline = json.load(fichero)
+        baseline.update(resultados)
+        with open(RUTA_BASELINE, "w", encoding="utf-8") as fichero:
+            json.dump(baseline, fichero, indent=2, sort_keys=True)
+            fichero.write("\n")
+        print(f"\nLínea base guardada en {RUTA_BASELINE}")
+    elif regresiones and args.estricto:
+        sys.exit(f"Regresiones: {', '.join(regresiones)}")
+
+
+if __name__ == "__main__":
+    main()
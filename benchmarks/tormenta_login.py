@@ -0,0 +1,124 @@
+"""
+Latencia del panel diario mientras una tormenta de logins satura el hash de contraseñas.
+
+Arranca la aplicación en un servidor WSGI multihilo sobre una base de datos SQLite temporal,
+mide el panel (/day/<hoy>) en reposo y después con N clientes haciendo login sin parar.
+
+    python benchmarks/tormenta_login.py --segundos 10 --atacantes 16
+    python benchmarks/tormenta_login.py --hilos-hash 0   # hash dentro de la petición, para comparar
+"""
+import argparse
+import http.cookiejar
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from datetime import date
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "Segura.123"
+
+
+class SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _estado(opener, url, datos=None):
+    try:
+        with opener.open(url, data=datos) as respuesta:
+            respuesta.read()
+            return respuesta.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def _percentiles(muestras):
+    cortes = statistics.quantiles(muestras, n=100, method="inclusive")
+    return {"n": len(muestras), "p50": cortes[49], "p95": cortes[94], "p99": cortes[98], "max": max(muestras)}
+
+
+def medir_panel(opener, url, segundos):
+    latencias, fin = [], time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        _estado(opener, url)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--atacantes", type=int, default=16, help="clientes haciendo login en bucle")
+    parser.add_argument("--hilos-hash", type=int, default=2, help="0: hash en el hilo de la petición")
+    parser.add_argument("--cola-hash", type=int, default=8)
+    args = parser.parse_args()
+
+    sys.path.insert(0, RAIZ)
+    from werkzeug.serving import make_server
+    from app import create_app
+    from migraciones import preparar_esquema
+    from models import db, User
+    import contrasenas
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tempfile.mkdtemp()}/tormenta.db",
+        "HASH_HILOS": args.hilos_hash,
+        "HASH_COLA": args.cola_hash,
+    })
+    with app.app_context():
+        preparar_esquema()
+        db.session.add(User(username="bench", email="bench@test.com", password=contrasenas.servicio.generar(PASSWORD)))
+        db.session.commit()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # Sin una línea de log por petición
+    servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_port}"
+    credenciales = urllib.parse.urlencode({"username": "bench", "password": PASSWORD}).encode()
+
+    panel = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    _estado(panel, f"{base}/login", credenciales)
+    url_panel = f"{base}/day/{date.today().isoformat()}"
+    medir_panel(panel, url_panel, 1)  # Calentamiento
+
+    reposo = medir_panel(panel, url_panel, args.segundos)
+
+    parar, estados = threading.Event(), Counter()
+
+    def atacante():
+        opener = urllib.request.build_opener(SinRedirecciones())
+        while not parar.is_set():
+            estados[_estado(opener, f"{base}/login", credenciales)] += 1
+
+    hilos = [threading.Thread(target=atacante, daemon=True) for _ in range(args.atacantes)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.5)
+    tormenta = medir_panel(panel, url_panel, args.segundos)
+    parar.set()
+    for hilo in hilos:
+        hilo.join()
+    servidor.shutdown()
+
+    print(f"Método: {contrasenas.servicio.metodo} | hilos de hash: {args.hilos_hash} | cola: {args.cola_hash} "
+          f"| atacantes: {args.atacantes}")
+    print(f"{'panel (ms)':<12}{'n':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for nombre, muestras in (("reposo", reposo), ("tormenta", tormenta)):
+        p = _percentiles(muestras)
+        print(f"{nombre:<12}{p['n']:>8}{p['p50']:>10.1f}{p['p95']:>10.1f}{p['p99']:>10.1f}{p['max']:>10.1f}")
+    duracion = args.segundos + 0.5
+    print(f"logins correctos: {estados[302] / duracion:.1f}/s | rechazados (503): {estados[503] / duracion:.1f}/s "
+          f"| otros: {sum(v for k, v in estados.items() if k not in (302, 503))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Buscador de alimentos y recetas por nombre.
+
+Cada Food y Recipe guarda su nombre normalizado (sin tildes ni mayúsculas) en 'name_norm',
+indexado junto al user_id. Al crear, editar o borrar un elemento su entrada del índice se
+actualiza en la misma fila, así que el buscador nunca queda desfasado entre workers.
+
+La búsqueda combina tres niveles, de más a menos relevante:
+1. Prefijo del nombre completo (rango sobre el índice).
+2. Coincidencia dentro del nombre (p. ej. el inicio de la segunda palabra).
+3. Coincidencia aproximada por trigramas, para tolerar erratas ("polo" -> "pollo").
+"""
+from sqlalchemy import case, or_
+
+# normalizar vive con los modelos (mantiene su name_norm) y se usa desde aquí
+from models import Food, Recipe, normalizar
+
+LIMITE_MAXIMO = 50
+# Similitud mínima (como el umbral por defecto de pg_trgm) para aceptar una coincidencia aproximada
+UMBRAL_SIMILITUD = 0.3
+# Trigramas de la consulta que se usan para preseleccionar candidatos en SQL
+MAX_TRIGRAMAS_FILTRO = 8
+# Candidatos aproximados que se puntúan en Python por cada resultado pedido
+CANDIDATOS_POR_RESULTADO = 20
+
+
+def trigramas(texto):
+    """Trigramas de cada palabra con relleno de espacios, al estilo de pg_trgm."""
+    resultado = set()
+    for palabra in texto.split():
+        relleno = f"  {palabra} "
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def similitud(a, b):
+    ta, tb = trigramas(a), trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def similitud_palabras(consulta, nombre):
+    """
+    Mejor similitud entre la consulta y cualquier tramo del nombre con su mismo número de palabras,
+    para que "polo" encuentre "Pechuga de Pollo" aunque el resto del nombre no se parezca.
+    """
+    palabras, n = nombre.split(), max(1, len(consulta.split()))
+    tramos = [" ".join(palabras[i:i + n]) for i in range(max(1, len(palabras) - n + 1))]
+    return max([similitud(consulta, nombre)] + [similitud(consulta, t) for t in tramos])
+
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filtro_contiene(modelo, texto):
+    """Condición SQL: el nombre normalizado del modelo contiene el texto (sin tildes ni mayúsculas)."""
+    return modelo.name_norm.like(f"%{_escapar_like(normalizar(texto))}%", escape="\\")
+
+
+def _resultado(tipo, elemento):
+    datos = {"id": f"{tipo}_{elemento.id}", "tipo": tipo, "nombre": elemento.name}
+    if tipo == "food":
+        datos["kcal_100g"] = elemento.kcal_100g
+    return datos
+
+
+def _buscar_modelo(modelo, user_id, consulta, limite):
+    """Devuelve hasta 'limite' pares (puntuación, elemento) de un modelo."""
+    if modelo is Food:
+        # Los alimentos del catálogo base compartido también son seleccionables
+        base = Food.visibles(user_id)
+    else:
+        base = modelo.query.filter(modelo.user_id == user_id)
+    encontrados = {}
+
+    # 1. Prefijo: rango [consulta, consulta + U+FFFF) que resuelve el índice (user_id, name_norm)
+    prefijo = (base.filter(modelo.name_norm >= consulta, modelo.name_norm < consulta + "\uffff")
+               .order_by(modelo.name_norm).limit(limite).all())
+    for e in prefijo:
+        encontrados[e.id] = (3.0, e)
+
+    # 2. Contenido en cualquier parte del nombre
+    if len(encontrados) < limite:
+        contenidos = (base.filter(filtro_contiene(modelo, consulta), modelo.id.notin_(list(encontrados)))
+                      .order_by(modelo.name_norm).limit(limite - len(encontrados)).all())
+        for e in contenidos:
+            # Preferimos las coincidencias al inicio de una palabra
+            inicio_palabra = f" {consulta}" in f" {e.name_norm}"
+            encontrados[e.id] = (2.5 if inicio_palabra else 2.0, e)
+
+    # 3. Aproximada: preseleccionamos en SQL los nombres que comparten algún trigrama interior,
+    #    los que más comparten primero y con un tope, para no puntuar en Python todo el catálogo
+    if len(encontrados) < limite and len(consulta) >= 3:
+        interiores = sorted({t for t in trigramas(consulta) if " " not in t})[:MAX_TRIGRAMAS_FILTRO]
+        if interiores:
+            coincide = [modelo.name_norm.like(f"%{_escapar_like(t)}%", escape="\\") for t in interiores]
+            compartidos = sum(case((c, 1), else_=0) for c in coincide)
+            candidatos = (base.filter(or_(*coincide), modelo.id.notin_(list(encontrados)))
+                          .order_by(compartidos.desc(), modelo.name_norm)
+                          .limit(limite * CANDIDATOS_POR_RESULTADO).all())
+            puntuados = [(similitud_palabras(consulta, e.name_norm or ""), e) for e in candidatos]
+            puntuados = [(p, e) for p, e in puntuados if p >= UMBRAL_SIMILITUD]
+            puntuados.sort(key=lambda pe: (-pe[0], pe[1].name_norm))
+            for p, e in puntuados[:limite - len(encontrados)]:
+                encontrados[e.id] = (p, e)
+
+    return list(encontrados.values())
+
+
+def buscar(user_id, texto, limite=10, tipos=("food", "recipe")):
+    """
+    Mejores coincidencias de alimentos y recetas del usuario para un texto libre,
+    ordenadas por relevancia y, a igualdad, alfabéticamente.
+    """
+    consulta = normalizar(texto or "")
+    if not consulta:
+        return []
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+
+    puntuados = []
+    modelos = {"food": Food, "recipe": Recipe}
+    for tipo in tipos:
+        puntuados += [(p, tipo, e) for p, e in _buscar_modelo(modelos[tipo], user_id, consulta, limite)]
+    puntuados.sort(key=lambda pte: (-pte[0], pte[2].name_norm or "", pte[1]))
+    return [_resultado(tipo, e) for _, tipo, e in puntuados[:limite]]
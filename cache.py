@@ -0,0 +1,189 @@
+"""
+Cachés en memoria del proceso.
+
+Cada worker de gunicorn tiene las suyas: no se comparten entre procesos. Por eso toda entrada
+caduca tras un TTL corto, que acota cuánto puede tardar un worker en ver un cambio hecho en
+otro, y quien modifica los datos invalida la entrada en el worker que atiende la petición.
+
+Las páginas renderizadas van además en la clave con la versión de datos del usuario
+(User.version_datos), que las rutas de escritura incrementan: así un cambio invalida al
+momento las páginas de todos los workers, sin necesidad de avisarlos.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import update
+
+from models import db, User
+
+
+class CacheLRU:
+    """
+    Diccionario acotado por número de entradas y por antigüedad, seguro entre hilos.
+    Con max_bytes se acota además la memoria: los valores deben ser bytes y cuenta su longitud.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=60.0, max_bytes=None, reloj=time.monotonic):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._reloj = reloj
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _quitar(self, clave):
+        _, _, peso = self._datos.pop(clave)
+        self._bytes -= peso
+
+    def obtener(self, clave):
+        with self._cerrojo:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                caduca, valor, _ = entrada
+                if caduca > self._reloj():
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                self._quitar(clave)
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        peso = len(valor) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and peso > self.max_bytes:
+            return
+        with self._cerrojo:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (self._reloj() + self.ttl, valor, peso)
+            self._bytes += peso
+            # Descartamos las entradas usadas hace más tiempo
+            while len(self._datos) > self.max_entradas or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._quitar(next(iter(self._datos)))
+
+    def invalidar(self, clave):
+        with self._cerrojo:
+            if clave in self._datos:
+                self._quitar(clave)
+
+    def vaciar(self):
+        with self._cerrojo:
+            self._datos.clear()
+            self._bytes = 0
+            self.aciertos = self.fallos = 0
+
+    def estadisticas(self):
+        with self._cerrojo:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+            }
+
+
+class CacheNula:
+    """Backend que no guarda nada: desactiva una caché sin cambiar el código que la usa."""
+
+    def obtener(self, clave):
+        return None
+
+    def guardar(self, clave, valor):
+        pass
+
+    def invalidar(self, clave):
+        pass
+
+    def vaciar(self):
+        pass
+
+    def estadisticas(self):
+        return {"aciertos": 0, "fallos": 0, "tasa_aciertos": 0.0, "entradas": 0, "bytes": 0}
+
+
+# --- IDENTIDAD DEL USUARIO ---
+
+class IdentidadUsuario(UserMixin):
+    """
+    Copia inmutable de los datos del usuario que usan casi todas las peticiones (id y metas).
+    No está ligada a ninguna sesión de SQLAlchemy: para modificar el usuario hay que cargarlo.
+    """
+    __slots__ = ("id", "username", "email", "target_kcal", "target_protein", "target_carbs", "target_fat")
+
+    def __init__(self, usuario):
+        for campo in self.__slots__:
+            object.__setattr__(self, campo, getattr(usuario, campo))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("IdentidadUsuario es de solo lectura: modifica el User y llama a invalidar_usuario()")
+
+
+usuarios = CacheLRU(max_entradas=4096, ttl=60.0)
+
+
+def cargar_usuario(user_id):
+    """Identidad del usuario desde la caché o, si no está o ha caducado, desde la base de datos."""
+    identidad = usuarios.obtener(user_id)
+    if identidad is None:
+        usuario = db.session.get(User, user_id)
+        if usuario is None:
+            return None
+        identidad = IdentidadUsuario(usuario)
+        usuarios.guardar(user_id, identidad)
+    return identidad
+
+
+def invalidar_usuario(user_id):
+    usuarios.invalidar(user_id)
+
+
+# --- PÁGINAS RENDERIZADAS ---
+
+# Se sustituye en configurar() según la configuración de la aplicación
+paginas = CacheNula()
+
+
+def configurar(app):
+    """
+    Elige el backend de la caché de páginas: CACHE_PAGINAS = "memoria" (LRU del proceso,
+    acotada a CACHE_PAGINAS_MAX_BYTES) o "nula" (desactivada).
+    """
+    global paginas
+    if app.config.get("CACHE_PAGINAS", "memoria") == "memoria":
+        paginas = CacheLRU(max_entradas=10000, ttl=float(app.config.get("CACHE_PAGINAS_TTL", 3600)),
+                           max_bytes=int(app.config.get("CACHE_PAGINAS_MAX_BYTES", 32 * 1024 * 1024)))
+    else:
+        paginas = CacheNula()
+    return paginas
+
+
+def version_y_objetivos(user_id):
+    """
+    Versión de los datos del usuario, que forma parte de la clave de sus páginas cacheadas, y sus
+    metas actuales, en una sola consulta. Ambas se leen de la base de datos (y no de la identidad
+    cacheada, que puede ir hasta un minuto por detrás) para que un cambio hecho en otro worker
+    invalide también las páginas de este y no se cachee nunca con las metas antiguas.
+    """
+    version, kcal, prot, carbs, fat = db.session.query(
+        User.version_datos, User.target_kcal, User.target_protein, User.target_carbs, User.target_fat,
+    ).filter(User.id == user_id).one()
+    return version, {"kcal": kcal, "prot": prot, "carbs": carbs, "fat": fat}
+
+
+def marcar_datos_modificados(user_id):
+    """
+    Invalida las páginas cacheadas del usuario en todos los workers incrementando su versión.
+    Se llama desde las rutas de escritura, dentro de su transacción.
+    """
+    db.session.execute(
+        update(User).where(User.id == user_id).values(version_datos=User.version_datos + 1),
+        execution_options={"synchronize_session": False},
+    )
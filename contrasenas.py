@@ -0,0 +1,112 @@
+"""
+Hash y verificación de contraseñas fuera del hilo de la petición.
+
+pbkdf2/scrypt son lentos a propósito. Ejecutados dentro de la petición, una ráfaga de logins
+ocupa todos los workers y bloquea el resto de rutas. Aquí se ejecutan en un pool de hilos
+acotado (hashlib libera el GIL mientras calcula) con un límite de trabajos en espera: si el
+pool está saturado, la petición se rechaza al instante en lugar de hacer cola.
+
+Método y coste se configuran con HASH_METODO (formato de werkzeug, p. ej. "pbkdf2:sha256:600000"
+o "scrypt:32768:8:1"). Los hashes guardados con otros parámetros se regeneran en el siguiente
+login correcto.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as EsperaAgotada
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+METODO_POR_DEFECTO = "pbkdf2:sha256:1000000"
+
+
+class HashSaturado(Exception):
+    """El pool de hash tiene todos sus hilos y su cola ocupados, o el trabajo no terminó a tiempo."""
+
+
+def normalizar_metodo(metodo):
+    """
+    Método tal y como werkzeug lo escribe en el hash: completa los parámetros omitidos con sus
+    valores por defecto ("scrypt" -> "scrypt:32768:8:1", "pbkdf2:sha256" -> "pbkdf2:sha256:1000000").
+    """
+    nombre, *parametros = metodo.split(":")
+    if nombre == "scrypt" and not parametros:
+        return "scrypt:32768:8:1"
+    if nombre == "pbkdf2" and len(parametros) < 2:
+        algoritmo = parametros[0] if parametros else "sha256"
+        return f"pbkdf2:{algoritmo}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return metodo
+
+
+class ServicioHash:
+    """
+    Pool de hilos acotado para las operaciones de contraseña.
+    Admite como mucho 'hilos' trabajos en ejecución más 'cola' en espera; con hilos=0 el hash
+    se calcula en el propio hilo de la petición (comportamiento anterior, útil para comparar).
+    """
+
+    def __init__(self, metodo=METODO_POR_DEFECTO, hilos=2, cola=8, espera_maxima=30.0):
+        self.metodo = metodo
+        self._prefijo = normalizar_metodo(metodo)
+        self.hilos = hilos
+        self.cola = cola
+        self.espera_maxima = espera_maxima
+        self.rechazados = 0
+        self._plazas = threading.BoundedSemaphore(hilos + cola) if hilos else None
+        self._pool = None
+        self._pid = None
+        self._cerrojo = threading.Lock()
+
+    def _ejecutor(self):
+        # Creación perezosa y por proceso: un pool heredado de un fork no tiene hilos vivos
+        with self._cerrojo:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="hash")
+                self._pid = os.getpid()
+            return self._pool
+
+    def ejecutar(self, funcion, *args):
+        """
+        Ejecuta la función en el pool y espera su resultado. Lanza HashSaturado sin esperar si no
+        hay plaza, o tras 'espera_maxima' segundos si el trabajo sigue en cola o calculándose.
+        """
+        if not self.hilos:
+            return funcion(*args)
+        if not self._plazas.acquire(blocking=False):
+            self.rechazados += 1
+            raise HashSaturado()
+        try:
+            futuro = self._ejecutor().submit(funcion, *args)
+        except BaseException:
+            self._plazas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._plazas.release())
+        try:
+            return futuro.result(timeout=self.espera_maxima)
+        except EsperaAgotada:
+            # El trabajo sigue su curso y libera su plaza al terminar; la petición no lo espera
+            self.rechazados += 1
+            raise HashSaturado() from None
+
+    def generar(self, password):
+        return self.ejecutar(generate_password_hash, password, self.metodo)
+
+    def verificar(self, hash_guardado, password):
+        return self.ejecutar(check_password_hash, hash_guardado, password)
+
+    def necesita_rehash(self, hash_guardado):
+        """El hash guardado se calculó con un método o coste distinto del configurado."""
+        return hash_guardado.split("$", 1)[0] != self._prefijo
+
+
+servicio = ServicioHash()
+
+
+def configurar(app):
+    """Crea el servicio con la configuración de la aplicación (HASH_METODO, HASH_HILOS, HASH_COLA)."""
+    global servicio
+    servicio = ServicioHash(
+        metodo=app.config.get("HASH_METODO", METODO_POR_DEFECTO),
+        hilos=int(app.config.get("HASH_HILOS", 2)),
+        cola=int(app.config.get("HASH_COLA", 8)),
+    )
+    return servicio
@@ -0,0 +1,259 @@
+"""
+Exportación del historial en streaming (CSV o NDJSON) y de la cuenta completa (NDJSON o zip).
+
+Las filas se leen con un cursor de servidor (yield_per) y se serializan a medida que llegan,
+de modo que exportar varios años ocupa la misma memoria que exportar un día y el cliente
+recibe los primeros bytes de inmediato.
+"""
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import aliased
+
+from models import db, DailyLog, DailySummary, Food, Recipe, RecipeIngredient, User
+from logic import expresiones_macros_log
+
+# Filas que se leen del cursor en cada viaje a la base de datos
+TAMANO_LOTE = 500
+
+COLUMNAS = ["fecha", "tipo", "nombre", "gramos", "kcal", "proteinas", "carbohidratos", "grasas", "objetivo_kcal"]
+MACROS = ("kcal", "proteinas", "carbohidratos", "grasas")
+
+
+def _filtrar_fechas(consulta, columna, desde, hasta):
+    if desde is not None:
+        consulta = consulta.where(columna >= desde)
+    if hasta is not None:
+        consulta = consulta.where(columna <= hasta)
+    return consulta
+
+
+def _fila_dia(fecha, kcal, prot, carb, fat, objetivo):
+    return {
+        "fecha": fecha.isoformat(), "tipo": "dia", "nombre": None, "gramos": None,
+        "kcal": round(kcal, 2), "proteinas": round(prot, 2),
+        "carbohidratos": round(carb, 2), "grasas": round(fat, 2),
+        "objetivo_kcal": objetivo,
+    }
+
+
+def filas_resumen(user_id, desde=None, hasta=None):
+    """Totales por día a partir de los resúmenes precalculados."""
+    consulta = select(
+        DailySummary.date, DailySummary.kcal, DailySummary.proteinas,
+        DailySummary.carbohidratos, DailySummary.grasas, DailySummary.target_kcal_snapshot,
+    ).where(DailySummary.user_id == user_id, DailySummary.num_registros > 0)
+    consulta = _filtrar_fechas(consulta, DailySummary.date, desde, hasta).order_by(DailySummary.date)
+
+    for fila in db.session.execute(consulta.execution_options(yield_per=TAMANO_LOTE)):
+        yield _fila_dia(*fila)
+
+
+def filas_detalle(user_id, desde=None, hasta=None):
+    """
+    Cada día seguido de sus registros individuales. Una sola consulta ordenada por fecha:
+    la fila del día se emite al cambiar de fecha, sin agrupar nada en memoria.
+    """
+    macros = expresiones_macros_log()
+    consulta = (
+        select(
+            DailyLog.date, DailyLog.grams, Food.name, Recipe.name, *macros.values(),
+            DailySummary.kcal, DailySummary.proteinas, DailySummary.carbohidratos,
+            DailySummary.grasas, DailySummary.target_kcal_snapshot,
+        )
+        .outerjoin(Food, DailyLog.food_id == Food.id)
+        .outerjoin(Recipe, DailyLog.recipe_id == Recipe.id)
+        .outerjoin(DailySummary, (DailySummary.user_id == DailyLog.user_id) & (DailySummary.date == DailyLog.date))
+        .where(DailyLog.user_id == user_id)
+    )
+    consulta = _filtrar_fechas(consulta, DailyLog.date, desde, hasta).order_by(DailyLog.date, DailyLog.id)
+
+    fecha_actual = None
+    for fila in db.session.execute(consulta.execution_options(yield_per=TAMANO_LOTE)):
+        fecha, gramos, nombre_alimento, nombre_receta = fila[:4]
+        if fecha != fecha_actual:
+            fecha_actual = fecha
+            yield _fila_dia(fecha, *(v or 0 for v in fila[8:12]), fila[12])
+        registro = {
+            "fecha": fecha.isoformat(), "tipo": "registro",
+            "nombre": nombre_alimento or nombre_receta, "gramos": gramos,
+            "objetivo_kcal": None,
+        }
+        registro.update({clave: round(valor or 0, 2) for clave, valor in zip(MACROS, fila[4:8])})
+        yield registro
+
+
+def _vaciar(buffer):
+    texto = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return texto
+
+
+def serializar_csv(filas):
+    """Genera el CSV línea a línea reutilizando un único buffer pequeño."""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS)
+    # La cabecera sale antes de lanzar la consulta
+    escritor.writeheader()
+    yield _vaciar(buffer)
+    for fila in filas:
+        escritor.writerow(fila)
+        yield _vaciar(buffer)
+
+
+def serializar_ndjson(filas):
+    for fila in filas:
+        yield json.dumps(fila, ensure_ascii=False) + "\n"
+
+
+def agrupar_en_bloques(trozos, tamano=16384):
+    """
+    Junta los trozos en bloques de unos pocos KB para no hacer una escritura por fila.
+    El primer trozo sale solo, para que el cliente empiece a recibir datos enseguida.
+    """
+    pendiente, acumulado = [], 0
+    for i, trozo in enumerate(trozos):
+        if i == 0:
+            yield trozo
+            continue
+        pendiente.append(trozo)
+        acumulado += len(trozo)
+        if acumulado >= tamano:
+            yield "".join(pendiente)
+            pendiente, acumulado = [], 0
+    if pendiente:
+        yield "".join(pendiente)
+
+
+# --- EXPORTACIÓN COMPLETA DE LA CUENTA ---
+
+VERSION_CUENTA = 1
+# Orden de las entidades: cada una solo hace referencia a las anteriores, así la importación
+# puede traducir los ids en una sola pasada
+ENTIDADES = ("cuenta", "alimento", "receta", "ingrediente", "registro")
+
+
+def _en_streaming(consulta):
+    return db.session.execute(consulta.execution_options(yield_per=TAMANO_LOTE))
+
+
+def _lineas_cuenta(user_id):
+    usuario = db.session.get(User, user_id)
+    yield {
+        "tipo": "cuenta", "version": VERSION_CUENTA, "exportada": datetime.utcnow().isoformat(timespec="seconds"),
+        "usuario": usuario.username, "email": usuario.email,
+        "fecha_aceptacion_politica": (usuario.fecha_aceptacion_politica.isoformat()
+                                      if usuario.fecha_aceptacion_politica else None),
+        "objetivos": {"kcal": usuario.target_kcal, "proteinas": usuario.target_protein,
+                      "carbohidratos": usuario.target_carbs, "grasas": usuario.target_fat},
+    }
+
+
+def _lineas_alimentos(user_id):
+    """
+    Los alimentos propios y, detrás, los del catálogo base que usan sus recetas y registros.
+    Los del catálogo se identifican por nombre al importar (sus ids cambian entre instalaciones);
+    sus macros van igualmente por si el catálogo de destino no los tiene.
+    """
+    original = aliased(Food)
+    propios = (select(Food.id, Food.name, Food.kcal_100g, Food.prot_100g, Food.carb_100g, Food.fat_100g,
+                      original.name)
+               .outerjoin(original, Food.base_id == original.id)
+               .where(Food.user_id == user_id).order_by(Food.id))
+    for id_, nombre, kcal, prot, carb, fat, base_de in _en_streaming(propios):
+        yield {"tipo": "alimento", "id": id_, "nombre": nombre, "kcal_100g": kcal, "prot_100g": prot,
+               "carb_100g": carb, "fat_100g": fat, "base": False, "base_de": base_de}
+
+    en_recetas = (select(RecipeIngredient.food_id).join(Recipe, RecipeIngredient.recipe_id == Recipe.id)
+                  .where(Recipe.user_id == user_id))
+    en_registros = select(DailyLog.food_id).where(DailyLog.user_id == user_id, DailyLog.food_id.isnot(None))
+    base = (select(Food.id, Food.name, Food.kcal_100g, Food.prot_100g, Food.carb_100g, Food.fat_100g)
+            .where(Food.user_id.is_(None), or_(Food.id.in_(en_recetas), Food.id.in_(en_registros)))
+            .order_by(Food.id))
+    for id_, nombre, kcal, prot, carb, fat in _en_streaming(base):
+        yield {"tipo": "alimento", "id": id_, "nombre": nombre, "kcal_100g": kcal, "prot_100g": prot,
+               "carb_100g": carb, "fat_100g": fat, "base": True, "base_de": None}
+
+
+def _lineas_recetas(user_id):
+    consulta = select(Recipe.id, Recipe.name).where(Recipe.user_id == user_id).order_by(Recipe.id)
+    for id_, nombre in _en_streaming(consulta):
+        yield {"tipo": "receta", "id": id_, "nombre": nombre}
+
+
+def _lineas_ingredientes(user_id):
+    consulta = (select(RecipeIngredient.recipe_id, RecipeIngredient.food_id, RecipeIngredient.grams)
+                .join(Recipe, RecipeIngredient.recipe_id == Recipe.id)
+                .where(Recipe.user_id == user_id).order_by(RecipeIngredient.recipe_id, RecipeIngredient.id))
+    for receta, alimento, gramos in _en_streaming(consulta):
+        yield {"tipo": "ingrediente", "receta": receta, "alimento": alimento, "gramos": gramos}
+
+
+def _lineas_registros(user_id):
+    consulta = (select(DailyLog.date, DailyLog.food_id, DailyLog.recipe_id, DailyLog.grams,
+                       DailyLog.target_kcal_snapshot, DailyLog.target_protein_snapshot,
+                       DailyLog.target_carbs_snapshot, DailyLog.target_fat_snapshot)
+                .where(DailyLog.user_id == user_id).order_by(DailyLog.date, DailyLog.id))
+    for fecha, alimento, receta, gramos, kcal, prot, carb, fat in _en_streaming(consulta):
+        yield {"tipo": "registro", "fecha": fecha.isoformat(), "alimento": alimento, "receta": receta,
+               "gramos": gramos, "objetivos": {"kcal": kcal, "proteinas": prot,
+                                               "carbohidratos": carb, "grasas": fat}}
+
+
+def lineas_cuenta(user_id):
+    """Pares (entidad, generador de líneas) con todos los datos del usuario, en el orden de ENTIDADES."""
+    return [
+        ("cuenta", _lineas_cuenta(user_id)),
+        ("alimento", _lineas_alimentos(user_id)),
+        ("receta", _lineas_recetas(user_id)),
+        ("ingrediente", _lineas_ingredientes(user_id)),
+        ("registro", _lineas_registros(user_id)),
+    ]
+
+
+class _Tuberia(io.RawIOBase):
+    """Destino no posicionable para zipfile: acumula lo escrito hasta que se recoge."""
+
+    def __init__(self):
+        self._trozos = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def recoger(self):
+        datos = b"".join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+def serializar_cuenta_ndjson(entidades):
+    for _, lineas in entidades:
+        yield from serializar_ndjson(lineas)
+
+
+def serializar_cuenta_zip(entidades):
+    """
+    Zip con un NDJSON por entidad, generado en streaming: zipfile escribe en un destino no
+    posicionable (con descriptores de datos tras cada fichero) y los bytes se entregan a
+    medida que se comprimen, sin construir el zip en memoria ni en disco.
+    """
+    tuberia = _Tuberia()
+    with zipfile.ZipFile(tuberia, "w", compression=zipfile.ZIP_DEFLATED) as zip_:
+        for entidad, lineas in entidades:
+            with zip_.open(f"{entidad}.ndjson", "w", force_zip64=True) as fichero:
+                for linea in serializar_ndjson(lineas):
+                    fichero.write(linea.encode("utf-8"))
+                    datos = tuberia.recoger()
+                    if datos:
+                        yield datos
+            yield tuberia.recoger()
+    yield tuberia.recoger()
@@ -0,0 +1,324 @@
+"""
+Importación masiva de alimentos desde CSV o JSON, y de una cuenta completa exportada.
+
+El fichero se lee como un stream (fila a fila u objeto a objeto), los nombres ya existentes
+del usuario se cargan una sola vez para descartar duplicados y la escritura se hace con
+INSERT multi-fila por lotes: importar miles de alimentos cuesta un puñado de consultas.
+"""
+import csv
+import io
+import json
+import os
+import zipfile
+from datetime import date
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import selectinload
+
+from models import db, DailyLog, Food, Recipe, RecipeIngredient, User
+from busqueda import normalizar
+from logic import recalcular_resumenes, recalcular_totales_receta
+
+TAMANO_LOTE = 1000
+RUTA_CATALOGO_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alimentos_basicos.json")
+
+# Nombres de columna aceptados: los de alimentos_basicos.json y los del propio modelo
+ALIAS = {
+    "name": "name", "nombre": "name",
+    "kcal": "kcal_100g", "kcal_100g": "kcal_100g",
+    "prot": "prot_100g", "prot_100g": "prot_100g", "proteinas": "prot_100g",
+    "carb": "carb_100g", "carb_100g": "carb_100g", "carbohidratos": "carb_100g",
+    "fat": "fat_100g", "fat_100g": "fat_100g", "grasas": "fat_100g",
+}
+CAMPOS = ("name", "kcal_100g", "prot_100g", "carb_100g", "fat_100g")
+
+
+def abrir_texto(stream):
+    """Adapta un stream binario (p. ej. un fichero subido) a texto UTF-8 sin leerlo entero."""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def leer_filas_csv(texto):
+    yield from csv.DictReader(texto)
+
+
+def leer_filas_json(texto, tamano_bloque=65536):
+    """
+    Lee un array JSON de objetos (o un fichero NDJSON) objeto a objeto,
+    decodificando por bloques en lugar de cargar el documento completo.
+    """
+    decoder = json.JSONDecoder()
+    buffer, fin = "", False
+    while True:
+        # Saltamos separadores y los corchetes del array entre objeto y objeto
+        buffer = buffer.lstrip(" \t\r\n,[]")
+        if buffer:
+            try:
+                objeto, posicion = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if fin:
+                    raise
+            else:
+                yield objeto
+                buffer = buffer[posicion:]
+                continue
+        elif fin:
+            return
+        bloque = texto.read(tamano_bloque)
+        if bloque:
+            buffer += bloque
+        else:
+            fin = True
+
+
+def normalizar_fila(fila):
+    """Devuelve los campos de Food de una fila de entrada, o None si la fila no es válida."""
+    datos = {ALIAS[clave.strip().lower()]: valor for clave, valor in fila.items()
+             if clave and clave.strip().lower() in ALIAS}
+    try:
+        nombre = str(datos["name"]).strip()
+        valores = [float(datos[campo]) for campo in CAMPOS[1:]]
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not nombre or len(nombre) > 100:
+        return None
+    return dict(zip(CAMPOS, [nombre] + valores))
+
+
+def importar_alimentos(user_id, filas, tamano_lote=TAMANO_LOTE, conexion=None, al_volcar=None):
+    """
+    Inserta en el catálogo del usuario los alimentos cuyo nombre aún no ve (suyos o del catálogo
+    base). Con user_id=None la importación va al catálogo base compartido.
+    No hace commit: todo el fichero entra (o no) en la transacción de quien llama, que puede
+    ser la sesión (por defecto) o una conexión, como en las migraciones. Quien quiera confirmar
+    por lotes (las tareas en segundo plano) puede hacerlo en al_volcar, que recibe los recuentos
+    tras cada INSERT.
+    Devuelve los recuentos de insertados, omitidos por duplicado e inválidos.
+    """
+    ejecutor = db.session if conexion is None else conexion
+    if user_id is None:
+        condicion = Food.user_id.is_(None)
+    else:
+        condicion = Food.condicion_visible(user_id)
+    existentes = set(ejecutor.scalars(db.select(Food.name).where(condicion)))
+    resultado = {"insertados": 0, "omitidos": 0, "invalidos": 0}
+    lote = []
+
+    def volcar():
+        if lote:
+            ejecutor.execute(insert(Food.__table__), lote)
+            resultado["insertados"] += len(lote)
+            lote.clear()
+            if al_volcar is not None:
+                al_volcar(resultado)
+
+    for fila in filas:
+        datos = normalizar_fila(fila)
+        if datos is None:
+            resultado["invalidos"] += 1
+            continue
+        if datos["name"] in existentes:
+            resultado["omitidos"] += 1
+            continue
+        existentes.add(datos["name"])
+        # El INSERT masivo no pasa por los validadores del modelo: rellenamos el nombre del buscador
+        datos["name_norm"] = normalizar(datos["name"])
+        datos["user_id"] = user_id
+        lote.append(datos)
+        if len(lote) >= tamano_lote:
+            volcar()
+    volcar()
+    return resultado
+
+
+def importar_catalogo_base(conexion=None):
+    """Carga en el catálogo base las entradas de alimentos_basicos.json que aún no tiene."""
+    with open(RUTA_CATALOGO_BASE, "r", encoding="utf-8") as fichero:
+        return importar_alimentos(None, leer_filas_json(fichero), conexion=conexion)
+
+
+# --- IMPORTACIÓN DE UNA CUENTA COMPLETA ---
+
+ENTIDADES_CUENTA = ("cuenta", "alimento", "receta", "ingrediente", "registro")
+
+
+def leer_lineas_cuenta(binario):
+    """
+    Líneas de una exportación de cuenta (ver exportacion.py), ya sea el NDJSON único o el zip
+    con un NDJSON por entidad, leídas una a una. 'binario' debe ser un fichero posicionable.
+    """
+    if zipfile.is_zipfile(binario):
+        binario.seek(0)
+        with zipfile.ZipFile(binario) as zip_:
+            nombres = set(zip_.namelist())
+            for entidad in ENTIDADES_CUENTA:
+                if f"{entidad}.ndjson" in nombres:
+                    with zip_.open(f"{entidad}.ndjson") as fichero:
+                        yield from _lineas_json(abrir_texto(fichero))
+        return
+    binario.seek(0)
+    yield from _lineas_json(abrir_texto(binario))
+
+
+def _lineas_json(texto):
+    for linea in texto:
+        if linea.strip():
+            yield json.loads(linea)
+
+
+def _insertar_con_ids(tabla, filas):
+    """INSERT masivo que devuelve los ids nuevos en el mismo orden que las filas."""
+    resultado = db.session.execute(insert(tabla).returning(tabla.c.id, sort_by_parameter_order=True), filas)
+    return [id_ for (id_,) in resultado]
+
+
+def importar_cuenta(user_id, lineas, tamano_lote=TAMANO_LOTE):
+    """
+    Vuelca en la cuenta del usuario los datos de una exportación completa, en streaming.
+
+    Los ids de la exportación se traducen a los nuevos a medida que se insertan (solo se guardan
+    los mapas de alimentos y recetas; los registros van por lotes). Los alimentos del catálogo
+    base se buscan por nombre y, si este catálogo no los tiene, se crean como alimentos propios.
+    Para poder repetir la importación sin duplicar nada, los alimentos y recetas con un nombre
+    que el usuario ya tiene se reutilizan, y los días que ya tienen registros se dejan como están.
+    Aplica los objetivos del perfil exportado. No hace commit: todo entra (o no) en la
+    transacción de quien llama. Lanza ValueError si el fichero no es una exportación válida.
+    """
+    resultado = {"alimentos": 0, "recetas": 0, "ingredientes": 0, "registros": 0, "omitidos": 0}
+    alimentos, recetas = {}, {}
+    # Recetas importadas ahora: solo estas reciben ingredientes y se recalculan al final
+    recetas_nuevas = set()
+    propios = dict(db.session.execute(select(Food.name, Food.id).where(Food.user_id == user_id)).all())
+    base = dict(db.session.execute(select(Food.name, Food.id).where(Food.user_id.is_(None))).all())
+    recetas_propias = dict(db.session.execute(select(Recipe.name, Recipe.id).where(Recipe.user_id == user_id)).all())
+    dias_con_datos = set(db.session.scalars(select(DailyLog.date).where(DailyLog.user_id == user_id).distinct()))
+    dias_importados = set()
+
+    pendientes = {"alimento": [], "ingrediente": [], "registro": []}
+
+    def volcar_alimentos():
+        lote = pendientes["alimento"]
+        if lote:
+            ids = _insertar_con_ids(Food.__table__, [fila for _, fila in lote])
+            for (id_viejo, fila), id_nuevo in zip(lote, ids):
+                alimentos[id_viejo] = propios[fila["name"]] = id_nuevo
+            resultado["alimentos"] += len(lote)
+            lote.clear()
+
+    def volcar(tipo, tabla):
+        lote = pendientes[tipo]
+        if lote:
+            db.session.execute(insert(tabla), lote)
+            resultado[f"{tipo}s"] += len(lote)
+            lote.clear()
+
+    visto_cuenta = False
+    for linea in lineas:
+        tipo = linea.get("tipo") if isinstance(linea, dict) else None
+        if tipo == "cuenta":
+            if linea.get("version") != 1:
+                raise ValueError("Versión de exportación no soportada")
+            visto_cuenta = True
+            usuario = db.session.get(User, user_id)
+            objetivos = linea.get("objetivos") or {}
+            for campo, clave in (("target_kcal", "kcal"), ("target_protein", "proteinas"),
+                                 ("target_carbs", "carbohidratos"), ("target_fat", "grasas")):
+                if objetivos.get(clave) is not None:
+                    setattr(usuario, campo, objetivos[clave])
+            continue
+        if not visto_cuenta:
+            raise ValueError("El fichero no es una exportación de cuenta")
+
+        if tipo == "alimento":
+            nombre = linea["nombre"]
+            if linea.get("base") and nombre in base:
+                alimentos[linea["id"]] = base[nombre]
+            elif nombre in propios:
+                if propios[nombre] is None:
+                    # Repetido dentro del propio fichero y aún sin id: volcamos el lote pendiente
+                    volcar_alimentos()
+                alimentos[linea["id"]] = propios[nombre]
+                resultado["omitidos"] += 1
+            else:
+                datos = normalizar_fila({"name": nombre, "kcal": linea["kcal_100g"], "prot": linea["prot_100g"],
+                                         "carb": linea["carb_100g"], "fat": linea["fat_100g"]})
+                if datos is None:
+                    raise ValueError(f"Alimento no válido: {nombre!r}")
+                datos.update(user_id=user_id, name_norm=normalizar(nombre), base_id=base.get(linea.get("base_de")))
+                # Reservamos el nombre: una segunda línea igual reutiliza este alimento
+                propios[nombre] = None
+                pendientes["alimento"].append((linea["id"], datos))
+                if len(pendientes["alimento"]) >= tamano_lote:
+                    volcar_alimentos()
+        elif tipo == "receta":
+            volcar_alimentos()
+            nombre = linea["nombre"]
+            if nombre in recetas_propias:
+                recetas[linea["id"]] = recetas_propias[nombre]
+                resultado["omitidos"] += 1
+            else:
+                receta = Recipe(name=nombre, user_id=user_id)
+                db.session.add(receta)
+                db.session.flush()
+                recetas[linea["id"]] = recetas_propias[nombre] = receta.id
+                recetas_nuevas.add(receta.id)
+                resultado["recetas"] += 1
+        elif tipo == "ingrediente":
+            volcar_alimentos()
+            receta_id = recetas.get(linea["receta"])
+            if receta_id not in recetas_nuevas:
+                continue
+            pendientes["ingrediente"].append({"recipe_id": receta_id, "food_id": _alimento(alimentos, linea),
+                                              "grams": float(linea["gramos"])})
+            if len(pendientes["ingrediente"]) >= tamano_lote:
+                volcar("ingrediente", RecipeIngredient.__table__)
+        elif tipo == "registro":
+            volcar_alimentos()
+            volcar("ingrediente", RecipeIngredient.__table__)
+            fecha = date.fromisoformat(linea["fecha"])
+            if fecha in dias_con_datos:
+                resultado["omitidos"] += 1
+                continue
+            objetivos = linea.get("objetivos") or {}
+            pendientes["registro"].append({
+                "user_id": user_id, "date": fecha, "grams": float(linea["gramos"]),
+                "food_id": _alimento(alimentos, linea) if linea.get("alimento") is not None else None,
+                "recipe_id": recetas[linea["receta"]] if linea.get("receta") is not None else None,
+                "target_kcal_snapshot": objetivos.get("kcal"),
+                "target_protein_snapshot": objetivos.get("proteinas"),
+                "target_carbs_snapshot": objetivos.get("carbohidratos"),
+                "target_fat_snapshot": objetivos.get("grasas"),
+            })
+            dias_importados.add(fecha)
+            if len(pendientes["registro"]) >= tamano_lote:
+                volcar("registro", DailyLog.__table__)
+        else:
+            raise ValueError(f"Línea desconocida: {tipo!r}")
+    if not visto_cuenta:
+        raise ValueError("El fichero no es una exportación de cuenta")
+    volcar_alimentos()
+    volcar("ingrediente", RecipeIngredient.__table__)
+    volcar("registro", DailyLog.__table__)
+
+    # Totales de las recetas nuevas y resúmenes de los días importados, por bloques
+    nuevas = sorted(recetas_nuevas)
+    for i in range(0, len(nuevas), tamano_lote):
+        bloque = (Recipe.query.filter(Recipe.id.in_(nuevas[i:i + tamano_lote]))
+                  .options(selectinload(Recipe.ingredients).joinedload(RecipeIngredient.food)))
+        for receta in bloque:
+            recalcular_totales_receta(receta)
+        db.session.flush()
+    dias = sorted(dias_importados)
+    for i in range(0, len(dias), 500):
+        recalcular_resumenes([(user_id, d) for d in dias[i:i + 500]])
+        db.session.flush()
+    return resultado
+
+
+def _alimento(alimentos, linea):
+    try:
+        return alimentos[linea["alimento"]]
+    except KeyError:
+        raise ValueError(f"Referencia a un alimento que no está en la exportación: {linea['alimento']}") from None
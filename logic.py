@@ -1,40 +1,37 @@
-def calcular_macros_alimento(grams, food):
-    """Calcula los macros proporcionales de un alimento base."""
-    # Evitamos errores si el alimento no existe
-    if not food:
-        return {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
-    
-    ratio = grams / 100
-    return {
-        "kcal": food.kcal_100g * ratio,
-        "proteinas": food.prot_100g * ratio,
-        "carbohidratos": food.carb_100g * ratio,
-        "grasas": food.fat_100g * ratio
-    }
+import base64
+import binascii
+import json
+from datetime import date, timedelta
+
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, or_, select, tuple_, update
+
+from models import (
+    db, DailyLog, DailySummary, Food, Recipe, RecipeIngredient,
+    # Definidos junto a los modelos, que los usan; se exponen también desde aquí
+    calcular_macros_alimento, calcular_macros_receta,
+)
+
 
-def calcular_macros_receta(grams_consumidos, recipe):
+def recalcular_totales_receta(recipe):
     """
-    Suma los ingredientes de una receta y escala el total 
-    según la cantidad que el usuario ha ingerido.
+    Materializa en la receta su peso total y sus macros por gramo.
+    Debe llamarse cada vez que cambian sus ingredientes o los alimentos que la componen.
     """
-    totales_receta = {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
-    
-    if not recipe or not recipe.ingredients:
-        return totales_receta
-
-    # 1. Calculamos el peso total real de la receta sumando sus ingredientes
-    peso_total_receta = sum(ing.grams for ing in recipe.ingredients)
-    
-    # 2. Sumamos los macros de cada ingrediente
+    totales = {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+    peso_total = 0
     for ing in recipe.ingredients:
+        peso_total += ing.grams
         macros_ing = calcular_macros_alimento(ing.grams, ing.food)
-        for clave in totales_receta:
-            totales_receta[clave] += macros_ing[clave]
-            
-    # 3. Ratio: ¿Qué parte de la receta completa se ha comido el usuario?
-    ratio_consumo = grams_consumidos / peso_total_receta if peso_total_receta > 0 else 0
-    
-    return {k: v * ratio_consumo for k, v in totales_receta.items()}
+        for clave in totales:
+            totales[clave] += macros_ing[clave]
+
+    por_gramo = {k: (v / peso_total if peso_total > 0 else 0) for k, v in totales.items()}
+    recipe.total_grams = peso_total
+    recipe.kcal_g = por_gramo["kcal"]
+    recipe.prot_g = por_gramo["proteinas"]
+    recipe.carb_g = por_gramo["carbohidratos"]
+    recipe.fat_g = por_gramo["grasas"]
+    return recipe
 
 def obtener_resumen_diario(logs):
     """
@@ -56,35 +53,345 @@ def obtener_resumen_diario(logs):
     # Retornamos los valores redondeados para una visualización limpia en el Dashboard
     return {k: round(v, 1) for k, v in resumen.items()}
 
+def inicio_ventana(hoy, dias):
+    """Primer día de la ventana de los últimos 'dias' días, contando hoy (7 días: hoy y los 6 anteriores)."""
+    return hoy - timedelta(days=dias - 1)
+
+def obtener_estadisticas_ventanas(user_id, ventanas=(7, 30)):
+    """
+    Calcula la adherencia de varias ventanas de días en una sola consulta.
+    Cada ventana se resuelve con un recuento condicional sobre los resúmenes diarios,
+    así la ventana de 7 días sale de la misma pasada que la de 30.
+    """
+    hoy = date.today()
+    objetivo = func.coalesce(DailySummary.target_kcal_snapshot, 2000)
+    # Un día es "éxito" si está cerca del objetivo (margen del 10%)
+    en_objetivo = func.abs(DailySummary.kcal - objetivo) <= objetivo * 0.1
+
+    columnas = []
+    for dias in ventanas:
+        dentro = DailySummary.date >= inicio_ventana(hoy, dias)
+        columnas.append(func.count(case((dentro, 1))))
+        columnas.append(func.count(case((and_(dentro, en_objetivo), 1))))
+
+    fila = db.session.query(*columnas).filter(
+        DailySummary.user_id == user_id,
+        DailySummary.date >= inicio_ventana(hoy, max(ventanas)),
+        DailySummary.date <= hoy,
+        DailySummary.num_registros > 0,
+    ).one()
+
+    return {
+        dias: {"total_dias_con_datos": fila[2 * i], "cumplidos": fila[2 * i + 1]}
+        for i, dias in enumerate(ventanas)
+    }
+
 def obtener_estadisticas_breves(user_id, dias=7):
     """Calcula cuántos días se ha cumplido el objetivo en un rango de tiempo."""
-    from datetime import date, timedelta
-    from models import DailyLog
-    
-    fecha_inicio = date.today() - timedelta(days=dias)
-    # Obtenemos todos los logs del periodo
-    logs = DailyLog.query.filter(DailyLog.user_id == user_id, DailyLog.date >= fecha_inicio).all()
-    
-    # Agrupamos por fecha para calcular totales diarios
-    datos_diarios = {}
-    for log in logs:
-        if log.date not in datos_diarios:
-            datos_diarios[log.date] = {
-                "kcal": 0, 
-                "objetivo": log.target_kcal_snapshot or 2000
-            }
-        
-        m = log.get_macros()
-        datos_diarios[log.date]["kcal"] += m["kcal"]
-
-    cumplidos = 0
-    # Un día es "éxito" si está cerca del objetivo (margen del 10%)
-    for dia, info in datos_diarios.items():
-        margen = info["objetivo"] * 0.1
-        if abs(info["kcal"] - info["objetivo"]) <= margen:
-            cumplidos += 1
-            
+    return obtener_estadisticas_ventanas(user_id, (dias,))[dias]
+
+# --- RESÚMENES DIARIOS PRECALCULADOS ---
+
+CAMPOS_SNAPSHOT = ("target_kcal_snapshot", "target_protein_snapshot",
+                   "target_carbs_snapshot", "target_fat_snapshot")
+
+def _copiar_snapshot(resumen, log):
+    for clave in CAMPOS_SNAPSHOT:
+        setattr(resumen, clave, getattr(log, clave))
+
+def acumular_en_resumen(user_id, fecha, macros, num_registros, snapshot):
+    """
+    Suma (o resta, con valores negativos) unos macros y un número de registros en el resumen
+    de un día. Si el día estaba vacío toma la snapshot de objetivos indicada.
+    Se llama después de añadir o borrar los logs en la sesión; si el día aún no tiene resumen
+    (registros anteriores al resumen) se reconstruye entero desde sus logs, que ya incluyen el cambio.
+    No hace commit: se ejecuta dentro de la transacción que inserta o borra los logs.
+    """
+    resumen = db.session.get(DailySummary, (user_id, fecha))
+    if resumen is None:
+        return recalcular_resumen_dia(user_id, fecha)
+
+    if resumen.num_registros == 0 and num_registros > 0:
+        for clave, valor in snapshot.items():
+            setattr(resumen, clave, valor)
+
+    for clave in ("kcal", "proteinas", "carbohidratos", "grasas"):
+        setattr(resumen, clave, getattr(resumen, clave) + macros[clave])
+    resumen.num_registros += num_registros
+    resumen.version = (resumen.version or 0) + 1
+
+    # Al quedarse sin registros ponemos el día a cero exacto para no arrastrar errores de redondeo
+    if resumen.num_registros <= 0:
+        resumen.num_registros = 0
+        resumen.kcal = resumen.proteinas = resumen.carbohidratos = resumen.grasas = 0
+    return resumen
+
+def aplicar_log_a_resumen(log, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) un registro en el resumen de su día.
+    No hace commit: se ejecuta dentro de la transacción que inserta o borra el log.
+    """
+    macros = {clave: signo * valor for clave, valor in log.get_macros().items()}
+    snapshot = {clave: getattr(log, clave) for clave in CAMPOS_SNAPSHOT}
+    return acumular_en_resumen(log.user_id, log.date, macros, signo, snapshot)
+
+def expresiones_macros_log():
+    """
+    Expresiones SQL con los macros de cada DailyLog, para consultas con Food y Recipe unidos por OUTER JOIN.
+    Los alimentos van por 100g y las recetas usan sus totales materializados por gramo.
+    """
+    def macro(col_alimento, col_receta):
+        return DailyLog.grams * func.coalesce(col_alimento / 100.0, col_receta, 0)
+
     return {
-        "total_dias_con_datos": len(datos_diarios), 
-        "cumplidos": cumplidos
-    }
\ No newline at end of file
+        "kcal": macro(Food.kcal_100g, Recipe.kcal_g),
+        "proteinas": macro(Food.prot_100g, Recipe.prot_g),
+        "carbohidratos": macro(Food.carb_100g, Recipe.carb_g),
+        "grasas": macro(Food.fat_100g, Recipe.fat_g),
+    }
+
+def recalcular_resumenes(dias):
+    """
+    Reconstruye los resúmenes de una lista de pares (user_id, fecha).
+    Los totales salen de una única consulta GROUP BY con el cálculo de macros hecho en SQL.
+    """
+    dias = {(u, f) for u, f in dias}
+    if not dias:
+        return []
+    # Solo los pares afectados, no el producto de todos sus usuarios por todas sus fechas
+    de_los_dias = tuple_(DailyLog.user_id, DailyLog.date).in_(list(dias))
+
+    # Recetas anteriores a los totales materializados: los calculamos antes de agregar en SQL
+    pendientes = (Recipe.query.join(DailyLog, DailyLog.recipe_id == Recipe.id)
+                  .filter(Recipe.total_grams.is_(None), de_los_dias)
+                  .distinct())
+    for receta in pendientes.all():
+        recalcular_totales_receta(receta)
+
+    macros = expresiones_macros_log()
+
+    filas = (
+        db.session.query(
+            DailyLog.user_id, DailyLog.date,
+            *(func.sum(expr) for expr in macros.values()),
+            func.count(DailyLog.id), func.min(DailyLog.id),
+        )
+        .outerjoin(Food, DailyLog.food_id == Food.id)
+        .outerjoin(Recipe, DailyLog.recipe_id == Recipe.id)
+        .filter(de_los_dias)
+        .group_by(DailyLog.user_id, DailyLog.date)
+        .all()
+    )
+    agregados = {(f[0], f[1]): f for f in filas}
+
+    # La snapshot de objetivos del día es la del primer registro
+    primeros = [f[-1] for f in agregados.values()]
+    snapshots = {log.id: log for log in DailyLog.query.filter(DailyLog.id.in_(primeros))} if primeros else {}
+
+    existentes = {
+        (r.user_id, r.date): r for r in DailySummary.query.filter(
+            tuple_(DailySummary.user_id, DailySummary.date).in_(list(dias)))
+    }
+
+    resultado = []
+    for clave in dias:
+        resumen = existentes.get(clave)
+        if resumen is None:
+            resumen = DailySummary(user_id=clave[0], date=clave[1])
+            db.session.add(resumen)
+        fila = agregados.get(clave)
+        if fila is None:
+            resumen.kcal = resumen.proteinas = resumen.carbohidratos = resumen.grasas = 0
+            resumen.num_registros = 0
+        else:
+            resumen.kcal, resumen.proteinas, resumen.carbohidratos, resumen.grasas = (v or 0 for v in fila[2:6])
+            resumen.num_registros = fila[6]
+            _copiar_snapshot(resumen, snapshots[fila[7]])
+        # Aunque los totales no cambien (p. ej. al renombrar un alimento) el contenido del día sí
+        resumen.version = (resumen.version or 0) + 1
+        resultado.append(resumen)
+    return resultado
+
+def recalcular_resumen_dia(user_id, fecha):
+    """Reconstruye desde cero el resumen de un día a partir de sus DailyLog."""
+    return recalcular_resumenes([(user_id, fecha)])[0]
+
+def dias_afectados(food_ids=(), recipe_ids=()):
+    """
+    Pares (user_id, fecha) de los días que contienen registros de los alimentos o recetas
+    indicados, incluidos los registros de recetas que usan alguno de esos alimentos.
+    """
+    recipe_ids = set(recipe_ids)
+    if food_ids:
+        usadas = db.session.query(RecipeIngredient.recipe_id).filter(RecipeIngredient.food_id.in_(food_ids))
+        recipe_ids.update(rid for (rid,) in usadas.distinct())
+
+    condiciones = []
+    if food_ids:
+        condiciones.append(DailyLog.food_id.in_(food_ids))
+    if recipe_ids:
+        condiciones.append(DailyLog.recipe_id.in_(recipe_ids))
+    if not condiciones:
+        return []
+    return db.session.query(DailyLog.user_id, DailyLog.date).filter(db.or_(*condiciones)).distinct().all()
+
+def recalcular_resumenes_afectados(food_ids=(), recipe_ids=()):
+    """Recalcula los días que contienen registros de los alimentos o recetas indicados (ver dias_afectados)."""
+    dias = dias_afectados(food_ids, recipe_ids)
+    recalcular_resumenes(dias)
+    return len(dias)
+
+# --- REGISTRO POR LOTES ---
+
+def _snapshot_objetivos(usuario):
+    objetivos = (usuario.target_kcal, usuario.target_protein, usuario.target_carbs, usuario.target_fat)
+    return dict(zip(CAMPOS_SNAPSHOT, objetivos))
+
+def registrar_lote(usuario, fecha, items):
+    """
+    Registra de una vez varios consumos de un día (una comida completa).
+    'items' es una lista de (tipo, id, gramos) con tipo "food" o "recipe". Todos los registros
+    llevan la snapshot de las metas actuales y se insertan con un único INSERT masivo; los
+    macros salen de los alimentos y recetas ya cargados para validarlos, y se suman al resumen
+    del día de una vez. Lanza ValueError (sin insertar nada) si algún elemento no es válido o
+    no pertenece al usuario. No hace commit.
+    """
+    if not items or any(tipo not in ("food", "recipe") or gramos <= 0 for tipo, _, gramos in items):
+        raise ValueError("Elementos no válidos")
+    food_ids = {i for tipo, i, _ in items if tipo == "food"}
+    recipe_ids = {i for tipo, i, _ in items if tipo == "recipe"}
+
+    # Solo se pueden registrar alimentos visibles y recetas propias
+    alimentos = {f.id: f for f in Food.visibles(usuario.id).filter(Food.id.in_(food_ids))} if food_ids else {}
+    recetas = {r.id: r for r in Recipe.query.filter(Recipe.user_id == usuario.id,
+                                                     Recipe.id.in_(recipe_ids))} if recipe_ids else {}
+    if len(alimentos) != len(food_ids) or len(recetas) != len(recipe_ids):
+        raise ValueError("Elemento no disponible")
+
+    snapshot = _snapshot_objetivos(usuario)
+    filas, totales = [], {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+    for tipo, i, gramos in items:
+        if tipo == "food":
+            macros = calcular_macros_alimento(gramos, alimentos[i])
+        else:
+            macros = calcular_macros_receta(gramos, recetas[i])
+        for clave in totales:
+            totales[clave] += macros[clave]
+        filas.append(dict(snapshot, user_id=usuario.id, date=fecha, grams=gramos,
+                          food_id=i if tipo == "food" else None, recipe_id=i if tipo == "recipe" else None))
+
+    # Con la tabla (y no el modelo) todas las filas van en un único executemany, aunque tengan nulos distintos
+    db.session.execute(insert(DailyLog.__table__), filas)
+    acumular_en_resumen(usuario.id, fecha, totales, len(filas), snapshot)
+    return len(filas)
+
+def copiar_registros(usuario, origen, destino, log_ids=None):
+    """
+    Duplica en 'destino' los registros del usuario del día 'origen' (o solo los de 'log_ids',
+    para repetir una comida concreta) con un único INSERT ... SELECT, sin cargarlos en Python.
+    Las copias llevan la snapshot de las metas actuales, como cualquier registro nuevo.
+    No hace commit. Devuelve el número de registros copiados.
+    """
+    snapshot = _snapshot_objetivos(usuario)
+    origenes = select(
+        literal(usuario.id), literal(destino, type_=DailyLog.date.type),
+        DailyLog.food_id, DailyLog.recipe_id, DailyLog.grams,
+        *(literal(valor, type_=DailyLog.target_kcal_snapshot.type) for valor in snapshot.values()),
+    ).where(DailyLog.user_id == usuario.id, DailyLog.date == origen).order_by(DailyLog.id)
+    if log_ids is not None:
+        origenes = origenes.where(DailyLog.id.in_(log_ids))
+
+    columnas = ["user_id", "date", "food_id", "recipe_id", "grams", *snapshot]
+    resultado = db.session.execute(insert(DailyLog).from_select(columnas, origenes))
+    if resultado.rowcount:
+        recalcular_resumenes([(usuario.id, destino)])
+    return resultado.rowcount
+
+# --- LIMPIEZA DEL CATÁLOGO ---
+
+def limpiar_catalogo_usuario(user_id, simular=False):
+    """
+    Elimina de una vez los alimentos del usuario que no aparecen en ninguna receta ni registro.
+    Los alimentos en uso se detectan con un anti-join (NOT EXISTS) en lugar de provocar errores
+    de integridad uno a uno. Con simular=True solo devuelve los recuentos, sin borrar nada.
+    """
+    en_uso = or_(
+        exists().where(RecipeIngredient.food_id == Food.id),
+        exists().where(DailyLog.food_id == Food.id),
+    )
+    borrables, protegidos = db.session.query(
+        func.count(case((~en_uso, 1))),
+        func.count(case((en_uso, 1))),
+    ).filter(Food.user_id == user_id).one()
+
+    if not simular and borrables:
+        resultado = db.session.execute(
+            delete(Food).where(Food.user_id == user_id, ~en_uso),
+            execution_options={"synchronize_session": False},
+        )
+        borrables = resultado.rowcount
+    return {"borrables": borrables, "protegidos": protegidos}
+
+# --- CATÁLOGO BASE COMPARTIDO ---
+
+def personalizar_alimento_base(base, user_id):
+    """
+    Devuelve la copia personal del usuario de un alimento del catálogo base, creándola si no
+    existe. Al crearla, las recetas y registros del usuario que usaban el original pasan a
+    apuntar a la copia, de modo que sus cambios no afectan a los demás usuarios.
+    """
+    copia = Food.query.filter_by(user_id=user_id, base_id=base.id).first()
+    if copia is not None:
+        return copia
+    copia = Food(name=base.name, kcal_100g=base.kcal_100g, prot_100g=base.prot_100g,
+                 carb_100g=base.carb_100g, fat_100g=base.fat_100g, user_id=user_id, base_id=base.id)
+    db.session.add(copia)
+    db.session.flush()
+
+    recetas_usuario = select(Recipe.id).where(Recipe.user_id == user_id)
+    db.session.execute(
+        update(RecipeIngredient)
+        .where(RecipeIngredient.food_id == base.id, RecipeIngredient.recipe_id.in_(recetas_usuario))
+        .values(food_id=copia.id),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.execute(
+        update(DailyLog).where(DailyLog.user_id == user_id, DailyLog.food_id == base.id)
+        .values(food_id=copia.id),
+        execution_options={"synchronize_session": False},
+    )
+    return copia
+
+# --- PAGINACIÓN DEL CATÁLOGO ---
+
+TAMANO_PAGINA = 50
+
+def codificar_cursor(nombre, id_):
+    """Cursor opaco para la URL con la posición (nombre, id) del último elemento de la página."""
+    return base64.urlsafe_b64encode(json.dumps([nombre, id_]).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        nombre, id_ = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+        return str(nombre), int(id_)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+def paginar_por_nombre(consulta, modelo, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Paginación por clave (keyset) sobre (name, id): cada página continúa tras el último
+    elemento de la anterior, así el coste no crece con el número de página como con OFFSET.
+    Devuelve los elementos de la página y el cursor de la siguiente (None si es la última).
+    """
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion is not None:
+        nombre, id_ = posicion
+        consulta = consulta.filter(or_(modelo.name > nombre, and_(modelo.name == nombre, modelo.id > id_)))
+    elementos = consulta.order_by(modelo.name, modelo.id).limit(tamano + 1).all()
+
+    siguiente = None
+    if len(elementos) > tamano:
+        elementos = elementos[:tamano]
+        siguiente = codificar_cursor(elementos[-1].name, elementos[-1].id)
+    return elementos, siguiente
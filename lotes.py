@@ -0,0 +1,98 @@
+"""
+Cálculo vectorizado de macros por lotes, con NumPy.
+
+Para análisis de muchos meses fuera del camino de las peticiones (informes, comparaciones con
+los resúmenes diarios). La aplicación no importa este módulo, así que numpy solo se carga en el
+proceso que lo usa y no en cada worker al arrancar.
+"""
+import numpy as np
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, DailyLog, Food, Recipe, RecipeIngredient, calcular_macros_receta
+
+
+class MatrizNutricional:
+    """
+    Macros por gramo de un conjunto de alimentos y recetas, en arrays de N×4
+    (kcal, proteínas, carbohidratos, grasas), con el índice de fila de cada id.
+    """
+
+    def __init__(self, alimentos=(), recetas=()):
+        alimentos, recetas = list(alimentos), list(recetas)
+        self.fila_alimento = {getattr(f, "id", i): i for i, f in enumerate(alimentos)}
+        self.fila_receta = {getattr(r, "id", i): i for i, r in enumerate(recetas)}
+
+        self.alimentos = np.array(
+            [[f.kcal_100g, f.prot_100g, f.carb_100g, f.fat_100g] for f in alimentos], dtype=float
+        ).reshape(-1, 4) / 100
+        # Las recetas aportan sus macros por gramo (materializados o calculados sobre sus ingredientes)
+        self.recetas = np.array(
+            [list(calcular_macros_receta(1, r).values()) for r in recetas], dtype=float
+        ).reshape(-1, 4)
+
+
+def calcular_macros_lote(gramos, idx_alimento, idx_receta, matriz, dias=None):
+    """
+    Calcula de una vez los macros de muchos registros.
+    idx_alimento / idx_receta son las filas en la matriz (-1 si el registro no es de ese tipo);
+    como en obtener_resumen_diario, el alimento tiene prioridad sobre la receta.
+    Devuelve la matriz por registro (n×4) y, si se pasan las fechas, las fechas únicas
+    ordenadas junto con sus totales diarios (d×4).
+    """
+    gramos = np.asarray(gramos, dtype=float)
+    idx_alimento = np.asarray(idx_alimento, dtype=int)
+    idx_receta = np.asarray(idx_receta, dtype=int)
+
+    por_gramo = np.zeros((len(gramos), 4))
+    es_alimento = idx_alimento >= 0
+    es_receta = ~es_alimento & (idx_receta >= 0)
+    por_gramo[es_alimento] = matriz.alimentos[idx_alimento[es_alimento]]
+    por_gramo[es_receta] = matriz.recetas[idx_receta[es_receta]]
+    por_registro = por_gramo * gramos[:, None]
+
+    if dias is None:
+        return por_registro, None, None
+
+    fechas, grupo = np.unique(np.asarray(dias), return_inverse=True)
+    totales = np.zeros((len(fechas), 4))
+    np.add.at(totales, grupo.ravel(), por_registro)
+    return por_registro, fechas, totales
+
+
+def macros_a_dict(fila):
+    """Convierte una fila de 4 macros al diccionario que usa el resto de la aplicación."""
+    return dict(zip(("kcal", "proteinas", "carbohidratos", "grasas"), (float(v) for v in fila)))
+
+
+def cargar_lote_logs(user_id, desde=None, hasta=None):
+    """
+    Lee los registros de un periodo como arrays (sin instanciar objetos del ORM) junto con la
+    matriz nutricional de los alimentos y recetas que aparecen en ellos.
+    """
+    consulta = db.session.query(DailyLog.date, DailyLog.grams, DailyLog.food_id, DailyLog.recipe_id) \
+        .filter(DailyLog.user_id == user_id)
+    if desde is not None:
+        consulta = consulta.filter(DailyLog.date >= desde)
+    if hasta is not None:
+        consulta = consulta.filter(DailyLog.date <= hasta)
+    filas = consulta.order_by(DailyLog.date, DailyLog.id).all()
+
+    food_ids = {f for _, _, f, _ in filas if f}
+    recipe_ids = {r for _, _, _, r in filas if r}
+    alimentos = Food.query.filter(Food.id.in_(food_ids)).all() if food_ids else []
+    recetas = Recipe.query.filter(Recipe.id.in_(recipe_ids)).all() if recipe_ids else []
+    # Las recetas sin totales materializados se calculan sobre sus ingredientes: los cargamos
+    # todos de una vez en lugar de una consulta por receta
+    sin_totales = [r.id for r in recetas if r.total_grams is None]
+    if sin_totales:
+        Recipe.query.options(selectinload(Recipe.ingredients).joinedload(RecipeIngredient.food)) \
+            .filter(Recipe.id.in_(sin_totales)).all()
+    matriz = MatrizNutricional(alimentos, recetas)
+
+    return {
+        "dias": np.array([d for d, _, _, _ in filas], dtype="datetime64[D]"),
+        "gramos": np.array([g for _, g, _, _ in filas], dtype=float),
+        "idx_alimento": np.array([matriz.fila_alimento.get(f, -1) for _, _, f, _ in filas], dtype=int),
+        "idx_receta": np.array([matriz.fila_receta.get(r, -1) for _, _, _, r in filas], dtype=int),
+        "matriz": matriz,
+    }
@@ -0,0 +1,171 @@
+"""
+Instrumentación de las peticiones en formato Prometheus.
+
+Por cada petición se mide el tiempo total por ruta, el número de sentencias SQL y el tiempo
+pasado en la base de datos (eventos del engine, ver instrumentar_engine) y el tiempo de renderizado de
+cada plantilla Jinja. Todo se acumula en histogramas en memoria del proceso que /metrics
+expone en formato de texto de Prometheus (cada worker expone los suyos).
+
+Con REGISTRO_LENTAS_MS configurado, las peticiones que superan ese tiempo se escriben en el
+log junto con las sentencias SQL que ejecutaron y lo que tardó cada una.
+"""
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+log_lentas = logging.getLogger("nutri.lentas")
+
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histograma:
+    """Histograma acumulativo por combinación de etiquetas, seguro entre hilos."""
+
+    def __init__(self, nombre, ayuda, etiquetas, limites):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.limites = limites
+        self._series = {}
+        self._cerrojo = threading.Lock()
+
+    def observar(self, valor, *valores_etiquetas):
+        with self._cerrojo:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = {"cubetas": [0] * len(self.limites), "suma": 0.0, "n": 0}
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie["cubetas"][i] += 1
+            serie["suma"] += valor
+            serie["n"] += 1
+
+    def series(self):
+        with self._cerrojo:
+            return {clave: {"cubetas": list(s["cubetas"]), "suma": s["suma"], "n": s["n"]}
+                    for clave, s in self._series.items()}
+
+    def vaciar(self):
+        with self._cerrojo:
+            self._series.clear()
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, serie in sorted(self.series().items()):
+            base = ",".join(f'{e}="{_escapar(v)}"' for e, v in zip(self.etiquetas, valores))
+            separador = "," if base else ""
+            for limite, cuenta in zip(self.limites, serie["cubetas"]):
+                lineas.append(f'{self.nombre}_bucket{{{base}{separador}le="{limite}"}} {cuenta}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{separador}le="+Inf"}} {serie["n"]}')
+            lineas.append(f"{self.nombre}_sum{{{base}}} {serie['suma']}")
+            lineas.append(f"{self.nombre}_count{{{base}}} {serie['n']}")
+        return lineas
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+peticion_segundos = Histograma("nutri_peticion_segundos", "Duración de las peticiones por ruta.",
+                               ("ruta", "metodo"), LIMITES_SEGUNDOS)
+sql_consultas = Histograma("nutri_sql_consultas", "Sentencias SQL ejecutadas por petición.",
+                           ("ruta",), LIMITES_CONSULTAS)
+sql_segundos = Histograma("nutri_sql_segundos", "Tiempo total en la base de datos por petición.",
+                          ("ruta",), LIMITES_SEGUNDOS)
+render_segundos = Histograma("nutri_render_segundos", "Duración del renderizado de cada plantilla.",
+                             ("plantilla",), LIMITES_SEGUNDOS)
+HISTOGRAMAS = (peticion_segundos, sql_consultas, sql_segundos, render_segundos)
+
+# Funciones que devuelven [(nombre, ayuda, tipo, {etiquetas: valor})] en el momento de exponer
+COLECTORES = []
+
+
+# --- CAPTURA DURANTE LA PETICIÓN ---
+
+def inicio_peticion():
+    g.metricas = {"inicio": time.perf_counter(), "sql_n": 0, "sql_t": 0.0, "sentencias": [], "plantillas": []}
+
+
+def registrar_consulta(sentencia, duracion):
+    """Acumula una sentencia SQL en la petición en curso (fuera de una petición no hace nada)."""
+    if not has_request_context():
+        return
+    datos = g.get("metricas")
+    if datos is None:
+        return
+    datos["sql_n"] += 1
+    datos["sql_t"] += duracion
+    # Las sentencias solo se guardan si se van a escribir en el log de peticiones lentas
+    if current_app.config.get("REGISTRO_LENTAS_MS") is not None:
+        datos["sentencias"].append((duracion, sentencia))
+
+
+def _inicio_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+def _fin_consulta(conn, cursor, statement, parameters, context, executemany):
+    registrar_consulta(statement, time.perf_counter() - conn.info["inicio_consulta"].pop())
+
+
+def _error_consulta(contexto):
+    # La sentencia falló: after_cursor_execute no llegará a ejecutarse
+    pila = contexto.connection.info.get("inicio_consulta") if contexto.connection is not None else None
+    if pila:
+        pila.pop()
+
+
+def instrumentar_engine(engine):
+    """Mide el tiempo de cada sentencia SQL del engine y lo suma a la petición en curso."""
+    event.listen(engine, "before_cursor_execute", _inicio_consulta)
+    event.listen(engine, "after_cursor_execute", _fin_consulta)
+    event.listen(engine, "handle_error", _error_consulta)
+
+
+def inicio_render(plantilla):
+    datos = g.get("metricas")
+    if datos is not None:
+        datos["plantillas"].append(time.perf_counter())
+
+
+def fin_render(plantilla):
+    datos = g.get("metricas")
+    if datos is not None and datos["plantillas"]:
+        render_segundos.observar(time.perf_counter() - datos["plantillas"].pop(), plantilla.name or "(cadena)")
+
+
+def fin_peticion(umbral_lentas_ms=None):
+    datos = g.pop("metricas", None)
+    if datos is None:
+        return
+    duracion = time.perf_counter() - datos["inicio"]
+    ruta = request.url_rule.rule if request.url_rule is not None else "(sin ruta)"
+    peticion_segundos.observar(duracion, ruta, request.method)
+    sql_consultas.observar(datos["sql_n"], ruta)
+    sql_segundos.observar(datos["sql_t"], ruta)
+
+    if umbral_lentas_ms is not None and duracion * 1000 >= umbral_lentas_ms:
+        detalle = "\n".join(f"  [{t * 1000:.1f} ms] {sentencia}" for t, sentencia in datos["sentencias"])
+        log_lentas.warning("Petición lenta %s %s: %.1f ms, %d consultas SQL (%.1f ms)\n%s",
+                           request.method, request.full_path.rstrip("?"), duracion * 1000,
+                           datos["sql_n"], datos["sql_t"] * 1000, detalle)
+
+
+# --- EXPOSICIÓN ---
+
+def exponer():
+    """Texto en formato de exposición de Prometheus (versión 0.0.4)."""
+    lineas = []
+    for histograma in HISTOGRAMAS:
+        lineas += histograma.exponer()
+    for colector in COLECTORES:
+        for nombre, ayuda, tipo, valores in colector():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for etiquetas, valor in sorted(valores.items()):
+                base = ",".join(f'{e}="{_escapar(v)}"' for e, v in etiquetas)
+                lineas.append(f"{nombre}{{{base}}} {valor}" if base else f"{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,314 @@
+"""
+Migraciones de esquema versionadas.
+
+db.create_all() solo crea tablas nuevas: no añade columnas ni índices a tablas que ya
+existen en producción. Cada migración de este módulo se aplica una única vez sobre una
+base de datos viva y queda registrada en la tabla 'schema_version'.
+
+Las migraciones trabajan con SQL sobre una conexión (no con el ORM) para que sigan siendo
+válidas aunque los modelos evolucionen, y son idempotentes: en una base de datos recién
+creada con create_all() simplemente no encuentran nada que hacer.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import MetaData, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+
+from models import db, normalizar, User, DailyLog, DailySummary, Food, Recipe, RecipeIngredient, SchemaVersion
+import importacion
+
+MIGRACIONES = []
+
+
+def migracion(version, descripcion, transaccional=True):
+    """
+    Registra una función como migración con su número de versión.
+    Las no transaccionales reciben una conexión sin transacción abierta y gestionan las suyas
+    (p. ej. para cambiar PRAGMAs de SQLite, que no tienen efecto dentro de una transacción).
+    """
+    def decorador(funcion):
+        funcion.transaccional = transaccional
+        MIGRACIONES.append((version, descripcion, funcion))
+        MIGRACIONES.sort(key=lambda m: m[0])
+        return funcion
+    return decorador
+
+
+# --- UTILIDADES DE ESQUEMA ---
+
+def _columnas(conn, tabla):
+    return {c["name"] for c in inspect(conn).get_columns(tabla)}
+
+
+def _añadir_columna(conn, tabla, nombre, tipo_sql):
+    if nombre not in _columnas(conn, tabla):
+        conn.execute(text(f'ALTER TABLE "{tabla}" ADD COLUMN {nombre} {tipo_sql}'))
+
+
+def _crear_indices(conn, modelo, nombres):
+    """Crea los índices indicados, tal y como los declara el modelo, si aún no existen."""
+    existentes = {i["name"] for i in inspect(conn).get_indexes(modelo.__tablename__)}
+    for indice in modelo.__table__.indexes:
+        if indice.name in nombres and indice.name not in existentes:
+            indice.create(conn)
+
+
+# --- MIGRACIONES ---
+
+@migracion(1, "Totales materializados de recetas")
+def _totales_receta(conn):
+    for columna in ("total_grams", "kcal_g", "prot_g", "carb_g", "fat_g"):
+        _añadir_columna(conn, "recipe", columna, "FLOAT")
+
+    # Rellenamos las recetas existentes con el mismo cálculo que recalcular_totales_receta
+    conn.execute(text("""
+        UPDATE recipe SET total_grams = COALESCE(
+            (SELECT SUM(ri.grams) FROM recipe_ingredient ri WHERE ri.recipe_id = recipe.id), 0)
+        WHERE total_grams IS NULL
+    """))
+    for columna, origen in (("kcal_g", "kcal_100g"), ("prot_g", "prot_100g"),
+                            ("carb_g", "carb_100g"), ("fat_g", "fat_100g")):
+        conn.execute(text(f"""
+            UPDATE recipe SET {columna} = CASE WHEN total_grams > 0 THEN
+                (SELECT SUM(ri.grams * f.{origen} / 100.0) FROM recipe_ingredient ri
+                 JOIN food f ON f.id = ri.food_id WHERE ri.recipe_id = recipe.id) / total_grams
+                ELSE 0 END
+            WHERE {columna} IS NULL
+        """))
+
+
+@migracion(2, "Tabla de resúmenes diarios")
+def _resumenes_diarios(conn):
+    DailySummary.__table__.create(conn, checkfirst=True)
+
+    # Generamos los resúmenes de los días que aún no lo tienen con una sola agregación
+    macro = "SUM(l.grams * COALESCE(f.{0} / 100.0, r.{1}, 0))"
+    conn.execute(text(f"""
+        INSERT INTO daily_summary (user_id, date, kcal, proteinas, carbohidratos, grasas, num_registros,
+                                   target_kcal_snapshot, target_protein_snapshot,
+                                   target_carbs_snapshot, target_fat_snapshot)
+        SELECT agg.user_id, agg.date, agg.kcal, agg.prot, agg.carb, agg.fat, agg.n,
+               p.target_kcal_snapshot, p.target_protein_snapshot,
+               p.target_carbs_snapshot, p.target_fat_snapshot
+        FROM (
+            SELECT l.user_id AS user_id, l.date AS date,
+                   {macro.format("kcal_100g", "kcal_g")} AS kcal,
+                   {macro.format("prot_100g", "prot_g")} AS prot,
+                   {macro.format("carb_100g", "carb_g")} AS carb,
+                   {macro.format("fat_100g", "fat_g")} AS fat,
+                   COUNT(l.id) AS n, MIN(l.id) AS primer_id
+            FROM daily_log l
+            LEFT JOIN food f ON f.id = l.food_id
+            LEFT JOIN recipe r ON r.id = l.recipe_id
+            GROUP BY l.user_id, l.date
+        ) agg
+        JOIN daily_log p ON p.id = agg.primer_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM daily_summary s WHERE s.user_id = agg.user_id AND s.date = agg.date
+        )
+    """))
+
+
+@migracion(3, "Índices compuestos para las consultas frecuentes")
+def _indices(conn):
+    _crear_indices(conn, Food, {"ix_food_user_name"})
+    _crear_indices(conn, Recipe, {"ix_recipe_user_name"})
+    _crear_indices(conn, RecipeIngredient, {"ix_recipe_ingredient_recipe_id", "ix_recipe_ingredient_food_id"})
+    _crear_indices(conn, DailyLog, {"ix_daily_log_user_date", "ix_daily_log_food_id", "ix_daily_log_recipe_id"})
+
+
+@migracion(4, "Nombres normalizados para el buscador")
+def _nombres_normalizados(conn):
+    for tabla in ("food", "recipe"):
+        _añadir_columna(conn, tabla, "name_norm", "VARCHAR(100)")
+        # La normalización (quitar tildes) no es portable en SQL: la hacemos en Python por lotes
+        while True:
+            filas = conn.execute(text(f"SELECT id, name FROM {tabla} WHERE name_norm IS NULL LIMIT 1000")).all()
+            if not filas:
+                break
+            conn.execute(text(f"UPDATE {tabla} SET name_norm = :norm WHERE id = :id"),
+                         [{"id": fila.id, "norm": normalizar(fila.name)} for fila in filas])
+    _crear_indices(conn, Food, {"ix_food_user_name_norm"})
+    _crear_indices(conn, Recipe, {"ix_recipe_user_name_norm"})
+
+
+@migracion(5, "Alimentos del catálogo base sin dueño", transaccional=False)
+def _food_sin_dueño(conn):
+    columnas = {c["name"]: c for c in inspect(conn).get_columns("food")}
+    if columnas["user_id"]["nullable"] and "base_id" in columnas:
+        return
+    conn.rollback()
+
+    if conn.dialect.name != "sqlite":
+        with conn.begin():
+            conn.execute(text("ALTER TABLE food ALTER COLUMN user_id DROP NOT NULL"))
+            _añadir_columna(conn, "food", "base_id", "INTEGER REFERENCES food(id)")
+        return
+
+    # SQLite no permite quitar un NOT NULL: reconstruimos la tabla con la definición actual del
+    # modelo. Las claves foráneas se desactivan fuera de la transacción (dentro no surte efecto)
+    # para que borrar la tabla original no toque las recetas ni los registros que la referencian.
+    meta = MetaData()
+    User.__table__.to_metadata(meta)
+    Food.__table__.to_metadata(meta)
+    nueva = Food.__table__.to_metadata(meta, name="food_nuevo")
+    comunes = ", ".join(c for c in nueva.columns.keys() if c in columnas)
+
+    conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    conn.commit()
+    try:
+        with conn.begin():
+            conn.execute(text("DROP TABLE IF EXISTS food_nuevo"))
+            conn.execute(CreateTable(nueva))
+            conn.execute(text(f"INSERT INTO food_nuevo ({comunes}) SELECT {comunes} FROM food"))
+            conn.execute(text("DROP TABLE food"))
+            conn.execute(text("ALTER TABLE food_nuevo RENAME TO food"))
+            _crear_indices(conn, Food, {"ix_food_user_name", "ix_food_user_name_norm"})
+            if conn.exec_driver_sql("PRAGMA foreign_key_check").first() is not None:
+                raise RuntimeError("La reconstrucción de 'food' dejó referencias rotas")
+    finally:
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+        conn.commit()
+
+
+@migracion(6, "Catálogo base compartido")
+def _catalogo_base(conn):
+    _crear_indices(conn, Food, {"ix_food_user_base"})
+    importacion.importar_catalogo_base(conexion=conn)
+
+    # Las copias exactas que 'Cargar básicos' hizo en cada catálogo pasan a ser el alimento base:
+    # recetas y registros se reapuntan y la copia se borra (los totales no cambian)
+    copias = """
+        SELECT c.id AS copia, b.id AS base FROM food c
+        JOIN food b ON b.user_id IS NULL AND b.name = c.name AND b.kcal_100g = c.kcal_100g
+             AND b.prot_100g = c.prot_100g AND b.carb_100g = c.carb_100g AND b.fat_100g = c.fat_100g
+        WHERE c.user_id IS NOT NULL AND c.base_id IS NULL
+    """
+    for tabla in ("recipe_ingredient", "daily_log"):
+        conn.execute(text(f"""
+            UPDATE {tabla} SET food_id = (SELECT e.base FROM ({copias}) e WHERE e.copia = {tabla}.food_id)
+            WHERE food_id IN (SELECT e.copia FROM ({copias}) e)
+        """))
+    conn.execute(text(f"DELETE FROM food WHERE id IN (SELECT e.copia FROM ({copias}) e)"))
+
+    # Las que el usuario modificó se conservan como su versión personal del alimento base
+    conn.execute(text("""
+        UPDATE food SET base_id = (SELECT b.id FROM food b WHERE b.user_id IS NULL AND b.name = food.name)
+        WHERE user_id IS NOT NULL AND base_id IS NULL
+          AND EXISTS (SELECT 1 FROM food b WHERE b.user_id IS NULL AND b.name = food.name)
+    """))
+
+
+@migracion(7, "Versión de los resúmenes diarios")
+def _version_resumen(conn):
+    _añadir_columna(conn, "daily_summary", "version", "INTEGER NOT NULL DEFAULT 1")
+
+
+@migracion(8, "Versión de los datos de cada usuario")
+def _version_datos_usuario(conn):
+    _añadir_columna(conn, "user", "version_datos", "INTEGER NOT NULL DEFAULT 0")
+
+
+# --- EJECUCIÓN ---
+
+def versiones_aplicadas(conn):
+    SchemaVersion.__table__.create(conn, checkfirst=True)
+    return set(conn.execute(select(SchemaVersion.version)).scalars())
+
+
+def aplicar_migraciones(engine=None):
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción.
+    Devuelve la lista de versiones aplicadas en esta llamada.
+    """
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        aplicadas = versiones_aplicadas(conn)
+
+    nuevas = []
+    for version, descripcion, funcion in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        registro = SchemaVersion.__table__.insert().values(
+            version=version, descripcion=descripcion, aplicada=datetime.utcnow())
+        try:
+            if funcion.transaccional:
+                with engine.begin() as conn:
+                    funcion(conn)
+                    conn.execute(registro)
+            else:
+                with engine.connect() as conn:
+                    funcion(conn)
+                with engine.begin() as conn:
+                    conn.execute(registro)
+        except IntegrityError:
+            # Otro proceso (p. ej. otro worker de gunicorn) la aplicó a la vez que nosotros;
+            # si no está registrada, el error es de la propia migración
+            with engine.connect() as conn:
+                if version not in versiones_aplicadas(conn):
+                    raise
+            continue
+        nuevas.append(version)
+    return nuevas
+
+
+def preparar_esquema():
+    """
+    Crea las tablas que falten y aplica las migraciones pendientes (comando 'flask migrar').
+    La aplicación ya no lo hace al arrancar: se ejecuta una vez en cada despliegue.
+    """
+    db.create_all()
+    return aplicar_migraciones()
+
+
+# --- COMPROBACIÓN DE PLANES DE EJECUCIÓN ---
+
+def consultas_principales(user_id=1):
+    """Consultas calientes de la aplicación cuyos planes deben apoyarse en un índice."""
+    hoy = date.today()
+    return {
+        "registros_del_dia": select(DailyLog).where(DailyLog.user_id == user_id, DailyLog.date == hoy),
+        "catalogo_alimentos": select(Food).where(Food.user_id == user_id),
+        "catalogo_visible": select(Food).where(Food.condicion_visible(user_id)),
+        "alimento_por_nombre": select(Food).where(Food.user_id == user_id, Food.name == "Arroz"),
+        "catalogo_recetas": select(Recipe).where(Recipe.user_id == user_id),
+        "resumenes_periodo": select(DailySummary).where(DailySummary.user_id == user_id,
+                                                        DailySummary.date >= hoy),
+        "recetas_con_alimento": select(RecipeIngredient.recipe_id).where(RecipeIngredient.food_id == 1),
+        "buscador_prefijo": select(Food).where(Food.user_id == user_id, Food.name_norm >= "arr",
+                                               Food.name_norm < "arr\uffff"),
+    }
+
+
+def _usa_indice(plan, dialecto):
+    if dialecto == "sqlite":
+        # 'SCAN tabla' es un recorrido completo; 'SEARCH ... USING INDEX' o la PK son accesos indexados
+        return all(not linea.startswith("SCAN") or "USING" in linea for linea in plan)
+    return not any("Seq Scan" in linea for linea in plan)
+
+
+def informe_explain(engine=None, user_id=1):
+    """
+    Ejecuta EXPLAIN sobre las consultas principales y devuelve, para cada una,
+    su plan y si se resuelve con un índice. Sirve para detectar regresiones de índices.
+    """
+    engine = engine or db.engine
+    dialecto = engine.dialect.name
+    prefijo = "EXPLAIN QUERY PLAN " if dialecto == "sqlite" else "EXPLAIN "
+    informe = {}
+    with engine.connect() as conn:
+        if dialecto == "postgresql":
+            # Con tablas pequeñas Postgres prefiere el Seq Scan: lo desactivamos para ver si hay índice usable
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for nombre, consulta in consultas_principales(user_id).items():
+            compilada = consulta.compile(dialect=engine.dialect)
+            if compilada.positional:
+                parametros = tuple(compilada.params[p] for p in compilada.positiontup)
+            else:
+                parametros = compilada.params
+            filas = conn.exec_driver_sql(prefijo + str(compilada), parametros).fetchall()
+            plan = [str(f[-1]) for f in filas]
+            informe[nombre] = {"plan": plan, "usa_indice": _usa_indice(plan, dialecto)}
+        conn.rollback()
+    return informe
@@ -1,8 +1,79 @@
+import unicodedata
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import aliased
+
+from basedatos import SesionEnrutada
+
+# La sesión reparte las lecturas entre la primaria y la réplica (ver basedatos.py)
+db = SQLAlchemy(session_options={"class_": SesionEnrutada})
+
+
+# --- CÁLCULOS QUE USAN LOS PROPIOS MODELOS ---
+# Están aquí y no en busqueda.py / logic.py, que importan este módulo: así los modelos no
+# tienen que importarlos dentro de cada método (ambos módulos los siguen exponiendo)
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni diéresis y con los espacios colapsados."""
+    if texto is None:
+        return None
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def calcular_macros_alimento(grams, food):
+    """Calcula los macros proporcionales de un alimento base."""
+    # Evitamos errores si el alimento no existe
+    if not food:
+        return {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+    
+    ratio = grams / 100
+    return {
+        "kcal": food.kcal_100g * ratio,
+        "proteinas": food.prot_100g * ratio,
+        "carbohidratos": food.carb_100g * ratio,
+        "grasas": food.fat_100g * ratio
+    }
+
+def calcular_macros_receta(grams_consumidos, recipe):
+    """
+    Suma los ingredientes de una receta y escala el total 
+    según la cantidad que el usuario ha ingerido.
+    """
+    totales_receta = {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+    
+    if not recipe:
+        return totales_receta
+
+    # Camino rápido: si la receta tiene sus totales materializados basta con multiplicar
+    if getattr(recipe, "total_grams", None) is not None:
+        return {
+            "kcal": (recipe.kcal_g or 0) * grams_consumidos,
+            "proteinas": (recipe.prot_g or 0) * grams_consumidos,
+            "carbohidratos": (recipe.carb_g or 0) * grams_consumidos,
+            "grasas": (recipe.fat_g or 0) * grams_consumidos
+        }
+
+    if not recipe.ingredients:
+        return totales_receta
+
+    # 1. Calculamos el peso total real de la receta sumando sus ingredientes
+    peso_total_receta = sum(ing.grams for ing in recipe.ingredients)
+    
+    # 2. Sumamos los macros de cada ingrediente
+    for ing in recipe.ingredients:
+        macros_ing = calcular_macros_alimento(ing.grams, ing.food)
+        for clave in totales_receta:
+            totales_receta[clave] += macros_ing[clave]
+            
+    # 3. Ratio: ¿Qué parte de la receta completa se ha comido el usuario?
+    ratio_consumo = grams_consumidos / peso_total_receta if peso_total_receta > 0 else 0
+    
+    return {k: v * ratio_consumo for k, v in totales_receta.items()}
 
-db = SQLAlchemy()
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,13 +89,28 @@ class User(UserMixin, db.Model):
     target_carbs = db.Column(db.Integer, default=200)
     target_fat = db.Column(db.Integer, default=60)
 
+    # Se incrementa con cada escritura que cambia lo que ve el usuario (ver cache.py)
+    version_datos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relaciones principales: un usuario es dueño de sus alimentos, recetas y registros
     foods = db.relationship('Food', backref='owner', lazy=True)
     recipes = db.relationship('Recipe', backref='owner', lazy=True)
     logs = db.relationship('DailyLog', backref='owner', lazy=True)
 
 class Food(db.Model):
-    """Alimentos básicos creados por el usuario o cargados del sistema."""
+    """
+    Alimentos básicos creados por el usuario o del catálogo base del sistema.
+    Los del catálogo base no tienen dueño (user_id NULL), se cargan una sola vez y son de solo
+    lectura: cuando un usuario edita uno se crea su copia personal, enlazada con 'base_id'.
+    """
+    # El catálogo se consulta siempre por usuario, y la carga de básicos además por nombre
+    __table_args__ = (
+        db.Index('ix_food_user_name', 'user_id', 'name'),
+        db.Index('ix_food_user_name_norm', 'user_id', 'name_norm'),
+        # Comprobar si un usuario ya personalizó un alimento base
+        db.Index('ix_food_user_base', 'user_id', 'base_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     # Valores nutricionales siempre referenciados a una base de 100g
@@ -32,38 +118,97 @@ class Food(db.Model):
     prot_100g = db.Column(db.Float, nullable=False)
     carb_100g = db.Column(db.Float, nullable=False)
     fat_100g = db.Column(db.Float, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # Nombre sin tildes ni mayúsculas: es la clave del buscador (ver busqueda.py)
+    name_norm = db.Column(db.String(100), nullable=True)
+    # Alimento del catálogo base del que esta fila es la copia personal del usuario
+    base_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=True)
 
     # Bloqueamos el borrado accidental si el alimento ya forma parte de una receta o log
     recipe_usages = db.relationship('RecipeIngredient', backref='food', lazy=True)
     log_usages = db.relationship('DailyLog', backref='food', lazy=True)
 
+    @db.validates('name')
+    def _indexar_nombre(self, clave, valor):
+        self.name_norm = normalizar(valor)
+        return valor
+
+    @property
+    def es_base(self):
+        return self.user_id is None
+
+    @classmethod
+    def condicion_visible(cls, user_id):
+        """
+        Condición SQL de los alimentos que ve un usuario: los suyos y los del catálogo base
+        que no haya sustituido por una copia personal.
+        """
+        copia = aliased(cls)
+        personalizado = exists().where(copia.user_id == user_id, copia.base_id == cls.id)
+        return or_(cls.user_id == user_id, and_(cls.user_id.is_(None), ~personalizado))
+
+    @classmethod
+    def visibles(cls, user_id):
+        return cls.query.filter(cls.condicion_visible(user_id))
+
 class Recipe(db.Model):
     """Platos compuestos (ej: un batido) que agrupan varios alimentos."""
+    __table_args__ = (
+        db.Index('ix_recipe_user_name', 'user_id', 'name'),
+        db.Index('ix_recipe_user_name_norm', 'user_id', 'name_norm'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name_norm = db.Column(db.String(100), nullable=True)
+
+    # Totales materializados: peso total y macros por gramo de la receta completa.
+    # Se recalculan al modificar ingredientes para no recorrerlos en cada lectura.
+    total_grams = db.Column(db.Float, nullable=True)
+    kcal_g = db.Column(db.Float, nullable=True)
+    prot_g = db.Column(db.Float, nullable=True)
+    carb_g = db.Column(db.Float, nullable=True)
+    fat_g = db.Column(db.Float, nullable=True)
     
     # Si borramos la receta, sus ingredientes (la relación peso-alimento) desaparecen automáticamente
     ingredients = db.relationship('RecipeIngredient', backref='recipe', cascade="all, delete-orphan")
     log_usages = db.relationship('DailyLog', backref='recipe', lazy=True)
 
+    def get_totales(self):
+        """Macros de la receta completa (todos sus gramos), usados en la cabecera del catálogo."""
+        if self.total_grams is not None:
+            peso = self.total_grams
+        else:
+            peso = sum(ing.grams for ing in self.ingredients)
+        totales = calcular_macros_receta(peso, self)
+        totales["gramos"] = peso
+        return totales
+
+    @db.validates('name')
+    def _indexar_nombre(self, clave, valor):
+        self.name_norm = normalizar(valor)
+        return valor
+
 class RecipeIngredient(db.Model):
     """Tabla intermedia que define cuántos gramos de un alimento lleva una receta."""
     id = db.Column(db.Integer, primary_key=True)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
-    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False, index=True)
+    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=False, index=True)
     grams = db.Column(db.Float, nullable=False)
 
 class DailyLog(db.Model):
     """Registro de lo consumido. Aquí ocurre la magia de la trazabilidad."""
+    # Consulta principal del dashboard: los registros de un usuario en una fecha
+    __table_args__ = (db.Index('ix_daily_log_user_date', 'user_id', 'date'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
     
     # Puede ser un alimento suelto o una receta completa (uno de los dos será nulo)
-    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=True)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=True)
+    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=True, index=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=True, index=True)
     grams = db.Column(db.Float, nullable=False) 
     
     # IMPORTANTE: Guardamos una snapshot de los objetivos actuales del usuario.
@@ -75,9 +220,90 @@ class DailyLog(db.Model):
 
     def get_macros(self):
         """Método de conveniencia para obtener resultados finales sin importar el tipo de entrada."""
-        from logic import calcular_macros_alimento, calcular_macros_receta
         if self.food:
             return calcular_macros_alimento(self.grams, self.food)
         elif self.recipe:
             return calcular_macros_receta(self.grams, self.recipe)
-        return {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
\ No newline at end of file
+        return {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+
+    def get_nombre(self):
+        """Nombre del alimento o receta; los registros cuyo elemento se borró quedan sin ninguno."""
+        if self.food:
+            return self.food.name
+        elif self.recipe:
+            return self.recipe.name
+        return "(elemento eliminado)"
+
+
+class DailySummary(db.Model):
+    """
+    Resumen precalculado de un día para un usuario (tabla de agregados).
+    Se actualiza en la misma transacción que los DailyLog para no recalcular el día en cada lectura.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+
+    kcal = db.Column(db.Float, nullable=False, default=0)
+    proteinas = db.Column(db.Float, nullable=False, default=0)
+    carbohidratos = db.Column(db.Float, nullable=False, default=0)
+    grasas = db.Column(db.Float, nullable=False, default=0)
+    # Número de registros del día; un resumen a cero no cuenta como día con datos
+    num_registros = db.Column(db.Integer, nullable=False, default=0)
+    # Se incrementa con cada cambio del día (registros, alimentos o recetas): es la base de su ETag
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # Copia de la snapshot de objetivos del primer registro del día
+    target_kcal_snapshot = db.Column(db.Integer)
+    target_protein_snapshot = db.Column(db.Integer)
+    target_carbs_snapshot = db.Column(db.Integer)
+    target_fat_snapshot = db.Column(db.Integer)
+
+    def get_macros(self):
+        """Totales del día con el mismo formato (y redondeo) que obtener_resumen_diario."""
+        return {
+            "kcal": round(self.kcal, 1),
+            "proteinas": round(self.proteinas, 1),
+            "carbohidratos": round(self.carbohidratos, 1),
+            "grasas": round(self.grasas, 1),
+        }
+
+
+class Tarea(db.Model):
+    """
+    Trabajo en segundo plano (carga del catálogo, importaciones, limpiezas) con su estado y avance.
+    La ejecuta el pool de tareas del proceso indicado en 'propietario' (ver tareas.py).
+    """
+    __table_args__ = (
+        # Tareas activas de un usuario (evitar duplicados) y tareas huérfanas al arrancar
+        db.Index('ix_tarea_user_tipo_estado', 'user_id', 'tipo', 'estado'),
+        db.Index('ix_tarea_estado', 'estado'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tipo = db.Column(db.String(50), nullable=False)
+    # pendiente -> en_curso -> completada | fallida
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    progreso = db.Column(db.Float, nullable=False, default=0)
+    # Argumentos y resultado de la tarea en JSON
+    parametros = db.Column(db.Text, nullable=False, default='{}')
+    resultado = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    # "host:pid" del proceso que la tiene en su pool
+    propietario = db.Column(db.String(100), nullable=True)
+    creada = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    actualizada = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    terminada = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def activa(self):
+        return self.estado in ('pendiente', 'en_curso')
+
+
+class SchemaVersion(db.Model):
+    """Migraciones de esquema ya aplicadas sobre esta base de datos (ver migraciones.py)."""
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descripcion = db.Column(db.String(200), nullable=False)
+    aplicada = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -3,4 +3,7 @@
 set -o errexit
 
 # 1. Instalar dependencias
-pip install -r requirements.txt
\ No newline at end of file
+pip install -r requirements.txt
+
+# 2. Crear las tablas que falten y aplicar las migraciones pendientes
+flask --app app migrar
@@ -0,0 +1,326 @@
+"""
+Tareas en segundo plano para las operaciones pesadas del catálogo.
+
+Cargar el catálogo básico, limpiar el catálogo o importar un fichero grande ocupaban el worker
+durante toda la operación y acababan en timeout con catálogos grandes. Ahora la ruta registra
+una Tarea en la base de datos, la entrega a un pool de hilos acotado del propio proceso y
+responde al momento; el navegador consulta después su estado en /api/tareas/<id>.
+
+Como el pool de hash (ver contrasenas.py), admite 'hilos' tareas en ejecución más 'cola' en
+espera y rechaza las nuevas si está lleno. Con hilos=0 la tarea se ejecuta dentro de la propia
+petición (útil en pruebas y para depurar).
+
+Cada tarea guarda el "host:pid" del proceso que la tiene. Si ese proceso muere (reinicio de un
+worker, despliegue), cualquier otro la recupera la primera vez que usa el pool: la vuelve a
+lanzar hasta 'max_intentos' veces o la marca como fallida. Por eso las tareas deben poder
+repetirse sin duplicar nada, como ya ocurre con la importación (omite nombres existentes).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, Food, Tarea
+import cache
+import importacion
+from logic import limpiar_catalogo_usuario
+
+log = logging.getLogger("nutri.tareas")
+
+ACTIVAS = ("pendiente", "en_curso")
+
+# Funciones de cada tipo de tarea: reciben el avance, el usuario y sus parámetros y devuelven
+# un diccionario JSON con el resultado (con un 'mensaje' para el usuario)
+TIPOS = {}
+
+
+def tarea(tipo):
+    def decorador(funcion):
+        TIPOS[tipo] = funcion
+        return funcion
+    return decorador
+
+
+class ColaTareasLlena(Exception):
+    """El pool de tareas tiene todos sus hilos y su cola ocupados."""
+
+
+class Avance:
+    """Permite a una tarea publicar su progreso (0 a 1), confirmando a la vez lo que lleva hecho."""
+
+    def __init__(self, tarea_id):
+        self.tarea_id = tarea_id
+
+    def __call__(self, fraccion):
+        db.session.execute(
+            update(Tarea).where(Tarea.id == self.tarea_id)
+            .values(progreso=min(max(fraccion, 0.0), 1.0), actualizada=datetime.utcnow()),
+            execution_options={"synchronize_session": False},
+        )
+        db.session.commit()
+
+
+class ServicioTareas:
+    """Pool de hilos acotado que ejecuta las tareas registradas en la base de datos."""
+
+    def __init__(self, hilos=2, cola=16, max_intentos=3, caducidad=3600.0):
+        self.hilos = hilos
+        self.cola = cola
+        self.max_intentos = max_intentos
+        # Sin noticias de una tarea de otra máquina durante este tiempo, se da por huérfana
+        self.caducidad = caducidad
+        self.rechazadas = 0
+        self._plazas = threading.BoundedSemaphore(hilos + cola) if hilos else None
+        self._pool = None
+        self._pid = None
+        self._recuperado_pid = None
+        self._cerrojo = threading.Lock()
+
+    @property
+    def propietario(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _ejecutor(self):
+        # Creación perezosa y por proceso: un pool heredado de un fork no tiene hilos vivos
+        with self._cerrojo:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="tarea")
+                self._pid = os.getpid()
+            return self._pool
+
+    def _reservar_plaza(self):
+        return self._plazas is None or self._plazas.acquire(blocking=False)
+
+    def _lanzar(self, app, tarea_id):
+        """Ejecuta la tarea (con una plaza ya reservada) en el pool o, con hilos=0, aquí mismo."""
+        if not self.hilos:
+            self._ejecutar(app, tarea_id)
+            return
+        try:
+            futuro = self._ejecutor().submit(self._ejecutar, app, tarea_id)
+        except BaseException:
+            self._plazas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._plazas.release())
+
+    # --- API PARA LAS RUTAS ---
+
+    def encolar(self, tipo, user_id, **parametros):
+        """
+        Registra la tarea y la lanza; devuelve su id sin esperar a que termine.
+        Si el usuario ya tiene una igual en marcha devuelve esa. Confirma la sesión.
+        Lanza ColaTareasLlena si no quedan plazas en el pool.
+        """
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+        self.arrancar()
+        parametros = json.dumps(parametros, sort_keys=True)
+        existente = Tarea.query.filter(Tarea.user_id == user_id, Tarea.tipo == tipo,
+                                       Tarea.estado.in_(ACTIVAS), Tarea.parametros == parametros).first()
+        if existente is not None:
+            return existente.id
+
+        if not self._reservar_plaza():
+            self.rechazadas += 1
+            raise ColaTareasLlena()
+        try:
+            nueva = Tarea(user_id=user_id, tipo=tipo, parametros=parametros, propietario=self.propietario)
+            db.session.add(nueva)
+            db.session.flush()
+            tarea_id = nueva.id
+            db.session.commit()
+        except BaseException:
+            if self._plazas is not None:
+                self._plazas.release()
+            raise
+        self._lanzar(current_app._get_current_object(), tarea_id)
+        return tarea_id
+
+    def obtener(self, tarea_id, user_id):
+        """La tarea del usuario (o None), tras recuperar las huérfanas si este proceso aún no lo hizo."""
+        self.arrancar()
+        tarea_ = db.session.get(Tarea, tarea_id)
+        if tarea_ is None or tarea_.user_id != user_id:
+            return None
+        return tarea_
+
+    # --- EJECUCIÓN ---
+
+    def _ejecutar(self, app, tarea_id):
+        with app.app_context():
+            # Reclamamos la tarea: si otro proceso la ha recuperado entretanto, no se ejecuta dos veces
+            reclamada = db.session.execute(
+                update(Tarea).where(Tarea.id == tarea_id, Tarea.estado == "pendiente",
+                                    Tarea.propietario == self.propietario)
+                .values(estado="en_curso", intentos=Tarea.intentos + 1, actualizada=datetime.utcnow()),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            db.session.commit()
+            if not reclamada:
+                return
+
+            tipo, user_id, parametros = db.session.query(
+                Tarea.tipo, Tarea.user_id, Tarea.parametros).filter(Tarea.id == tarea_id).one()
+            try:
+                resultado = TIPOS[tipo](Avance(tarea_id), user_id, **json.loads(parametros))
+            except Exception as error:
+                db.session.rollback()
+                log.exception("La tarea %s (%s) ha fallado", tarea_id, tipo)
+                final = {"estado": "fallida", "error": str(error) or error.__class__.__name__}
+            else:
+                final = {"estado": "completada", "progreso": 1.0, "resultado": json.dumps(resultado)}
+            ahora = datetime.utcnow()
+            db.session.execute(
+                update(Tarea).where(Tarea.id == tarea_id).values(actualizada=ahora, terminada=ahora, **final),
+                execution_options={"synchronize_session": False},
+            )
+            db.session.commit()
+
+    # --- RECUPERACIÓN TRAS UNA CAÍDA ---
+
+    def arrancar(self):
+        """Recupera las tareas huérfanas una vez por proceso (la primera vez que se usa el pool)."""
+        if self._recuperado_pid != os.getpid():
+            self._recuperado_pid = os.getpid()
+            self.recuperar()
+
+    def _huerfana(self, tarea_, limite):
+        if tarea_.propietario is None:
+            return True
+        host, _, pid = tarea_.propietario.rpartition(":")
+        if host != socket.gethostname():
+            return tarea_.actualizada < limite
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            return False
+        return False
+
+    def recuperar(self):
+        """
+        Reclama las tareas activas cuyo proceso ya no existe: las relanza en este proceso o, si
+        han agotado sus intentos, las marca como fallidas. Devuelve los ids relanzados.
+        """
+        limite = datetime.utcnow() - timedelta(seconds=self.caducidad)
+        relanzadas = []
+        for tarea_ in Tarea.query.filter(Tarea.estado.in_(ACTIVAS)).all():
+            if tarea_.propietario == self.propietario or not self._huerfana(tarea_, limite):
+                continue
+            # Solo actúa quien la reclama primero: el propietario no ha cambiado desde que la leímos
+            condicion = (Tarea.id == tarea_.id, Tarea.estado.in_(ACTIVAS), Tarea.propietario == tarea_.propietario)
+            if tarea_.intentos >= self.max_intentos:
+                db.session.execute(
+                    update(Tarea).where(*condicion).values(
+                        estado="fallida", error="Interrumpida demasiadas veces", terminada=datetime.utcnow()),
+                    execution_options={"synchronize_session": False},
+                )
+                continue
+            # Sin plaza la dejamos sin dueño, para el siguiente proceso que recupere
+            plaza = self._reservar_plaza()
+            reclamada = db.session.execute(
+                update(Tarea).where(*condicion).values(
+                    estado="pendiente", propietario=self.propietario if plaza else None,
+                    actualizada=datetime.utcnow()),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            if plaza and reclamada:
+                relanzadas.append(tarea_.id)
+            elif plaza and self._plazas is not None:
+                self._plazas.release()
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        for tarea_id in relanzadas:
+            log.warning("Relanzando la tarea huérfana %s", tarea_id)
+            self._lanzar(app, tarea_id)
+        return relanzadas
+
+
+servicio = ServicioTareas()
+
+
+def configurar(app):
+    """Crea el servicio con la configuración de la aplicación (TAREAS_HILOS, TAREAS_COLA)."""
+    global servicio
+    servicio = ServicioTareas(
+        hilos=int(app.config.get("TAREAS_HILOS", 2)),
+        cola=int(app.config.get("TAREAS_COLA", 16)),
+    )
+    return servicio
+
+
+# --- TIPOS DE TAREA ---
+
+@tarea("cargar_basicos")
+def _cargar_basicos(avance, user_id):
+    resultado = importacion.importar_catalogo_base()
+    db.session.commit()
+    total = Food.query.filter(Food.user_id.is_(None)).count()
+    return dict(resultado, mensaje=f"Catálogo básico disponible: {total} alimentos compartidos.")
+
+
+@tarea("limpiar_catalogo")
+def _limpiar_catalogo(avance, user_id):
+    resultado = limpiar_catalogo_usuario(user_id)
+    db.session.commit()
+    return dict(resultado, mensaje=f"Limpieza: {resultado['borrables']} eliminados, "
+                                   f"{resultado['protegidos']} aún en uso.")
+
+
+@tarea("importar_alimentos")
+def _importar_alimentos(avance, user_id, ruta, formato):
+    """
+    Importa el fichero subido, confirmando lote a lote para publicar el avance y no bloquear
+    la base de datos durante toda la importación. Si el fichero falla a mitad, lo ya importado
+    se queda: al repetirlo corregido, esos nombres se omiten. El fichero se borra al terminar.
+    """
+    tamano = os.path.getsize(ruta) or 1
+    try:
+        with open(ruta, "rb") as binario:
+            texto = importacion.abrir_texto(binario)
+            if formato == "csv":
+                filas = importacion.leer_filas_csv(texto)
+            else:
+                filas = importacion.leer_filas_json(texto)
+            try:
+                resultado = importacion.importar_alimentos(
+                    user_id, filas, al_volcar=lambda _: avance(binario.tell() / tamano))
+            except (ValueError, UnicodeDecodeError) as error:
+                raise ValueError("El fichero no tiene un formato CSV o JSON válido.") from error
+        db.session.commit()
+    finally:
+        os.remove(ruta)
+    return dict(resultado, mensaje=f"Importación: {resultado['insertados']} añadidos, "
+                                   f"{resultado['omitidos']} ya existían, {resultado['invalidos']} filas no válidas.")
+
+
+@tarea("importar_cuenta")
+def _importar_cuenta(avance, user_id, ruta):
+    """
+    Vuelca una exportación completa de cuenta (NDJSON o zip) en una sola transacción: a
+    diferencia de la importación de alimentos no confirma por lotes (ni publica avance), porque
+    una cuenta a medias dejaría registros sin sus recetas. El fichero se borra al terminar.
+    """
+    try:
+        with open(ruta, "rb") as binario:
+            try:
+                resultado = importacion.importar_cuenta(user_id, importacion.leer_lineas_cuenta(binario))
+            except (ValueError, KeyError, TypeError, UnicodeDecodeError, zipfile.BadZipFile) as error:
+                raise ValueError("El fichero no es una exportación de cuenta válida.") from error
+        cache.marcar_datos_modificados(user_id)
+        db.session.commit()
+        cache.invalidar_usuario(user_id)
+    finally:
+        os.remove(ruta)
+    return dict(resultado, mensaje=f"Importación de la cuenta: {resultado['alimentos']} alimentos, "
+                                   f"{resultado['recetas']} recetas y {resultado['registros']} registros añadidos; "
+                                   f"{resultado['omitidos']} ya existían.")
@@ -0,0 +1,44 @@
+import pytest
+from app import configurar_servicios, create_app
+from models import db, User
+import cache
+
+flask_app = create_app({
+    "TESTING": True,
+    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+    # Las tareas en segundo plano se ejecutan dentro de la petición: las pruebas ven su resultado al momento
+    "TAREAS_HILOS": 0,
+})
+
+
+@pytest.fixture
+def app():
+    """Aplicación con una base de datos vacía para cada prueba."""
+    # Algunas pruebas crean su propia aplicación: los servicios del proceso vuelven a ser los de esta
+    configurar_servicios(flask_app)
+    # Los ids se repiten entre pruebas: la identidad cacheada de una no debe llegar a la siguiente
+    cache.usuarios.vaciar()
+    cache.paginas.vaciar()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def usuario(app):
+    u = User(username="ana", email="ana@test.com", password="sin-uso")
+    db.session.add(u)
+    db.session.commit()
+    return u
+
+
+@pytest.fixture
+def cliente(app, usuario):
+    """Cliente de pruebas con la sesión de Flask-Login ya iniciada (evitamos el coste del hash)."""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(usuario.id)
+        sess["_fresh"] = True
+    return client
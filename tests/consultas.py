@@ -0,0 +1,43 @@
+"""
+Utilidad de pruebas para contar las sentencias SQL que ejecuta cada petición.
+Permite fijar un presupuesto de consultas por ruta y detectar problemas N+1.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class ContadorConsultas:
+    """Acumula las sentencias SQL ejecutadas mientras está escuchando el engine."""
+
+    def __init__(self):
+        self.sentencias = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.sentencias.append(statement)
+
+    @property
+    def total(self):
+        return len(self.sentencias)
+
+
+@contextmanager
+def contar_consultas(engine):
+    contador = ContadorConsultas()
+    event.listen(engine, "before_cursor_execute", contador)
+    try:
+        yield contador
+    finally:
+        event.remove(engine, "before_cursor_execute", contador)
+
+
+def peticion_con_presupuesto(cliente, engine, url, presupuesto, metodo="get", **kwargs):
+    """Lanza la petición y falla si supera el número de consultas declarado para la ruta."""
+    # Contexto de aplicación propio: la petición usa una sesión limpia, sin objetos ya cargados por la prueba
+    with cliente.application.app_context(), contar_consultas(engine) as contador:
+        respuesta = getattr(cliente, metodo)(url, **kwargs)
+    assert contador.total <= presupuesto, (
+        f"{metodo.upper()} {url} ejecutó {contador.total} consultas (presupuesto: {presupuesto}):\n"
+        + "\n".join(contador.sentencias)
+    )
+    return respuesta
@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+import pytest
+
+import analitica
+from logic import obtener_estadisticas_ventanas
+from models import db, DailySummary
+from tests.consultas import contar_consultas, peticion_con_presupuesto
+
+HOY = date(2026, 3, 15)
+
+
+def _dia(usuario, dias_atras, kcal=2000, proteinas=150, carbohidratos=200, grasas=60, num_registros=1, hoy=HOY):
+    db.session.add(DailySummary(user_id=usuario.id, date=hoy - timedelta(days=dias_atras), kcal=kcal,
+                                proteinas=proteinas, carbohidratos=carbohidratos, grasas=grasas,
+                                num_registros=num_registros, target_kcal_snapshot=2000,
+                                target_protein_snapshot=150, target_carbs_snapshot=200, target_fat_snapshot=60))
+
+
+def test_rachas_por_macro(usuario):
+    # Calorías: 0-2 en objetivo, 3 fuera, 4 sin datos, 5-9 en objetivo y 20 suelto
+    for dias_atras in (0, 1, 2, 5, 6, 7, 8, 9, 20):
+        _dia(usuario, dias_atras, proteinas=150 if dias_atras < 2 else 0)
+    _dia(usuario, 3, kcal=3000)
+    # Un día vacío (se borraron sus registros) corta la racha aunque sus objetivos "cuadren"
+    _dia(usuario, 10, num_registros=0)
+    db.session.commit()
+
+    rachas = analitica.obtener_adherencia(usuario.id, hoy=HOY)["rachas"]
+    assert rachas["kcal"] == {"maxima": 5, "actual": 3}
+    assert rachas["carbohidratos"] == {"maxima": 5, "actual": 4}
+    assert rachas["todos"] == {"maxima": 2, "actual": 2}
+
+    # Sin datos de hoy la racha sigue viva con ayer, pero no con anteayer
+    assert analitica.obtener_adherencia(usuario.id, hoy=HOY + timedelta(days=1))["rachas"]["kcal"]["actual"] == 3
+    assert analitica.obtener_adherencia(usuario.id, hoy=HOY + timedelta(days=2))["rachas"]["kcal"]["actual"] == 0
+
+
+def test_ventanas_de_adherencia(usuario):
+    for dias_atras in range(0, 400, 2):
+        _dia(usuario, dias_atras, grasas=90 if dias_atras % 4 else 60)
+    db.session.commit()
+
+    ventanas = analitica.obtener_adherencia(usuario.id, hoy=HOY)["ventanas"]
+    assert ventanas[7]["dias_con_datos"] == 4
+    assert ventanas[7]["kcal"] == {"cumplidos": 4, "porcentaje": 100.0}
+    assert ventanas[7]["grasas"] == {"cumplidos": 2, "porcentaje": 50.0}
+    assert ventanas[365]["dias_con_datos"] == 183
+    assert ventanas[365]["todos"]["cumplidos"] == 92
+
+
+def test_ventana_de_7_dias_igual_que_las_estadisticas_del_indice(usuario):
+    # Hace 6 días entra en la ventana de 7; hace 7 días y mañana quedan fuera
+    hoy = date.today()
+    for dias_atras in (6, 7, -1):
+        _dia(usuario, dias_atras, hoy=hoy)
+    db.session.commit()
+
+    assert analitica.obtener_adherencia(usuario.id, ventanas=(7,), hoy=hoy)["ventanas"][7]["kcal"]["cumplidos"] == 1
+    assert obtener_estadisticas_ventanas(usuario.id, (7,))[7] == {"total_dias_con_datos": 1, "cumplidos": 1}
+
+
+def test_sin_datos(usuario):
+    datos = analitica.obtener_adherencia(usuario.id, ventanas=(7,), hoy=HOY)
+    assert datos["rachas"]["todos"] == {"maxima": 0, "actual": 0}
+    assert datos["ventanas"][7]["kcal"] == {"cumplidos": 0, "porcentaje": None}
+
+
+@pytest.mark.parametrize("dias", [7, 730])
+def test_una_sola_consulta_sea_cual_sea_el_historial(cliente, usuario, dias):
+    hoy = date.today()
+    for dias_atras in range(dias):
+        db.session.add(DailySummary(user_id=usuario.id, date=hoy - timedelta(days=dias_atras), kcal=2000,
+                                    proteinas=150, carbohidratos=200, grasas=60, num_registros=1))
+    db.session.commit()
+
+    user_id = usuario.id
+    with contar_consultas(db.engine) as contador:
+        analitica.obtener_adherencia(user_id)
+    assert contador.total == 1
+
+    # Carga del usuario + la consulta de analítica
+    respuesta = peticion_con_presupuesto(cliente, db.engine, "/api/adherencia", presupuesto=2)
+    datos = respuesta.get_json()
+    assert datos["rachas"]["todos"] == {"maxima": dias, "actual": dias}
+    assert datos["ventanas"]["365"]["dias_con_datos"] == min(dias, 365)
+    assert "Rachas y adherencia" in cliente.get("/adherencia").get_data(as_text=True)
@@ -0,0 +1,83 @@
+from datetime import date
+
+from models import db, Food, DailyLog
+from tests.consultas import peticion_con_presupuesto
+
+FECHA = date(2024, 5, 1)
+URL = f"/api/day/{FECHA.isoformat()}"
+
+
+def _arroz(usuario):
+    f = Food(name="Arroz", kcal_100g=350, prot_100g=7, carb_100g=80, fat_100g=1, user_id=usuario.id)
+    db.session.add(f)
+    db.session.commit()
+    return f
+
+
+def _registrar(cliente, alimento, gramos):
+    cliente.post("/add_log", data={"item_id": f"food_{alimento.id}", "grams": str(gramos),
+                                   "date": FECHA.isoformat()})
+
+
+def _etag(cliente):
+    return cliente.get(URL).headers["ETag"]
+
+
+def test_devuelve_el_dia_en_json(cliente, usuario):
+    arroz = _arroz(usuario)
+    _registrar(cliente, arroz, 200)
+
+    datos = cliente.get(URL).get_json()
+    assert datos["fecha"] == "2024-05-01"
+    assert datos["resumen"]["kcal"] == 700
+    assert datos["objetivos"]["kcal"] == 2000
+    assert datos["registros"] == [{"id": 1, "tipo": "food", "nombre": "Arroz", "gramos": 200,
+                                   "kcal": 700, "proteinas": 14, "carbohidratos": 160, "grasas": 2}]
+    assert cliente.get("/api/day/no-es-fecha").status_code == 400
+
+
+def test_sondeo_repetido_responde_304_sin_calcular(cliente, usuario):
+    arroz = _arroz(usuario)
+    _registrar(cliente, arroz, 100)
+    etag = _etag(cliente)
+
+    # Solo se lee la fila del resumen (el usuario sale de la caché de identidades)
+    respuesta = peticion_con_presupuesto(cliente, db.engine, URL, presupuesto=1,
+                                         headers={"If-None-Match": etag})
+    assert respuesta.status_code == 304
+    assert respuesta.headers["ETag"] == etag
+    assert respuesta.get_data() == b""
+
+
+def test_el_etag_cambia_con_registros_y_alimentos(cliente, usuario):
+    arroz = _arroz(usuario)
+    vacio = _etag(cliente)
+    assert _etag(cliente) == vacio
+
+    _registrar(cliente, arroz, 100)
+    con_registro = _etag(cliente)
+    assert con_registro != vacio
+
+    # Renombrar el alimento no cambia los totales, pero sí el contenido del día
+    cliente.post(f"/edit_food/{arroz.id}", data={"name": "Arroz blanco", "kcal": "350",
+                                                 "prot": "7", "carb": "80", "fat": "1"})
+    renombrado = _etag(cliente)
+    assert renombrado != con_registro
+
+    cliente.get(f"/delete_log/{DailyLog.query.one().id}")
+    assert _etag(cliente) not in (vacio, con_registro, renombrado)
+
+
+def test_borrar_la_receta_cambia_el_etag_y_deja_el_registro_sin_elemento(cliente, usuario):
+    arroz = _arroz(usuario)
+    cliente.post("/add_recipe", data={"name": "Mix", "food_ids[]": [arroz.id], "grams[]": ["100"]})
+    receta_id = db.session.execute(db.text("SELECT id FROM recipe")).scalar()
+    cliente.post("/add_log", data={"item_id": f"recipe_{receta_id}", "grams": "100", "date": FECHA.isoformat()})
+    etag = _etag(cliente)
+
+    cliente.get(f"/delete_recipe/{receta_id}")
+    respuesta = cliente.get(URL, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    registro = respuesta.get_json()["registros"][0]
+    assert (registro["tipo"], registro["nombre"], registro["kcal"]) == (None, "(elemento eliminado)", 0)
+    assert cliente.get(f"/day/{FECHA.isoformat()}").status_code == 200
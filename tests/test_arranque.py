@@ -0,0 +1,81 @@
+import gc
+import json
+import os
+import subprocess
+import sys
+import weakref
+
+from sqlalchemy import inspect, text
+
+import basedatos
+from app import create_app
+from models import db
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_crear_la_aplicacion_no_conecta_ni_crea_el_esquema(tmp_path):
+    ruta = tmp_path / "nutri.db"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{ruta}"})
+    assert app.test_client().get("/login").status_code == 200
+    # SQLite crea el fichero al abrir la primera conexión
+    assert not ruta.exists()
+
+    resultado = app.test_cli_runner().invoke(args=["migrar"])
+    assert resultado.exit_code == 0, resultado.output
+    with app.app_context():
+        assert {"user", "food", "daily_summary", "schema_version"} <= set(inspect(db.engine).get_table_names())
+        db.engine.dispose()
+
+
+def test_los_procesos_hijos_no_heredan_conexiones(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/nutri.db"})
+    with app.app_context():
+        engine = db.engine
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        assert engine.pool.checkedin() == 1
+
+        pid = os.fork()
+        if pid == 0:
+            # Hijo: el pool está vacío y la primera consulta abre una conexión propia
+            try:
+                heredadas = engine.pool.checkedin()
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                os._exit(0 if heredadas == 0 else 1)
+            except BaseException:
+                os._exit(2)
+        _, estado = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(estado) == 0
+        # El padre conserva su conexión
+        assert engine.pool.checkedin() == 1
+        engine.dispose()
+
+
+def test_el_registro_de_fork_no_retiene_engines_de_aplicaciones_descartadas(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/nutri.db"})
+    with app.app_context():
+        engine = weakref.ref(db.engine)
+    assert engine() in basedatos._engines_del_proceso
+    del app
+    gc.collect()
+    assert engine() is None
+
+
+def test_importar_la_aplicacion_no_carga_numpy():
+    # numpy solo lo necesita el cálculo por lotes (lotes.py), no los workers
+    salida = subprocess.run(
+        [sys.executable, "-c", "import sys, app; print('numpy' in sys.modules)"],
+        cwd=RAIZ, capture_output=True, text=True, timeout=60, check=True,
+    )
+    assert salida.stdout.strip() == "False"
+
+
+def test_benchmark_de_arranque():
+    salida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.arranque", "--procesos", "1", "--json"],
+        cwd=RAIZ, capture_output=True, text=True, timeout=120, check=True,
+    )
+    resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+    assert set(resultado) == {"importar_ms", "create_app_ms", "primera_respuesta_ms", "primera_consulta_ms", "total_ms"}
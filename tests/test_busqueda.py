@@ -0,0 +1,59 @@
+from models import db, Food, Recipe
+from busqueda import buscar, normalizar
+
+
+def _catalogo(usuario):
+    nombres = ["Pechuga de Pollo", "Plátano", "Pan Integral", "Atún al natural (lata)", "Arroz Blanco"]
+    db.session.add_all([Food(name=n, kcal_100g=100, prot_100g=1, carb_100g=1, fat_100g=1, user_id=usuario.id)
+                        for n in nombres])
+    db.session.add(Recipe(name="Batido de plátano", user_id=usuario.id))
+    db.session.commit()
+
+
+def test_normalizar_quita_tildes_y_mayusculas():
+    assert normalizar("  Atún   al NATURAL ") == "atun al natural"
+
+
+def test_buscar_prefijo_sin_tildes_y_aproximado(app, usuario):
+    _catalogo(usuario)
+    assert [r["nombre"] for r in buscar(usuario.id, "PLATANO")] == ["Plátano", "Batido de plátano"]
+    assert buscar(usuario.id, "atun")[0]["nombre"] == "Atún al natural (lata)"
+    # Coincidencia al inicio de la segunda palabra y con errata
+    assert buscar(usuario.id, "pollo")[0]["nombre"] == "Pechuga de Pollo"
+    assert buscar(usuario.id, "polo")[0]["nombre"] == "Pechuga de Pollo"
+    assert buscar(usuario.id, "platano", tipos=("recipe",)) == [
+        {"id": f"recipe_{Recipe.query.one().id}", "tipo": "recipe", "nombre": "Batido de plátano"}]
+
+
+def test_indice_se_actualiza_al_editar(cliente, usuario):
+    _catalogo(usuario)
+    arroz = Food.query.filter_by(name="Arroz Blanco").one()
+    cliente.post(f"/edit_food/{arroz.id}", data={"name": "Quinoa", "kcal": "1", "prot": "1", "carb": "1", "fat": "1"})
+    resp = cliente.get("/api/buscar?q=quin&tipo=food")
+    assert [r["id"] for r in resp.get_json()] == [f"food_{arroz.id}"]
+    assert cliente.get("/api/buscar?q=arroz").get_json() == []
+    assert cliente.get("/api/buscar?q=x&tipo=otro").status_code == 400
+
+
+def test_aproximada_puntua_un_numero_acotado_de_candidatos(app, usuario):
+    from sqlalchemy import event
+    import busqueda
+
+    user_id = usuario.id
+    # Muchos nombres comparten el trigrama "pol" con la consulta, pero solo uno se le parece
+    db.session.add_all([Food(name=f"Polenta {i:03}", kcal_100g=1, prot_100g=1, carb_100g=1, fat_100g=1,
+                             user_id=user_id) for i in range(300)])
+    db.session.add(Food(name="Pechuga de Pollo", kcal_100g=1, prot_100g=1, carb_100g=1, fat_100g=1,
+                        user_id=user_id))
+    db.session.commit()
+    db.session.expunge_all()
+
+    cargados = []
+    escuchar = lambda objetivo, _: cargados.append(objetivo)
+    event.listen(Food, "load", escuchar)
+    try:
+        resultado = buscar(user_id, "polo", limite=2, tipos=("food",))
+    finally:
+        event.remove(Food, "load", escuchar)
+    assert resultado[0]["nombre"] == "Pechuga de Pollo"
+    assert len(cargados) <= 2 * busqueda.CANDIDATOS_POR_RESULTADO
@@ -0,0 +1,109 @@
+import pytest
+
+from models import db, User
+from cache import CacheLRU, IdentidadUsuario, usuarios
+from tests.consultas import peticion_con_presupuesto
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def test_cache_lru_caduca_y_descarta_la_entrada_menos_usada():
+    reloj = Reloj()
+    c = CacheLRU(max_entradas=2, ttl=10, reloj=reloj)
+    c.guardar("a", 1)
+    c.guardar("b", 2)
+    assert c.obtener("a") == 1
+    c.guardar("c", 3)  # 'b' es la menos usada
+    assert c.obtener("b") is None
+    reloj.ahora = 11
+    assert c.obtener("a") is None
+    assert c.estadisticas() == {"aciertos": 1, "fallos": 2, "tasa_aciertos": 1 / 3,
+                                 "entradas": 1, "bytes": 0}
+
+
+def test_peticiones_autenticadas_no_consultan_el_usuario(cliente, usuario):
+    # La primera petición carga la identidad; las siguientes la sirven desde la caché
+    cliente.get("/")
+    respuesta = peticion_con_presupuesto(cliente, db.engine, "/", presupuesto=0)
+    assert respuesta.status_code == 302
+    assert usuarios.estadisticas()["aciertos"] >= 1
+
+
+def test_perfil_invalida_las_metas_cacheadas(app, cliente, usuario):
+    cliente.get("/perfil")
+    assert usuarios.obtener(usuario.id).target_kcal == 2000
+
+    cliente.post("/perfil", data={"kcal": "2500", "proteinas": "160", "carbohidratos": "250", "grasas": "70"})
+
+    assert db.session.get(User, usuario.id).target_kcal == 2500
+    # Contexto propio, como una petición real: Flask-Login guarda el usuario cargado en 'g'
+    with app.app_context():
+        assert 'value="2500"' in cliente.get("/perfil").get_data(as_text=True)
+
+
+def test_la_identidad_es_de_solo_lectura(usuario):
+    identidad = IdentidadUsuario(usuario)
+    assert identidad.get_id() == str(usuario.id)
+    with pytest.raises(AttributeError):
+        identidad.target_kcal = 1
+
+
+def test_cache_lru_acotada_en_bytes():
+    c = CacheLRU(max_entradas=100, ttl=10, max_bytes=10)
+    c.guardar("a", b"12345")
+    c.guardar("b", b"12345")
+    c.guardar("c", b"123")  # Supera los 10 bytes: sale 'a'
+    assert c.obtener("a") is None and c.obtener("b") == b"12345"
+    c.guardar("enorme", b"x" * 11)  # Nunca cabe: no se guarda ni desaloja nada
+    assert c.estadisticas()["bytes"] == 8
+
+
+def test_pagina_del_dia_cacheada_e_invalidada_al_escribir(app, cliente, usuario):
+    from datetime import date
+    from models import Food
+    import cache
+
+    arroz = Food(name="Arroz", kcal_100g=350, prot_100g=7, carb_100g=80, fat_100g=1, user_id=usuario.id)
+    db.session.add(arroz)
+    db.session.commit()
+    url = f"/day/{date.today().isoformat()}"
+
+    def visitar():
+        # Contexto propio por petición, como en producción
+        with app.app_context():
+            return cliente.get(url).get_data(as_text=True)
+
+    primera = visitar()
+    assert visitar() == primera
+    assert cache.paginas.estadisticas()["aciertos"] == 1
+
+    cliente.post("/add_log", data={"item_id": f"food_{arroz.id}", "grams": "100",
+                                   "date": date.today().isoformat()})
+    # La redirección muestra el mensaje flash: esa página no se cachea
+    con_aviso = visitar()
+    assert "Consumo registrado" in con_aviso
+    sin_aviso = visitar()
+    assert "Consumo registrado" not in sin_aviso and "Arroz" in sin_aviso
+    assert visitar() == sin_aviso
+
+
+def test_pagina_del_dia_usa_las_metas_de_la_base_de_datos(app, cliente, usuario):
+    from datetime import date
+
+    url = f"/day/{date.today().isoformat()}"
+    with app.app_context():
+        assert "/ 2000" in cliente.get(url).get_data(as_text=True)
+
+    # Otro worker cambia las metas: la identidad cacheada de este sigue con las antiguas
+    db.session.execute(db.text("UPDATE user SET target_kcal = 2500, version_datos = version_datos + 1"))
+    db.session.commit()
+    assert usuarios.obtener(usuario.id).target_kcal == 2000
+    with app.app_context():
+        html = cliente.get(url).get_data(as_text=True)
+    assert "/ 2500" in html and "/ 2000" not in html
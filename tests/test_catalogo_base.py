@@ -0,0 +1,93 @@
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from models import db, User, Food, Recipe, RecipeIngredient, DailyLog
+from importacion import importar_catalogo_base
+from logic import aplicar_log_a_resumen, recalcular_totales_receta
+from migraciones import aplicar_migraciones
+import busqueda
+from tests.test_migraciones import _bd_antigua
+
+
+def _base(nombre):
+    return Food.query.filter_by(user_id=None, name=nombre).one()
+
+
+def test_cargar_basicos_no_copia_el_catalogo_al_usuario(cliente, usuario):
+    cliente.get("/cargar_basicos")
+    otro = User(username="luis", email="luis@test.com", password="sin-uso")
+    db.session.add(otro)
+    db.session.commit()
+
+    assert Food.query.filter_by(user_id=usuario.id).count() == 0
+    num_base = Food.query.filter(Food.user_id.is_(None)).count()
+    assert num_base > 0
+    # Ambos usuarios ven el mismo catálogo sin que exista una copia por usuario
+    assert Food.visibles(usuario.id).count() == Food.visibles(otro.id).count() == num_base
+    assert "Merluza" in cliente.get("/mis_alimentos?q=merluza").get_data(as_text=True)
+    assert [r["nombre"] for r in busqueda.buscar(usuario.id, "merluz", tipos=("food",))] == ["Merluza"]
+
+
+def test_editar_un_alimento_base_crea_una_copia_personal(cliente, usuario):
+    importar_catalogo_base()
+    otro = User(username="luis", email="luis@test.com", password="sin-uso")
+    db.session.add(otro)
+    db.session.commit()
+    merluza = _base("Merluza")
+    receta = Recipe(name="Merluza al horno", user_id=usuario.id)
+    receta.ingredients = [RecipeIngredient(food=merluza, grams=200)]
+    recalcular_totales_receta(receta)
+    db.session.add(receta)
+    log = DailyLog(user_id=usuario.id, date=date(2024, 5, 1), food_id=merluza.id, grams=100)
+    db.session.add(log)
+    db.session.flush()
+    aplicar_log_a_resumen(log)
+    db.session.commit()
+    merluza_id, receta_id, log_id = merluza.id, receta.id, log.id
+
+    cliente.post(f"/edit_food/{merluza_id}", data={"name": "Merluza", "kcal": "100",
+                                                   "prot": "16", "carb": "0", "fat": "2"})
+
+    db.session.expire_all()
+    copia = Food.query.filter_by(user_id=usuario.id, base_id=merluza_id).one()
+    assert copia.kcal_100g == 100
+    # El original no cambia y el usuario deja de verlo: en su lugar ve su copia
+    assert db.session.get(Food, merluza_id).kcal_100g == 89
+    visibles = {f.id for f in Food.visibles(usuario.id)}
+    assert copia.id in visibles and merluza_id not in visibles
+    assert merluza_id in {f.id for f in Food.visibles(otro.id)}
+    # Sus recetas y registros pasan a la copia, con los totales recalculados
+    assert db.session.get(RecipeIngredient, receta.ingredients[0].id).food_id == copia.id
+    assert db.session.get(Recipe, receta_id).kcal_g == 1.0
+    assert db.session.get(DailyLog, log_id).food_id == copia.id
+    assert cliente.get("/day/2024-05-01").status_code == 200
+
+
+def test_los_alimentos_base_no_se_borran(cliente, usuario):
+    importar_catalogo_base()
+    db.session.commit()
+    merluza_id = _base("Merluza").id
+    cliente.get(f"/delete_food/{merluza_id}")
+    assert db.session.get(Food, merluza_id) is not None
+
+
+def test_migracion_sustituye_las_copias_por_el_catalogo_base(tmp_path):
+    engine = _bd_antigua(tmp_path)
+    with engine.begin() as conn:
+        # Copias que hacía 'Cargar básicos': una intacta y en uso, otra modificada por el usuario
+        conn.execute(text("INSERT INTO food VALUES (3, 'Merluza', 89, 16, 0, 2, 1)"))
+        conn.execute(text("INSERT INTO food VALUES (4, 'Salmón', 1, 1, 1, 1, 1)"))
+        conn.execute(text("INSERT INTO daily_log VALUES (3, 1, '2024-05-02', 3, NULL, 100, 2000, 150, 200, 60)"))
+
+    aplicar_migraciones(engine)
+
+    assert next(c for c in inspect(engine).get_columns("food") if c["name"] == "user_id")["nullable"]
+    with engine.connect() as conn:
+        base_merluza = conn.execute(text("SELECT id FROM food WHERE user_id IS NULL AND name = 'Merluza'")).scalar()
+        assert conn.execute(text("SELECT COUNT(*) FROM food WHERE id = 3")).scalar() == 0
+        assert conn.execute(text("SELECT food_id FROM daily_log WHERE id = 3")).scalar() == base_merluza
+        base_salmon = conn.execute(text("SELECT id FROM food WHERE user_id IS NULL AND name = 'Salmón'")).scalar()
+        assert conn.execute(text("SELECT base_id FROM food WHERE id = 4")).scalar() == base_salmon
+        # Las claves foráneas siguen activas y consistentes tras reconstruir la tabla
+        assert conn.exec_driver_sql("PRAGMA foreign_key_check").first() is None
@@ -0,0 +1,54 @@
+from models import db, Food, Recipe, RecipeIngredient
+from logic import TAMANO_PAGINA, recalcular_totales_receta
+from tests.consultas import peticion_con_presupuesto
+
+
+def _sembrar(usuario, n_alimentos, n_recetas):
+    alimentos = [Food(name=f"Alimento {i:05d}", kcal_100g=100, prot_100g=1, carb_100g=1, fat_100g=1,
+                      user_id=usuario.id) for i in range(n_alimentos)]
+    db.session.add_all(alimentos)
+    db.session.flush()
+    for i in range(n_recetas):
+        receta = Recipe(name=f"Receta {i:04d}", user_id=usuario.id)
+        receta.ingredients = [RecipeIngredient(food=alimentos[j], grams=100) for j in range(3)]
+        recalcular_totales_receta(receta)
+        db.session.add(receta)
+    db.session.commit()
+
+
+def _cursor_siguiente(html, parametro):
+    inicio = html.index(f"{parametro}=") + len(parametro) + 1
+    return html[inicio:html.index('"', inicio)].split("&")[0]
+
+
+def test_paginas_de_tamano_constante_recorren_todo_el_catalogo(cliente, usuario):
+    _sembrar(usuario, n_alimentos=2 * TAMANO_PAGINA + 7, n_recetas=3)
+    vistos, url = [], "/mis_alimentos"
+    while True:
+        html = peticion_con_presupuesto(cliente, db.engine, url, presupuesto=4).get_data(as_text=True)
+        pagina = [l.split(">")[1].split("<")[0] for l in html.splitlines() if 'food-name' in l]
+        assert len(pagina) <= TAMANO_PAGINA
+        vistos += pagina
+        if "alimentos_tras=" not in html.split("Siguientes")[0].rsplit("<a", 1)[-1]:
+            break
+        url = f"/mis_alimentos?alimentos_tras={_cursor_siguiente(html, 'alimentos_tras')}"
+
+    assert vistos == [f"Alimento {i:05d}" for i in range(2 * TAMANO_PAGINA + 7)]
+
+
+def test_detalle_de_receta_bajo_demanda(cliente, usuario):
+    _sembrar(usuario, n_alimentos=3, n_recetas=1)
+    receta = Recipe.query.one()
+    html = cliente.get("/mis_alimentos?pestana=recetas").get_data(as_text=True)
+    assert "3 ing." in html
+    assert "VALORES TOTALES" not in html
+
+    detalle = cliente.get(f"/receta/{receta.id}/ingredientes").get_data(as_text=True)
+    assert "Alimento 00000" in detalle
+    assert "VALORES TOTALES" in detalle
+
+
+def test_busqueda_filtra_en_servidor(cliente, usuario):
+    _sembrar(usuario, n_alimentos=30, n_recetas=0)
+    html = cliente.get("/mis_alimentos?q=ALIMENTO 0002").get_data(as_text=True)
+    assert html.count("food-name") == 10
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from models import db, User
+import contrasenas
+from contrasenas import HashSaturado, ServicioHash
+
+METODO_RAPIDO = "pbkdf2:sha256:1000"
+PASSWORD = "Segura.123"
+
+
+@pytest.fixture
+def hash_rapido(app):
+    """Coste mínimo en las pruebas; se restaura la configuración al terminar."""
+    anterior = contrasenas.servicio
+    app.config["HASH_METODO"] = METODO_RAPIDO
+    yield contrasenas.configurar(app)
+    app.config.pop("HASH_METODO")
+    contrasenas.servicio = anterior
+
+
+def test_registro_y_login_usan_el_metodo_configurado(app, hash_rapido):
+    cliente = app.test_client()
+    cliente.post("/registro", data={"username": "ana", "email": "ana@test.com", "password": PASSWORD,
+                                    "confirm_password": PASSWORD, "politica_privacidad": "on"})
+    usuario = User.query.filter_by(username="ana").one()
+    assert usuario.password.startswith(METODO_RAPIDO + "$")
+
+    respuesta = cliente.post("/login", data={"username": "ana", "password": PASSWORD})
+    assert respuesta.status_code == 302
+
+
+def test_login_regenera_hashes_con_parametros_antiguos(app, hash_rapido):
+    antiguo = ServicioHash(metodo="pbkdf2:sha256:2000", hilos=0).generar(PASSWORD)
+    db.session.add(User(username="ana", email="ana@test.com", password=antiguo))
+    db.session.commit()
+
+    app.test_client().post("/login", data={"username": "ana", "password": PASSWORD})
+
+    db.session.expire_all()
+    nuevo = User.query.filter_by(username="ana").one().password
+    assert nuevo != antiguo and not hash_rapido.necesita_rehash(nuevo)
+    assert hash_rapido.verificar(nuevo, PASSWORD)
+
+
+def test_pool_saturado_rechaza_sin_esperar():
+    servicio = ServicioHash(hilos=1, cola=0)
+    liberar, ocupado = threading.Event(), threading.Event()
+
+    def lento():
+        ocupado.set()
+        liberar.wait(5)
+
+    hilo = threading.Thread(target=servicio.ejecutar, args=(lento,))
+    hilo.start()
+    ocupado.wait(5)
+    with pytest.raises(HashSaturado):
+        servicio.ejecutar(lambda: None)
+    liberar.set()
+    hilo.join()
+    # Al terminar el trabajo la plaza queda libre de nuevo
+    assert servicio.ejecutar(lambda: 42) == 42
+    assert servicio.rechazados == 1
+
+
+def test_login_saturado_devuelve_503(app, usuario):
+    anterior = contrasenas.servicio
+    contrasenas.servicio = ServicioHash(hilos=1, cola=0)
+    contrasenas.servicio._plazas.acquire()
+    try:
+        respuesta = app.test_client().post("/login", data={"username": "ana", "password": PASSWORD})
+    finally:
+        contrasenas.servicio = anterior
+    assert respuesta.status_code == 503
+    assert respuesta.headers["Retry-After"] == "2"
+
+
+@pytest.mark.parametrize("metodo", ["pbkdf2:sha256", "scrypt"])
+def test_metodo_abreviado_no_pide_rehash(metodo):
+    # werkzeug guarda el método con todos sus parámetros ("scrypt:32768:8:1")
+    servicio = ServicioHash(metodo=metodo, hilos=0)
+    assert not servicio.necesita_rehash(servicio.generar(PASSWORD))
+
+
+def test_login_con_trabajo_bloqueado_devuelve_503(app, usuario):
+    anterior = contrasenas.servicio
+    contrasenas.servicio = ServicioHash(hilos=1, cola=1, espera_maxima=0.1)
+    liberar = threading.Event()
+    contrasenas.servicio._ejecutor().submit(liberar.wait, 5)
+    try:
+        # Hay plaza en la cola, pero el único hilo no termina a tiempo
+        respuesta = app.test_client().post("/login", data={"username": "ana", "password": PASSWORD})
+    finally:
+        liberar.set()
+        contrasenas.servicio = anterior
+    assert respuesta.status_code == 503
+    assert respuesta.headers["Retry-After"] == "2"
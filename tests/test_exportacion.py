@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import date, timedelta
+
+import exportacion
+from logic import recalcular_totales_receta
+from models import db, DailyLog, DailySummary, Food, Recipe, RecipeIngredient, Tarea, User
+
+HOY = date.today()
+
+
+def _preparar(cliente, usuario):
+    arroz = Food(name="Arroz", kcal_100g=350, prot_100g=7, carb_100g=80, fat_100g=1, user_id=usuario.id)
+    db.session.add(arroz)
+    db.session.commit()
+    for dias_atras, gramos in ((0, 100), (0, 50), (2, 200), (40, 10)):
+        cliente.post("/add_log", data={"item_id": f"food_{arroz.id}", "grams": str(gramos),
+                                       "date": (HOY - timedelta(days=dias_atras)).isoformat()})
+
+
+def test_exportar_totales_csv_en_streaming(cliente, usuario):
+    _preparar(cliente, usuario)
+    desde = (HOY - timedelta(days=7)).isoformat()
+    resp = cliente.get(f"/exportar?formato=csv&desde={desde}")
+
+    assert resp.is_streamed
+    assert resp.mimetype == "text/csv"
+    filas = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [f["fecha"] for f in filas] == [(HOY - timedelta(days=2)).isoformat(), HOY.isoformat()]
+    assert float(filas[1]["kcal"]) == 525
+
+
+def test_exportar_detalle_ndjson(cliente, usuario):
+    _preparar(cliente, usuario)
+    resp = cliente.get("/exportar?formato=ndjson&detalle=1")
+
+    lineas = [json.loads(l) for l in resp.get_data(as_text=True).splitlines()]
+    assert [l["tipo"] for l in lineas] == ["dia", "registro", "dia", "registro", "dia", "registro", "registro"]
+    assert lineas[-1]["nombre"] == "Arroz"
+    assert lineas[-1]["kcal"] == 175
+    assert lineas[-3]["kcal"] == 525
+
+
+def test_exportar_valida_parametros(cliente):
+    assert cliente.get("/exportar?formato=xml").status_code == 400
+    assert cliente.get("/exportar?desde=ayer").status_code == 400
+
+
+# --- CUENTA COMPLETA ---
+
+def _preparar_cuenta(cliente, usuario):
+    leche = Food(name="Leche", kcal_100g=60, prot_100g=3, carb_100g=5, fat_100g=3)
+    avena = Food(name="Avena", kcal_100g=380, prot_100g=13, carb_100g=60, fat_100g=7)
+    arroz = Food(name="Arroz", kcal_100g=350, prot_100g=7, carb_100g=80, fat_100g=1, user_id=usuario.id)
+    db.session.add_all([leche, avena, arroz])
+    db.session.flush()
+    # Copia personal de un alimento base: se exporta con el nombre de su original
+    db.session.add(Food(name="Mi avena", kcal_100g=370, prot_100g=13, carb_100g=60, fat_100g=6,
+                        user_id=usuario.id, base_id=avena.id))
+    receta = Recipe(name="Arroz con leche", user_id=usuario.id)
+    receta.ingredients = [RecipeIngredient(food=arroz, grams=100), RecipeIngredient(food=leche, grams=500)]
+    recalcular_totales_receta(receta)
+    db.session.add(receta)
+    usuario.target_kcal = 1800
+    db.session.commit()
+    for dias_atras, item, gramos in ((0, f"food_{arroz.id}", 100), (0, f"recipe_{receta.id}", 200),
+                                     (3, f"food_{leche.id}", 250)):
+        cliente.post("/add_log", data={"item_id": item, "grams": str(gramos),
+                                       "date": (HOY - timedelta(days=dias_atras)).isoformat()})
+
+
+def _importar(app, datos, nombre):
+    """Importa la exportación en una cuenta nueva y devuelve su id."""
+    otro = User(username="luis", email="luis@test.com", password="sin-uso")
+    db.session.add(otro)
+    db.session.commit()
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["_user_id"] = str(otro.id)
+    with app.app_context():
+        for _ in range(2):
+            cliente.post("/importar_cuenta", data={"archivo": (io.BytesIO(datos), nombre)},
+                         content_type="multipart/form-data")
+    return otro.id
+
+
+def _contenido(user_id):
+    db.session.expire_all()
+    usuario = db.session.get(User, user_id)
+    nombres = dict(db.session.query(Food.id, Food.name))
+    alimentos = {f.name: (f.kcal_100g, nombres.get(f.base_id)) for f in Food.query.filter_by(user_id=user_id)}
+    recetas = {r.name: (r.total_grams, r.kcal_g, sorted((i.food.name, i.grams) for i in r.ingredients))
+               for r in Recipe.query.filter_by(user_id=user_id)}
+    registros = sorted((l.date, l.food.name if l.food else l.recipe.name, l.grams, l.target_kcal_snapshot)
+                       for l in DailyLog.query.filter_by(user_id=user_id))
+    resumenes = {s.date: round(s.kcal, 2) for s in DailySummary.query.filter_by(user_id=user_id)}
+    return usuario.target_kcal, alimentos, recetas, registros, resumenes
+
+
+def test_exportar_cuenta_ndjson_e_importarla_en_otra(app, cliente, usuario):
+    _preparar_cuenta(cliente, usuario)
+    resp = cliente.get("/exportar_cuenta?formato=ndjson")
+    assert resp.is_streamed and resp.mimetype == "application/x-ndjson"
+    datos = resp.get_data()
+    tipos = [json.loads(l)["tipo"] for l in datos.decode().splitlines()]
+    assert tipos == ["cuenta", "alimento", "alimento", "alimento", "receta",
+                     "ingrediente", "ingrediente", "registro", "registro", "registro"]
+
+    # Se importa dos veces: la segunda no duplica nada
+    otro_id = _importar(app, datos, "cuenta.ndjson")
+    assert _contenido(otro_id) == _contenido(usuario.id)
+    assert Tarea.query.filter_by(user_id=otro_id, estado="completada").count() == 2
+    # Los alimentos del catálogo base se reutilizan, no se copian
+    assert Food.query.filter_by(name="Leche").count() == 1
+
+
+def test_exportar_cuenta_zip_e_importarla(app, cliente, usuario):
+    _preparar_cuenta(cliente, usuario)
+    resp = cliente.get("/exportar_cuenta?formato=zip")
+    assert resp.is_streamed and resp.mimetype == "application/zip"
+    datos = resp.get_data()
+    with zipfile.ZipFile(io.BytesIO(datos)) as zip_:
+        assert zip_.namelist() == [f"{entidad}.ndjson" for entidad in exportacion.ENTIDADES]
+
+    # En una instalación sin ese alimento base, se crea como alimento propio
+    DailyLog.query.filter(DailyLog.food_id.isnot(None)).delete()
+    RecipeIngredient.query.delete()
+    Food.query.filter_by(name="Leche").delete()
+    db.session.commit()
+    otro_id = _importar(app, datos, "cuenta.zip")
+    _, alimentos, recetas, registros, _ = _contenido(otro_id)
+    assert alimentos["Leche"] == (60, None)
+    assert recetas["Arroz con leche"][2] == [("Arroz", 100), ("Leche", 500)]
+    assert [r[1] for r in registros] == ["Leche", "Arroz", "Arroz con leche"]
+
+
+def test_importar_cuenta_rechaza_otros_ficheros(cliente, app):
+    with app.app_context():
+        cliente.post("/importar_cuenta", data={"archivo": (io.BytesIO(b'{"tipo": "alimento"}\n'), "x.ndjson")},
+                     content_type="multipart/form-data")
+    tarea = Tarea.query.one()
+    assert tarea.estado == "fallida"
+    assert tarea.error == "El fichero no es una exportación de cuenta válida."
+    assert cliente.get("/exportar_cuenta?formato=xml").status_code == 400
+
+
+def test_exportar_cuenta_nombre_de_fichero_entrecomillado(cliente, usuario):
+    usuario.username = "Ana María; x"
+    db.session.commit()
+    resp = cliente.get("/exportar_cuenta")
+    resp.close()
+    disposicion = resp.headers["Content-Disposition"]
+    assert disposicion.startswith('attachment; filename="cuenta_Ana Maria; x_')
+    # El nombre completo va codificado según RFC 5987
+    assert f"filename*=UTF-8''cuenta_Ana%20Mar%C3%ADa%3B%20x_{HOY.isoformat()}.ndjson" in disposicion
@@ -0,0 +1,26 @@
+from datetime import date
+
+from models import db, Recipe, DailyLog, DailySummary
+from benchmarks.generador import generar
+
+
+def _huella():
+    return [(l.user_id, l.date, l.food_id, l.recipe_id, l.grams) for l in DailyLog.query.order_by(DailyLog.id)]
+
+
+def test_generador_reproducible_y_coherente(app):
+    hasta = date(2024, 5, 31)
+    ids = generar(usuarios=2, dias=5, recetas=3, alimentos=4, semilla=7, hasta=hasta)
+    primera = _huella()
+
+    assert len(ids) == 2
+    assert 2 * 5 * 3 <= len(primera) <= 2 * 5 * 7
+    assert all(r.total_grams > 0 for r in Recipe.query)
+    # Un resumen por usuario y día, coherente con sus registros
+    assert DailySummary.query.count() == 10
+    assert sum(s.num_registros for s in DailySummary.query) == len(primera)
+
+    db.drop_all()
+    db.create_all()
+    generar(usuarios=2, dias=5, recetas=3, alimentos=4, semilla=7, hasta=hasta)
+    assert _huella() == primera
@@ -0,0 +1,47 @@
+import io
+import json
+
+from models import db, Food
+from importacion import leer_filas_json, importar_alimentos
+from tests.consultas import peticion_con_presupuesto
+
+
+def test_leer_json_por_bloques_pequenos():
+    datos = [{"name": f"Alimento {i}", "kcal": i, "prot": 1, "carb": 2, "fat": 3} for i in range(50)]
+    # Bloques de 7 caracteres: ningún objeto cabe entero en un bloque
+    filas = list(leer_filas_json(io.StringIO(json.dumps(datos)), tamano_bloque=7))
+    assert filas == datos
+    ndjson = "\n".join(json.dumps(d) for d in datos)
+    assert list(leer_filas_json(io.StringIO(ndjson), tamano_bloque=7)) == datos
+
+
+def test_importar_csv_masivo_con_pocas_consultas(cliente, usuario):
+    db.session.add(Food(name="Alimento 3", kcal_100g=1, prot_100g=1, carb_100g=1, fat_100g=1, user_id=usuario.id))
+    db.session.commit()
+    lineas = ["name,kcal,prot,carb,fat"]
+    lineas += [f"Alimento {i},{100 + i},10,20,5" for i in range(10000)]
+    lineas += ["Alimento 7,1,1,1,1", "Sin valores,,,,"]
+    fichero = io.BytesIO("\n".join(lineas).encode("utf-8"))
+
+    # Usuario + nombres existentes + 10 lotes de 1000 filas (cada uno con la actualización de su
+    # progreso) + las 6 consultas de gestión de la tarea (ver test_limpieza)
+    peticion_con_presupuesto(cliente, db.engine, "/importar_alimentos", presupuesto=28, metodo="post",
+                             data={"archivo": (fichero, "alimentos.csv")}, content_type="multipart/form-data")
+
+    assert Food.query.filter_by(user_id=usuario.id).count() == 10000
+    assert Food.query.filter_by(name="Alimento 42").one().kcal_100g == 142
+
+
+def test_cargar_basicos_no_duplica(cliente, usuario):
+    cliente.get("/cargar_basicos")
+    total = Food.query.count()
+    assert total > 0
+    cliente.get("/cargar_basicos")
+    assert Food.query.count() == total
+
+
+def test_importar_alimentos_omitidos_e_invalidos(app, usuario):
+    filas = [{"name": "Pan", "kcal": "250", "prot": "8", "carb": "50", "fat": "2"},
+             {"name": "Pan", "kcal": "260", "prot": "8", "carb": "50", "fat": "2"},
+             {"nombre": "Leche", "kcal": "x"}]
+    assert importar_alimentos(usuario.id, filas) == {"insertados": 1, "omitidos": 1, "invalidos": 1}
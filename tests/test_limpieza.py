@@ -0,0 +1,31 @@
+from datetime import date
+
+from models import db, Food, Recipe, RecipeIngredient, DailyLog
+from tests.consultas import peticion_con_presupuesto
+
+
+def _catalogo(usuario):
+    alimentos = [Food(name=f"A{i}", kcal_100g=100, prot_100g=1, carb_100g=1, fat_100g=1, user_id=usuario.id)
+                 for i in range(5)]
+    db.session.add_all(alimentos)
+    db.session.flush()
+    receta = Recipe(name="R", user_id=usuario.id)
+    receta.ingredients = [RecipeIngredient(food_id=alimentos[0].id, grams=100)]
+    db.session.add(receta)
+    db.session.add(DailyLog(user_id=usuario.id, date=date.today(), food_id=alimentos[1].id, grams=50))
+    db.session.commit()
+
+
+def test_simulacion_no_borra_nada(cliente, usuario):
+    _catalogo(usuario)
+    resp = cliente.get("/limpiar_catalogo?simular=1", follow_redirects=True)
+    assert "se eliminarían 3 alimentos, 2 están en uso" in resp.get_data(as_text=True)
+    assert Food.query.count() == 5
+
+
+def test_limpieza_en_una_sentencia(cliente, usuario):
+    _catalogo(usuario)
+    # Usuario + recuento + DELETE, más la gestión de la tarea: recuperar huérfanas (la primera vez en
+    # el proceso), buscar una igual en marcha, crearla, reclamarla, leer sus datos y guardar el resultado
+    peticion_con_presupuesto(cliente, db.engine, "/limpiar_catalogo", presupuesto=9)
+    assert sorted(f.name for f in Food.query.all()) == ["A0", "A1"]
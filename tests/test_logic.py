@@ -1,5 +1,13 @@
+from datetime import date
+
 import pytest
-from logic import calcular_macros_alimento, calcular_macros_receta, obtener_resumen_diario
+from logic import (
+    calcular_macros_alimento,
+    calcular_macros_receta,
+    obtener_resumen_diario,
+    recalcular_totales_receta,
+)
+from lotes import MatrizNutricional, calcular_macros_lote, macros_a_dict
 
 # Mock Classes para simular los modelos de la base de datos
 class MockFood:
@@ -54,4 +62,49 @@ def test_calcular_macros_receta_escalado():
 def test_obtener_resumen_diario_vacio():
     """Verifica que si no hay logs, el resumen sea cero redondeado."""
     res = obtener_resumen_diario([])
-    assert res == {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
\ No newline at end of file
+    assert res == {"kcal": 0, "proteinas": 0, "carbohidratos": 0, "grasas": 0}
+
+def test_totales_materializados_coinciden_con_ingredientes():
+    """Los totales por gramo materializados deben dar lo mismo que recorrer los ingredientes."""
+    ing1 = MockIngredient(MockFood("Ing1", 100, 10, 0, 0), 100)
+    ing2 = MockIngredient(MockFood("Ing2", 200, 0, 10, 5), 300)
+    esperado = calcular_macros_receta(150, MockRecipe("Mix", [ing1, ing2]))
+
+    receta = recalcular_totales_receta(MockRecipe("Mix", [ing1, ing2]))
+    assert receta.total_grams == 400
+    # Vaciamos los ingredientes para asegurar que se usa el camino O(1)
+    receta.ingredients = []
+    res = calcular_macros_receta(150, receta)
+    for clave in esperado:
+        assert res[clave] == pytest.approx(esperado[clave])
+
+def test_lote_vectorizado_coincide_con_calculo_escalar():
+    """El cálculo por lotes debe dar, registro a registro y día a día, lo mismo que las funciones escalares."""
+    pollo = MockFood("Pollo", 165, 31, 0, 3.6)
+    arroz = MockFood("Arroz", 350, 7, 80, 1)
+    receta = MockRecipe("Mix", [MockIngredient(pollo, 150), MockIngredient(arroz, 80)])
+    vacia = MockRecipe("Vacía", [])
+    matriz = MatrizNutricional([pollo, arroz], [receta, vacia])
+
+    logs = [MockLog(150, food=pollo), MockLog(60, food=arroz), MockLog(230, recipe=receta),
+            MockLog(100, recipe=vacia), MockLog(80, recipe=receta)]
+    dias = [date(2024, 5, 2), date(2024, 5, 1), date(2024, 5, 1), date(2024, 5, 2), date(2024, 5, 2)]
+    idx_alimento = [0, 1, -1, -1, -1]
+    idx_receta = [-1, -1, 0, 1, 0]
+
+    por_registro, fechas, totales = calcular_macros_lote([log.grams for log in logs], idx_alimento,
+                                                         idx_receta, matriz, dias=dias)
+
+    for log, fila in zip(logs, por_registro):
+        if log.food:
+            esperado = calcular_macros_alimento(log.grams, log.food)
+        else:
+            esperado = calcular_macros_receta(log.grams, log.recipe)
+        assert macros_a_dict(fila) == pytest.approx(esperado)
+
+    assert list(fechas) == [date(2024, 5, 1), date(2024, 5, 2)]
+    for fecha, fila in zip(fechas, totales):
+        del_dia = [log for log, d in zip(logs, dias) if d == fecha]
+        esperado = obtener_resumen_diario(del_dia)
+        assert {k: round(v, 1) for k, v in macros_a_dict(fila).items()} == esperado
+
@@ -0,0 +1,50 @@
+import logging
+from datetime import date
+
+import pytest
+
+import metricas
+
+
+@pytest.fixture(autouse=True)
+def metricas_limpias():
+    for histograma in metricas.HISTOGRAMAS:
+        histograma.vaciar()
+
+
+def test_metrics_expone_peticiones_sql_y_plantillas(app, cliente):
+    cliente.get(f"/day/{date.today().isoformat()}")
+    texto = cliente.get("/metrics").get_data(as_text=True)
+
+    assert 'nutri_peticion_segundos_count{ruta="/day/<date_str>",metodo="GET"} 1' in texto
+    assert 'nutri_peticion_segundos_bucket{ruta="/day/<date_str>",metodo="GET",le="+Inf"} 1' in texto
+    assert 'nutri_render_segundos_count{plantilla="index.html"} 1' in texto
+    assert 'nutri_cache_fallos_total{cache="paginas"}' in texto
+    # Consultas del panel con la caché vacía: versión, registros, resumen y estadísticas
+    # (el usuario ya está en la sesión de la prueba)
+    serie = metricas.sql_consultas.series()[("/day/<date_str>",)]
+    assert serie["n"] == 1 and serie["suma"] == 4
+    assert metricas.sql_segundos.series()[("/day/<date_str>",)]["suma"] > 0
+
+
+def test_registro_de_peticiones_lentas_con_su_sql(app, cliente, caplog):
+    app.config["REGISTRO_LENTAS_MS"] = 0
+    try:
+        with caplog.at_level(logging.WARNING, logger="nutri.lentas"):
+            cliente.get("/mis_alimentos")
+    finally:
+        app.config["REGISTRO_LENTAS_MS"] = None
+    mensaje = caplog.records[-1].getMessage()
+    assert "Petición lenta GET /mis_alimentos" in mensaje
+    assert "FROM food" in mensaje
+
+
+def test_metrics_con_token(app, cliente):
+    app.config["METRICAS_TOKEN"] = "secreto"
+    try:
+        assert cliente.get("/metrics").status_code == 401
+        respuesta = cliente.get("/metrics", headers={"Authorization": "Bearer secreto"})
+    finally:
+        app.config["METRICAS_TOKEN"] = None
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == "text/plain"
@@ -0,0 +1,71 @@
+from sqlalchemy import create_engine, inspect, text
+
+from migraciones import MIGRACIONES, aplicar_migraciones, informe_explain
+
+# Esquema tal y como lo dejaba db.create_all() antes de las migraciones
+ESQUEMA_ANTIGUO = [
+    """CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+       email VARCHAR(120) NOT NULL UNIQUE, password VARCHAR(255) NOT NULL,
+       fecha_aceptacion_politica DATETIME, target_kcal INTEGER, target_protein INTEGER,
+       target_carbs INTEGER, target_fat INTEGER)""",
+    """CREATE TABLE food (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, kcal_100g FLOAT NOT NULL,
+       prot_100g FLOAT NOT NULL, carb_100g FLOAT NOT NULL, fat_100g FLOAT NOT NULL,
+       user_id INTEGER NOT NULL REFERENCES user(id))""",
+    """CREATE TABLE recipe (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL,
+       user_id INTEGER NOT NULL REFERENCES user(id))""",
+    """CREATE TABLE recipe_ingredient (id INTEGER PRIMARY KEY, recipe_id INTEGER NOT NULL REFERENCES recipe(id),
+       food_id INTEGER NOT NULL REFERENCES food(id), grams FLOAT NOT NULL)""",
+    """CREATE TABLE daily_log (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user(id),
+       date DATE NOT NULL, food_id INTEGER REFERENCES food(id), recipe_id INTEGER REFERENCES recipe(id),
+       grams FLOAT NOT NULL, target_kcal_snapshot INTEGER, target_protein_snapshot INTEGER,
+       target_carbs_snapshot INTEGER, target_fat_snapshot INTEGER)""",
+]
+
+DATOS = [
+    "INSERT INTO user (id, username, email, password) VALUES (1, 'ana', 'ana@test.com', 'x')",
+    "INSERT INTO food VALUES (1, 'Arroz', 350, 7, 80, 1, 1)",
+    "INSERT INTO food VALUES (2, 'Aceite', 900, 0, 0, 100, 1)",
+    "INSERT INTO recipe VALUES (1, 'Arroz frito', 1)",
+    "INSERT INTO recipe_ingredient VALUES (1, 1, 1, 100)",
+    "INSERT INTO recipe_ingredient VALUES (2, 1, 2, 100)",
+    "INSERT INTO daily_log VALUES (1, 1, '2024-05-01', 1, NULL, 100, 2000, 150, 200, 60)",
+    "INSERT INTO daily_log VALUES (2, 1, '2024-05-01', NULL, 1, 50, 1800, 150, 200, 60)",
+]
+
+
+def _bd_antigua(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigua.db'}")
+    with engine.begin() as conn:
+        for sentencia in ESQUEMA_ANTIGUO + DATOS:
+            conn.execute(text(sentencia))
+    return engine
+
+
+def test_migraciones_actualizan_una_bd_existente(tmp_path):
+    engine = _bd_antigua(tmp_path)
+
+    assert aplicar_migraciones(engine) == [v for v, _, _ in MIGRACIONES]
+    # Segunda ejecución: no queda nada pendiente
+    assert aplicar_migraciones(engine) == []
+
+    with engine.connect() as conn:
+        receta = conn.execute(text("SELECT total_grams, kcal_g FROM recipe WHERE id = 1")).one()
+        assert receta.total_grams == 200
+        assert receta.kcal_g == 6.25
+
+        resumen = conn.execute(text("SELECT * FROM daily_summary")).mappings().one()
+        assert resumen["kcal"] == 350 + 50 * 6.25
+        assert resumen["num_registros"] == 2
+        assert resumen["target_kcal_snapshot"] == 2000
+
+        assert conn.execute(text("SELECT name_norm FROM food WHERE id = 1")).scalar() == "arroz"
+
+    indices = {i["name"] for i in inspect(engine).get_indexes("daily_log")}
+    assert "ix_daily_log_user_date" in indices
+    assert all(datos["usa_indice"] for datos in informe_explain(engine).values())
+
+
+def test_consultas_principales_usan_indices(app):
+    informe = informe_explain()
+    sin_indice = {nombre: datos["plan"] for nombre, datos in informe.items() if not datos["usa_indice"]}
+    assert not sin_indice
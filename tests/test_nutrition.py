@@ -1,12 +1,14 @@
 import unittest
-from app import app, db
+from app import create_app, db
 
 class TestFlaskIntegrity(unittest.TestCase):
     def setUp(self):
-        # Configuración para pruebas
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        app.config['WTF_CSRF_ENABLED'] = False
+        # Configuración para pruebas: cada prueba tiene su propia aplicación y base de datos
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+        })
         self.client = app.test_client()
         with app.app_context():
             db.create_all()
@@ -0,0 +1,56 @@
+"""
+Presupuestos de consultas por ruta: el número de sentencias SQL no debe crecer
+con el tamaño del catálogo ni con los registros del día.
+"""
+from datetime import date
+
+import pytest
+
+from models import db, Food, Recipe, RecipeIngredient, DailyLog
+from logic import recalcular_totales_receta, recalcular_resumen_dia
+from tests.consultas import peticion_con_presupuesto
+
+HOY = date.today()
+
+
+def _sembrar(usuario, n_alimentos, n_recetas, ingredientes_por_receta, n_logs):
+    alimentos = [Food(name=f"Alimento {i}", kcal_100g=100 + i, prot_100g=10, carb_100g=10, fat_100g=5,
+                      user_id=usuario.id) for i in range(n_alimentos)]
+    db.session.add_all(alimentos)
+    db.session.flush()
+    recetas = []
+    for i in range(n_recetas):
+        receta = Recipe(name=f"Receta {i}", user_id=usuario.id)
+        receta.ingredients = [RecipeIngredient(food=alimentos[(i + j) % n_alimentos], grams=50)
+                              for j in range(ingredientes_por_receta)]
+        recalcular_totales_receta(receta)
+        recetas.append(receta)
+    db.session.add_all(recetas)
+    db.session.flush()
+    for i in range(n_logs):
+        log = DailyLog(user_id=usuario.id, date=HOY, grams=100, target_kcal_snapshot=2000,
+                       target_protein_snapshot=150, target_carbs_snapshot=200, target_fat_snapshot=60)
+        if i % 2:
+            log.food_id = alimentos[i % n_alimentos].id
+        else:
+            log.recipe_id = recetas[i % n_recetas].id
+        db.session.add(log)
+    db.session.flush()
+    recalcular_resumen_dia(usuario.id, HOY)
+    db.session.commit()
+    return recetas
+
+
+@pytest.mark.parametrize("escala", [1, 10])
+def test_rutas_respetan_su_presupuesto(cliente, usuario, escala):
+    recetas = _sembrar(usuario, n_alimentos=5 * escala, n_recetas=2 * escala,
+                       ingredientes_por_receta=4, n_logs=3 * escala)
+    engine = db.engine
+
+    # Presupuestos: carga del usuario + consultas propias de la ruta, independientes de la escala
+    peticion_con_presupuesto(cliente, engine, f"/day/{HOY:%Y-%m-%d}", presupuesto=5)
+    # Segunda visita: la página sale de la caché tras leer solo la versión de los datos
+    peticion_con_presupuesto(cliente, engine, f"/day/{HOY:%Y-%m-%d}", presupuesto=1)
+    peticion_con_presupuesto(cliente, engine, "/mis_alimentos", presupuesto=4)
+    peticion_con_presupuesto(cliente, engine, "/add_log", presupuesto=1)
+    peticion_con_presupuesto(cliente, engine, f"/edit_recipe/{recetas[0].id}", presupuesto=3)
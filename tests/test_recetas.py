@@ -0,0 +1,41 @@
+from models import db, Food, Recipe
+
+
+def _alimento(usuario, nombre, kcal, prot=0, carb=0, fat=0):
+    f = Food(name=nombre, kcal_100g=kcal, prot_100g=prot, carb_100g=carb, fat_100g=fat, user_id=usuario.id)
+    db.session.add(f)
+    db.session.commit()
+    return f
+
+
+def test_add_recipe_materializa_totales(cliente, usuario):
+    arroz = _alimento(usuario, "Arroz", 350, carb=80)
+    pollo = _alimento(usuario, "Pollo", 165, prot=31)
+    cliente.post("/add_recipe", data={"name": "Arroz con pollo",
+                                      "food_ids[]": [arroz.id, pollo.id], "grams[]": ["100", "100"]})
+
+    receta = Recipe.query.filter_by(name="Arroz con pollo").one()
+    assert receta.total_grams == 200
+    assert receta.kcal_g * receta.total_grams == 515
+    assert receta.prot_g * receta.total_grams == 31
+
+
+def test_edit_food_actualiza_recetas_que_lo_usan(cliente, usuario):
+    arroz = _alimento(usuario, "Arroz", 350, carb=80)
+    cliente.post("/add_recipe", data={"name": "Arroz blanco", "food_ids[]": [arroz.id], "grams[]": ["200"]})
+
+    cliente.post(f"/edit_food/{arroz.id}", data={"name": "Arroz", "kcal": "100", "prot": "0",
+                                                 "carb": "20", "fat": "0"})
+    db.session.expire_all()
+    receta = Recipe.query.filter_by(name="Arroz blanco").one()
+    assert receta.kcal_g == 1.0
+    assert receta.get_totales()["kcal"] == 200
+
+
+def test_catalogo_muestra_totales_de_receta(cliente, usuario):
+    arroz = _alimento(usuario, "Arroz", 350, carb=80)
+    cliente.post("/add_recipe", data={"name": "Arroz blanco", "food_ids[]": [arroz.id], "grams[]": ["200"]})
+
+    html = cliente.get("/mis_alimentos").get_data(as_text=True)
+    assert "Arroz blanco" in html
+    assert "<b class=\"text-dark\">700</b>" in html
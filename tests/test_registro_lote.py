@@ -0,0 +1,85 @@
+from datetime import date
+
+import cache
+from models import db, Food, Recipe, DailyLog, DailySummary, User
+from tests.consultas import contar_consultas
+
+AYER, HOY = date(2024, 5, 1), date(2024, 5, 2)
+
+
+def _alimento(usuario, nombre, kcal):
+    f = Food(name=nombre, kcal_100g=kcal, prot_100g=10, carb_100g=20, fat_100g=5, user_id=usuario.id)
+    db.session.add(f)
+    db.session.commit()
+    return f
+
+
+def _comida(cliente, fecha, *items):
+    return cliente.post("/add_log", data={"date": fecha.isoformat(),
+                                          "item_id": [i for i, _ in items],
+                                          "grams": [str(g) for _, g in items]})
+
+
+def test_varios_elementos_en_un_solo_insert(cliente, usuario, app):
+    arroz, pollo = _alimento(usuario, "Arroz", 350), _alimento(usuario, "Pollo", 120)
+    receta = Recipe(name="Batido", user_id=usuario.id, total_grams=100, kcal_g=1, prot_g=0, carb_g=0, fat_g=0)
+    db.session.add(receta)
+    db.session.commit()
+
+    with contar_consultas(db.engine) as contador:
+        respuesta = _comida(cliente, HOY, (f"food_{arroz.id}", 100), (f"food_{pollo.id}", 200),
+                            (f"recipe_{receta.id}", 300))
+    assert respuesta.status_code == 302
+    assert sum(s.startswith("INSERT INTO daily_log") for s in contador.sentencias) == 1
+
+    db.session.expire_all()
+    assert DailyLog.query.count() == 3
+    resumen = db.session.get(DailySummary, (usuario.id, HOY))
+    assert resumen.num_registros == 3
+    assert resumen.kcal == 350 + 240 + 300
+    assert resumen.target_kcal_snapshot == 2000
+
+
+def test_un_elemento_ajeno_anula_toda_la_comida(cliente, usuario):
+    arroz = _alimento(usuario, "Arroz", 350)
+    otro = User(username="luis", email="luis@test.com", password="sin-uso")
+    db.session.add(otro)
+    db.session.commit()
+    ajeno = _alimento(otro, "Secreto", 100)
+
+    respuesta = _comida(cliente, HOY, (f"food_{arroz.id}", 100), (f"food_{ajeno.id}", 100))
+    assert respuesta.status_code == 302
+    assert "/add_log" in respuesta.headers["Location"]
+    assert DailyLog.query.count() == 0
+    assert _comida(cliente, HOY, (f"food_{arroz.id}", 0)).status_code == 302
+    assert DailyLog.query.count() == 0
+
+
+def test_copiar_dia_completo_y_una_comida(cliente, usuario, app):
+    arroz, pollo = _alimento(usuario, "Arroz", 350), _alimento(usuario, "Pollo", 120)
+    _comida(cliente, AYER, (f"food_{arroz.id}", 100), (f"food_{pollo.id}", 200))
+
+    # Las copias toman las metas actuales, no las del día de origen
+    with app.app_context():
+        db.session.get(User, usuario.id).target_kcal = 2500
+        db.session.commit()
+    cache.invalidar_usuario(usuario.id)
+
+    # Contexto propio: la petición vuelve a cargar el usuario con sus metas nuevas
+    with app.app_context(), contar_consultas(db.engine) as contador:
+        cliente.post("/copiar_dia", data={"origen": AYER.isoformat(), "destino": HOY.isoformat()})
+    assert sum("INSERT INTO daily_log" in s and "SELECT" in s for s in contador.sentencias) == 1
+
+    db.session.expire_all()
+    copias = DailyLog.query.filter_by(date=HOY).order_by(DailyLog.id).all()
+    assert [(c.food_id, c.grams, c.target_kcal_snapshot) for c in copias] == [
+        (arroz.id, 100, 2500), (pollo.id, 200, 2500)]
+    resumen = db.session.get(DailySummary, (usuario.id, HOY))
+    assert (resumen.num_registros, resumen.kcal, resumen.target_kcal_snapshot) == (2, 590, 2500)
+
+    # Solo el registro indicado
+    pollo_ayer = DailyLog.query.filter_by(date=AYER, food_id=pollo.id).one()
+    cliente.post("/copiar_dia", data={"origen": AYER.isoformat(), "destino": "2024-05-03",
+                                      "log_id": [str(pollo_ayer.id)]})
+    assert [c.food_id for c in DailyLog.query.filter_by(date=date(2024, 5, 3))] == [pollo.id]
+    assert cliente.post("/copiar_dia", data={"origen": "ayer", "destino": HOY.isoformat()}).status_code == 400
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import create_engine
+
+import basedatos
+from models import db, Food, User
+
+
+@pytest.fixture
+def bases(app, tmp_path, monkeypatch):
+    """Dos ficheros SQLite: la primaria y una réplica que solo se actualiza al llamar a replicar()."""
+    primaria = create_engine(f"sqlite:///{tmp_path}/primaria.db")
+    replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    db.session.remove()
+    monkeypatch.setitem(db.engines, None, primaria)
+    monkeypatch.setitem(db.engines, basedatos.BIND_REPLICA, replica)
+    for engine in (primaria, replica):
+        basedatos.preparar_engine(engine, app.config["SQLITE_PRAGMAS"])
+    db.create_all()
+
+    def replicar():
+        origen, destino = primaria.raw_connection(), replica.raw_connection()
+        try:
+            origen.driver_connection.backup(destino.driver_connection)
+        finally:
+            origen.close()
+            destino.close()
+
+    yield replicar
+    db.session.remove()
+    primaria.dispose()
+    replica.dispose()
+
+
+def _cliente(app, usuario_id):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion["_user_id"] = str(usuario_id)
+    return cliente
+
+
+def _mis_alimentos(app, cliente):
+    with app.app_context():
+        return cliente.get("/mis_alimentos").get_data(as_text=True)
+
+
+def test_lecturas_en_la_replica_y_las_propias_escrituras_en_la_primaria(app, bases, monkeypatch):
+    usuario = User(username="ana", email="ana@test.com", password="sin-uso")
+    db.session.add(usuario)
+    db.session.flush()
+    db.session.add(Food(name="Replicado", kcal_100g=100, prot_100g=1, carb_100g=1, fat_100g=1, user_id=usuario.id))
+    db.session.commit()
+    bases()
+
+    # Un alimento que la réplica todavía no tiene: las rutas de lectura no lo ven
+    db.session.add(Food(name="Pendiente", kcal_100g=100, prot_100g=1, carb_100g=1, fat_100g=1, user_id=usuario.id))
+    db.session.commit()
+    cliente = _cliente(app, usuario.id)
+    html = _mis_alimentos(app, cliente)
+    assert "Replicado" in html and "Pendiente" not in html
+
+    # Tras escribir, el usuario lee de la primaria aunque la réplica siga sin ponerse al día
+    with app.app_context():
+        cliente.post("/add_food", data={"name": "Nuevo", "kcal": "100", "prot": "1", "carb": "1", "fat": "1"})
+    html = _mis_alimentos(app, cliente)
+    assert "Nuevo" in html and "Pendiente" in html
+
+    # Pasado el retraso máximo vuelve a leer de la réplica, que ve lo nuevo al replicarse
+    monkeypatch.setitem(app.config, "REPLICA_RETRASO_MAX", 0)
+    assert "Nuevo" not in _mis_alimentos(app, cliente)
+    bases()
+    assert "Nuevo" in _mis_alimentos(app, cliente)
+
+
+def test_escrituras_siempre_en_la_primaria(app, bases):
+    usuario = User(username="ana", email="ana@test.com", password="sin-uso")
+    db.session.add(usuario)
+    db.session.commit()
+    bases()
+
+    with app.app_context(), basedatos.lectura_replica():
+        db.session.add(Food(name="Arroz", kcal_100g=350, prot_100g=7, carb_100g=80, fat_100g=1, user_id=usuario.id))
+        db.session.commit()
+        # Después de escribir, la misma sesión ya lee de la primaria
+        assert Food.query.filter_by(name="Arroz").count() == 1
+    with app.app_context(), basedatos.lectura_replica():
+        assert Food.query.filter_by(name="Arroz").count() == 0
+
+
+def test_opciones_del_pool(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+    opciones = basedatos.opciones_engine("postgresql://u@servidor/nutri")
+    assert opciones == {"pool_pre_ping": False, "pool_size": 20, "max_overflow": 10, "pool_recycle": 1800}
+    assert basedatos.opciones_engine("sqlite://") == {"pool_pre_ping": False}
@@ -0,0 +1,194 @@
+from datetime import date, timedelta
+
+import pytest
+
+from models import db, Food, DailyLog, DailySummary, User
+from logic import (
+    obtener_estadisticas_breves,
+    obtener_estadisticas_ventanas,
+    recalcular_resumen_dia,
+    recalcular_resumenes,
+)
+from lotes import cargar_lote_logs, calcular_macros_lote, macros_a_dict
+from tests.consultas import contar_consultas
+
+
+def _alimento(usuario, nombre="Arroz", kcal=350):
+    f = Food(name=nombre, kcal_100g=kcal, prot_100g=7, carb_100g=80, fat_100g=1, user_id=usuario.id)
+    db.session.add(f)
+    db.session.commit()
+    return f
+
+
+def _registrar(cliente, item, gramos, fecha):
+    return cliente.post("/add_log", data={"item_id": item, "grams": str(gramos),
+                                          "date": fecha.strftime("%Y-%m-%d")})
+
+
+def test_add_y_delete_log_mantienen_el_resumen(cliente, usuario):
+    arroz = _alimento(usuario)
+    hoy = date.today()
+    _registrar(cliente, f"food_{arroz.id}", 100, hoy)
+    _registrar(cliente, f"food_{arroz.id}", 50, hoy)
+
+    resumen = db.session.get(DailySummary, (usuario.id, hoy))
+    assert resumen.num_registros == 2
+    assert resumen.kcal == 525
+    assert resumen.target_kcal_snapshot == 2000
+
+    for log in DailyLog.query.all():
+        cliente.get(f"/delete_log/{log.id}")
+    db.session.expire_all()
+    resumen = db.session.get(DailySummary, (usuario.id, hoy))
+    assert resumen.num_registros == 0
+    assert resumen.kcal == 0
+
+
+def test_dia_sin_resumen_se_reconstruye_desde_sus_logs(cliente, usuario):
+    # Registros anteriores al resumen: el día tiene logs pero ninguna fila en DailySummary
+    arroz = _alimento(usuario)
+    hoy = date.today()
+    db.session.add_all([DailyLog(user_id=usuario.id, date=hoy, food_id=arroz.id, grams=g) for g in (100, 100)])
+    db.session.commit()
+
+    _registrar(cliente, f"food_{arroz.id}", 50, hoy)
+    db.session.expire_all()
+    resumen = db.session.get(DailySummary, (usuario.id, hoy))
+    assert (resumen.num_registros, resumen.kcal) == (3, 875)
+
+    db.session.delete(resumen)
+    db.session.commit()
+    cliente.get(f"/delete_log/{DailyLog.query.first().id}")
+    db.session.expire_all()
+    resumen = db.session.get(DailySummary, (usuario.id, hoy))
+    assert (resumen.num_registros, resumen.kcal) == (2, 525)
+
+
+def test_edit_food_recalcula_los_dias_afectados(cliente, usuario):
+    arroz = _alimento(usuario)
+    ayer = date.today() - timedelta(days=1)
+    _registrar(cliente, f"food_{arroz.id}", 200, ayer)
+
+    cliente.post(f"/edit_food/{arroz.id}", data={"name": "Arroz", "kcal": "100", "prot": "0",
+                                                 "carb": "20", "fat": "0"})
+    db.session.expire_all()
+    assert db.session.get(DailySummary, (usuario.id, ayer)).kcal == 200
+
+
+def test_estadisticas_leen_los_resumenes(cliente, usuario):
+    arroz = _alimento(usuario, kcal=1000)
+    hoy = date.today()
+    _registrar(cliente, f"food_{arroz.id}", 200, hoy)                       # 2000 kcal: en objetivo
+    _registrar(cliente, f"food_{arroz.id}", 50, hoy - timedelta(days=2))     # 500 kcal: fuera
+    _registrar(cliente, f"food_{arroz.id}", 200, hoy - timedelta(days=20))   # fuera de la semana
+
+    assert obtener_estadisticas_breves(usuario.id, dias=7) == {"total_dias_con_datos": 2, "cumplidos": 1}
+    assert obtener_estadisticas_breves(usuario.id, dias=30) == {"total_dias_con_datos": 3, "cumplidos": 2}
+
+    html = cliente.get(f"/day/{hoy:%Y-%m-%d}").get_data(as_text=True)
+    assert "2000.0</span> / 2000" in html
+
+
+def test_ventanas_y_recalculo_sql_coinciden_con_incremental(cliente, usuario):
+    arroz = _alimento(usuario, kcal=1000)
+    hoy = date.today()
+    cliente.post("/add_recipe", data={"name": "Mix", "food_ids[]": [arroz.id], "grams[]": ["400"]})
+    receta_id = db.session.execute(db.text("SELECT id FROM recipe")).scalar()
+    _registrar(cliente, f"food_{arroz.id}", 150, hoy)
+    _registrar(cliente, f"recipe_{receta_id}", 50, hoy)
+    _registrar(cliente, f"food_{arroz.id}", 30, hoy - timedelta(days=10))
+
+    incremental = db.session.get(DailySummary, (usuario.id, hoy)).get_macros()
+    db.session.expire_all()
+    assert recalcular_resumen_dia(usuario.id, hoy).get_macros() == incremental
+
+    stats = obtener_estadisticas_ventanas(usuario.id, ventanas=(7, 30))
+    assert stats == {7: {"total_dias_con_datos": 1, "cumplidos": 1},
+                     30: {"total_dias_con_datos": 2, "cumplidos": 1}}
+
+
+def test_lote_desde_bd_coincide_con_los_resumenes(cliente, usuario):
+    arroz = _alimento(usuario)
+    cliente.post("/add_recipe", data={"name": "Mix", "food_ids[]": [arroz.id], "grams[]": ["300"]})
+    receta_id = db.session.execute(db.text("SELECT id FROM recipe")).scalar()
+    hoy = date.today()
+    _registrar(cliente, f"food_{arroz.id}", 120, hoy)
+    _registrar(cliente, f"recipe_{receta_id}", 75, hoy)
+    _registrar(cliente, f"food_{arroz.id}", 40, hoy - timedelta(days=3))
+
+    lote = cargar_lote_logs(usuario.id)
+    _, fechas, totales = calcular_macros_lote(lote["gramos"], lote["idx_alimento"], lote["idx_receta"],
+                                              lote["matriz"], dias=lote["dias"])
+    for fecha, fila in zip(fechas.tolist(), totales):
+        resumen = db.session.get(DailySummary, (usuario.id, fecha))
+        assert macros_a_dict(fila)["kcal"] == pytest.approx(resumen.kcal)
+
+
+def test_lote_carga_ingredientes_de_recetas_sin_totales_de_una_vez(cliente, usuario):
+    arroz = _alimento(usuario)
+    for nombre in ("A", "B", "C"):
+        cliente.post("/add_recipe", data={"name": nombre, "food_ids[]": [arroz.id], "grams[]": ["200"]})
+    for (receta_id,) in db.session.execute(db.text("SELECT id FROM recipe")).all():
+        _registrar(cliente, f"recipe_{receta_id}", 100, date.today())
+    # Recetas anteriores a los totales materializados
+    db.session.execute(db.text("UPDATE recipe SET total_grams = NULL"))
+    db.session.commit()
+    db.session.expire_all()
+
+    user_id = usuario.id
+    with contar_consultas(db.engine) as contador:
+        lote = cargar_lote_logs(user_id)
+    # Registros, recetas, recetas sin totales con sus ingredientes (y alimentos)
+    assert contador.total == 4
+    _, _, totales = calcular_macros_lote(lote["gramos"], lote["idx_alimento"], lote["idx_receta"],
+                                         lote["matriz"], dias=lote["dias"])
+    assert macros_a_dict(totales[0])["kcal"] == pytest.approx(3 * 350)
+
+
+def test_borrar_receta_o_alimento_recalcula_sus_dias(cliente, usuario):
+    arroz = _alimento(usuario)
+    pan = _alimento(usuario, nombre="Pan", kcal=250)
+    cliente.post("/add_recipe", data={"name": "Mix", "food_ids[]": [arroz.id], "grams[]": ["100"]})
+    receta_id = db.session.execute(db.text("SELECT id FROM recipe")).scalar()
+    hoy = date.today()
+    _registrar(cliente, f"recipe_{receta_id}", 100, hoy)
+    _registrar(cliente, f"food_{pan.id}", 100, hoy)
+    version = db.session.get(DailySummary, (usuario.id, hoy)).version
+
+    cliente.get(f"/delete_recipe/{receta_id}")
+    db.session.expire_all()
+    resumen = db.session.get(DailySummary, (usuario.id, hoy))
+    assert resumen.kcal == pytest.approx(250)
+    assert resumen.version > version
+
+    cliente.get(f"/delete_food/{pan.id}")
+    db.session.expire_all()
+    assert db.session.get(DailySummary, (usuario.id, hoy)).kcal == 0
+
+
+def test_recalcular_solo_lee_los_dias_indicados(usuario):
+    from sqlalchemy import event
+
+    arroz = _alimento(usuario)
+    otro = User(username="luis", email="luis@test.com", password="sin-uso")
+    db.session.add(otro)
+    db.session.commit()
+    hoy, ayer = date.today(), date.today() - timedelta(days=1)
+    for user_id in (usuario.id, otro.id):
+        for fecha in (hoy, ayer):
+            db.session.add(DailyLog(user_id=user_id, date=fecha, food_id=arroz.id, grams=100))
+    db.session.commit()
+    recalcular_resumenes([(u, f) for u in (usuario.id, otro.id) for f in (hoy, ayer)])
+    db.session.commit()
+    db.session.expire_all()
+
+    # Dos usuarios y dos fechas, pero solo dos días afectados (y no sus cuatro combinaciones)
+    cargados = []
+    escuchar = lambda objetivo, _: cargados.append((objetivo.user_id, objetivo.date))
+    event.listen(DailySummary, "load", escuchar)
+    try:
+        resultado = recalcular_resumenes([(usuario.id, hoy), (otro.id, ayer)])
+    finally:
+        event.remove(DailySummary, "load", escuchar)
+    assert sorted(cargados) == sorted([(usuario.id, hoy), (otro.id, ayer)])
+    assert all(r.kcal == 350 and r.num_registros == 1 for r in resultado)
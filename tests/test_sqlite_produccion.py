@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import basedatos
+from app import create_app
+from models import db
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _pragmas(engine):
+    with engine.connect() as conn:
+        return {p: conn.execute(text(f"PRAGMA {p}")).scalar()
+                for p in ("journal_mode", "busy_timeout", "synchronous", "foreign_keys")}
+
+
+def test_perfil_de_produccion_en_cada_conexion(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/nutri.db", "SQLITE_PERFIL": "produccion"})
+    with app.app_context():
+        engine = db.engine
+        pragmas = _pragmas(engine)
+        engine.dispose()
+    # synchronous=NORMAL es el nivel 1
+    assert pragmas == {"journal_mode": "wal", "busy_timeout": 5000, "synchronous": 1, "foreign_keys": 1}
+
+    # Los PRAGMA son de los engines de la aplicación, no de cualquier Engine del proceso
+    otro = create_engine(f"sqlite:///{tmp_path}/otro.db")
+    assert _pragmas(otro)["journal_mode"] == "delete"
+    otro.dispose()
+
+
+def test_variables_de_entorno_y_perfil_basico(monkeypatch):
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "20000")
+    pragmas = basedatos.configurar_sqlite(SimpleNamespace(config={"SQLITE_PERFIL": "produccion"}))
+    assert pragmas["busy_timeout"] == "20000"
+    assert pragmas["journal_mode"] == "WAL"
+
+    monkeypatch.delenv("SQLITE_BUSY_TIMEOUT_MS")
+    assert basedatos.configurar_sqlite(SimpleNamespace(config={"SQLITE_PERFIL": "basico"})) == {}
+    with pytest.raises(ValueError):
+        basedatos.configurar_sqlite(SimpleNamespace(config={"SQLITE_PERFIL": "rapido"}))
+
+
+def test_varios_procesos_escribiendo_y_leyendo_sin_errores():
+    # Cada proceso importa la aplicación con su propio entorno: se lanza fuera de pytest
+    salida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.estres_sqlite", "--procesos", "3", "--segundos", "1.5", "--json"],
+        cwd=RAIZ, capture_output=True, text=True, timeout=120, check=True,
+    )
+    resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+    assert resultado["errores"] == 0
+    assert resultado["escrituras"] > 0 and resultado["lecturas"] > 0
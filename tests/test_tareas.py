@@ -0,0 +1,145 @@
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+import basedatos
+import tareas
+from models import db, Tarea, User
+
+
+def _proceso_muerto():
+    hijo = subprocess.Popen([sys.executable, "-c", "pass"])
+    hijo.wait()
+    return hijo.pid
+
+
+def test_las_rutas_encolan_y_el_resultado_se_consulta(cliente, usuario):
+    respuesta = cliente.get("/cargar_basicos")
+    assert respuesta.status_code == 302
+    url = respuesta.headers["Location"]
+    tarea_id = int(url.rsplit("/", 1)[1])
+
+    datos = cliente.get(f"/api/tareas/{tarea_id}").get_json()
+    assert datos["estado"] == "completada" and datos["progreso"] == 1
+    assert datos["resultado"]["mensaje"].startswith("Catálogo básico disponible")
+    assert "Catálogo básico disponible" in cliente.get(url).get_data(as_text=True)
+
+    # Las tareas de otro usuario no existen para este
+    otro = User(username="luis", email="luis@test.com", password="sin-uso")
+    db.session.add(otro)
+    db.session.commit()
+    db.session.add(Tarea(user_id=otro.id, tipo="limpiar_catalogo"))
+    db.session.commit()
+    assert cliente.get(f"/api/tareas/{tarea_id + 1}").status_code == 404
+
+
+def test_importacion_fallida_queda_registrada(cliente, usuario, app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "TAREAS_DIR", str(tmp_path))
+    cliente.post("/importar_alimentos", data={"archivo": (io.BytesIO(b'[{"name": "Pan", "kcal": '), "roto.json")},
+                 content_type="multipart/form-data")
+    tarea = Tarea.query.one()
+    assert tarea.estado == "fallida"
+    assert tarea.error == "El fichero no tiene un formato CSV o JSON válido."
+    # El fichero subido se borra aunque la tarea falle
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.fixture
+def bd_fichero(app, tmp_path, monkeypatch):
+    """Base de datos en fichero: las tareas usan conexiones propias desde otros hilos."""
+    engine = create_engine(f"sqlite:///{tmp_path}/tareas.db")
+    db.session.remove()
+    monkeypatch.setitem(db.engines, None, engine)
+    basedatos.preparar_engine(engine, app.config["SQLITE_PRAGMAS"])
+    db.create_all()
+    usuario = User(username="ana", email="ana@test.com", password="sin-uso")
+    db.session.add(usuario)
+    db.session.commit()
+    yield usuario.id
+    db.session.remove()
+    engine.dispose()
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        db.session.expire_all()
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_limite_de_hilos_y_cola(bd_fichero, monkeypatch):
+    liberar, cerrojo = threading.Event(), threading.Lock()
+    en_marcha = {"ahora": 0, "maximo": 0}
+
+    def bloqueante(avance, user_id, n):
+        with cerrojo:
+            en_marcha["ahora"] += 1
+            en_marcha["maximo"] = max(en_marcha["maximo"], en_marcha["ahora"])
+        liberar.wait(5)
+        with cerrojo:
+            en_marcha["ahora"] -= 1
+        return {"n": n}
+
+    monkeypatch.setitem(tareas.TIPOS, "bloqueante", bloqueante)
+    servicio = tareas.ServicioTareas(hilos=1, cola=1)
+
+    primera = servicio.encolar("bloqueante", bd_fichero, n=1)
+    segunda = servicio.encolar("bloqueante", bd_fichero, n=2)
+    # Repetir una tarea igual a otra en marcha devuelve la existente sin ocupar plaza
+    assert servicio.encolar("bloqueante", bd_fichero, n=1) == primera
+    with pytest.raises(tareas.ColaTareasLlena):
+        servicio.encolar("bloqueante", bd_fichero, n=3)
+    assert servicio.rechazadas == 1
+
+    liberar.set()
+    assert _esperar(lambda: Tarea.query.filter_by(estado="completada").count() == 2)
+    assert en_marcha["maximo"] == 1
+    assert {t.id for t in Tarea.query} == {primera, segunda}
+    # Al terminar se liberan las plazas
+    tercera = servicio.encolar("bloqueante", bd_fichero, n=3)
+    assert _esperar(lambda: db.session.get(Tarea, tercera).estado == "completada")
+
+
+def test_recuperacion_de_tareas_huerfanas(usuario, monkeypatch):
+    ejecutadas = []
+    monkeypatch.setitem(tareas.TIPOS, "contar", lambda avance, user_id, n: ejecutadas.append(n) or {"n": n})
+    host = socket.gethostname()
+    muerto = _proceso_muerto()
+    antigua = datetime.utcnow() - timedelta(days=1)
+    db.session.add_all([
+        # Su proceso murió a mitad: se relanza
+        Tarea(user_id=usuario.id, tipo="contar", parametros='{"n": 1}', estado="en_curso",
+              intentos=1, propietario=f"{host}:{muerto}"),
+        # Ya se interrumpió demasiadas veces: se da por fallida
+        Tarea(user_id=usuario.id, tipo="contar", parametros='{"n": 2}', estado="en_curso",
+              intentos=3, propietario=f"{host}:{muerto}"),
+        # Su proceso sigue vivo: no se toca
+        Tarea(user_id=usuario.id, tipo="contar", parametros='{"n": 3}', estado="pendiente",
+              propietario=f"{host}:{os.getppid()}"),
+        # De otra máquina y sin noticias desde hace un día: se relanza
+        Tarea(user_id=usuario.id, tipo="contar", parametros='{"n": 4}', estado="pendiente",
+              propietario="otra-maquina:1", actualizada=antigua),
+    ])
+    db.session.commit()
+
+    servicio = tareas.ServicioTareas(hilos=0)
+    assert len(servicio.recuperar()) == 2
+    assert sorted(ejecutadas) == [1, 4]
+
+    db.session.expire_all()
+    estados = {t.parametros: (t.estado, t.intentos) for t in Tarea.query}
+    assert estados == {'{"n": 1}': ("completada", 2), '{"n": 2}': ("fallida", 3),
+                       '{"n": 3}': ("pendiente", 0), '{"n": 4}': ("completada", 1)}
+    # Una segunda recuperación no vuelve a ejecutar nada
+    assert servicio.recuperar() == []